@@ -16,6 +16,9 @@ To run the app locally:
     # Start the development server
     python app.py
 
+    # Or serve it with gunicorn through the application factory
+    gunicorn --preload 'app:create_app()'
+
 The app will be available at http://localhost:5000/.  You can add
 customers, cars and rental agreements via simple forms.
 
@@ -26,25 +29,151 @@ exercise.
 """
 
 import argparse
+import calendar
+import fcntl
+import json
+from collections import Counter
 from datetime import datetime, date, timedelta
 
-from flask import (Flask, abort, redirect, render_template, request,
-                   url_for, flash, send_from_directory)
+from flask import (Flask, Response, abort, g, has_request_context, jsonify, redirect, render_template,
+                   request, url_for, flash, send_file, send_from_directory, before_render_template,
+                   template_rendered)
 from flask_sqlalchemy import SQLAlchemy
 
 # Import SQL functions for ordering logic
-from sqlalchemy import func
+from sqlalchemy import bindparam, case, event, func, inspect, or_, select
+from sqlalchemy.orm import contains_eager, joinedload
+from sqlalchemy.schema import CreateIndex
 
+import mimetypes
 import os
+import re
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlencode
+
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+
+from blobstore import BlobStore, is_digest
+from bulk_payments import PostingError, parse_postings, read_csv
+from cache import DataVersion, LRUCache
+from exports import FORMATS as EXPORT_FORMATS, export_response
+from interval_index import Interval, IntervalIndex
+from metrics import RequestMetrics, RequestStats
+from migrations import Migration, upgrade as upgrade_schema
+from pagination import nullable_sort_key, paginate
+from query_budgets import check_query_budgets
+from query_plans import check_query_plans, route_urls
+from receivables import (BUCKETS as RECEIVABLE_BUCKETS, BUCKET_LIMITS as RECEIVABLE_BUCKET_LIMITS,
+                         age_balance, bucket_for as receivable_bucket_for)
+from search import create_search_index, rebuild_search_index, search as search_index
+
+
+# ---------------------------------------------------------------------------
+# Database engine profiles.  DB_PROFILE selects the SQLite pragmas applied to
+# every new connection: 'production' (the default) turns on WAL so readers
+# and a writer can work at the same time, waits on locks instead of failing
+# with "database is locked" and enforces foreign keys; 'basic' keeps SQLite's
+# own defaults.  Individual values can be overridden with SQLITE_<PRAGMA>
+# environment variables, e.g. SQLITE_BUSY_TIMEOUT=10000.  DATABASE_URL
+# replaces the SQLite file altogether (e.g. a PostgreSQL URL), in which case
+# the pragmas are skipped and only the pool settings apply.
+DB_PROFILES = {
+    'basic': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,         # milliseconds
+        'foreign_keys': 'ON',
+        'cache_size': -64000,         # negative: KiB, so 64 MB per connection
+        'mmap_size': 268435456,       # 256 MB
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def database_uri() -> str:
+    uri = os.environ.get('DATABASE_URL', 'sqlite:///car_rental.db')
+    # Hosting providers still hand out the scheme SQLAlchemy dropped
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def sqlite_pragmas(profile: str) -> dict:
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}; expected one of {sorted(DB_PROFILES)}")
+    pragmas = dict(DB_PROFILES[profile])
+    for name in pragmas:
+        override = os.environ.get(f'SQLITE_{name.upper()}')
+        if override is not None:
+            pragmas[name] = override
+    return pragmas
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'change‑me'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///car_rental.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLITE_PRAGMAS'] = sqlite_pragmas(os.environ.get('DB_PROFILE', 'production'))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    # One connection per worker thread plus some headroom; connections are
+    # checked before use so a restarted database server is picked up.
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+}
 app.config['UPLOAD_FOLDER'] = 'uploads'
-
-db = SQLAlchemy(app)
+# Largest request body accepted, which caps document uploads (megabytes)
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 16)) * 1024 * 1024
+# How document bytes leave the server: '' streams them from the worker,
+# 'x-sendfile' hands the path to Apache/lighttpd, 'x-accel' to nginx via an
+# internal location mapped onto UPLOAD_FOLDER, e.g.
+#     location /protected-uploads/ { internal; alias /srv/app/uploads/; }
+app.config['DOCUMENT_SENDFILE'] = os.environ.get('DOCUMENT_SENDFILE', '')
+app.config['DOCUMENT_ACCEL_PREFIX'] = os.environ.get('DOCUMENT_ACCEL_PREFIX', '/protected-uploads/')
+app.config['USE_X_SENDFILE'] = app.config['DOCUMENT_SENDFILE'] == 'x-sendfile'
+# Read-through cache for dashboard and list page view models.  Entries are
+# keyed on the data version, so they are reused until the next write; the
+# optional TTL (seconds) additionally bounds how long an entry lives.
+app.config['VIEW_CACHE_SIZE'] = 256
+app.config['VIEW_CACHE_TTL'] = None
+# Rows per page on list pages; ?per_page= may override it up to
+# pagination.MAX_PER_PAGE.
+app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', 50))
+# Seconds between scheduler runs in a background thread of the serving
+# processes (see start_scheduler); 0 leaves scheduling to cron
+# (python app.py --run-scheduler).
+app.config['SCHEDULER_INTERVAL'] = int(os.environ.get('SCHEDULER_INTERVAL', 0))
+# Requests taking at least this many seconds are logged with their slowest
+# SQL; 0 turns the slow request log off.
+app.config['SLOW_REQUEST_SECONDS'] = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+# Raise on lazy loads triggered while a template renders (see "Loading
+# plans"); None follows app.debug, LAZY_LOAD_GUARD=1/0 forces it on or off.
+app.config['LAZY_LOAD_GUARD'] = {'1': True, '0': False}.get(os.environ.get('LAZY_LOAD_GUARD'))
+
+# Bound to the app by create_app(), which also sets DB_DIALECT
+db = SQLAlchemy()
+DB_DIALECT = None
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def days_between(start, end):
+    """SQL expression for the number of days from start to end."""
+    if DB_DIALECT == 'sqlite':
+        return func.julianday(end) - func.julianday(start)
+    # PostgreSQL: date - date is an integer number of days
+    return end - start
 
 
 class Customer(db.Model):
@@ -59,10 +188,30 @@ class Customer(db.Model):
     fines = db.relationship('Fine', back_populates='customer')
     damages = db.relationship('Damage', back_populates='customer')
 
+    __table_args__ = (
+        # Customer list is sorted and paginated by name
+        db.Index('ix_customer_name', 'name'),
+    )
+
     def __repr__(self) -> str:
         return f"<Customer {self.name}>"
 
 
+# ---------------------------------------------------------------------------
+# Uploaded documents are stored once per distinct content (see blobstore.py).
+# Customer.passport_file and license_file hold "<sha256>/<file name>"; this
+# table records each blob and how many of those references point at it.
+class Blob(db.Model):
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    content_type = db.Column(db.String(100))
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self) -> str:
+        return f"<Blob {self.sha256[:12]} refs={self.ref_count}>"
+
+
 class Car(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     model = db.Column(db.String(120), nullable=False)
@@ -108,7 +257,8 @@ class Rental(db.Model):
     # Billing interval (in days) for recurring rental payments.  Defaults to 30
     # days (approximate one month).  Changing this allows for weekly or
     # quarterly billing schedules.  A corresponding ``next_billing_date``
-    # indicates the next date on which rent is due.
+    # indicates the next date on which rent is due: the start date until the
+    # scheduler charges the first period, then one interval later each time.
     billing_interval_days = db.Column(db.Integer, default=30)
     next_billing_date = db.Column(db.Date, nullable=True)
 
@@ -116,6 +266,18 @@ class Rental(db.Model):
     customer = db.relationship('Customer', back_populates='rentals')
     payments = db.relationship('Payment', back_populates='rental')
 
+    __table_args__ = (
+        # Overlap checks and per-car history
+        db.Index('ix_rental_car_dates', 'car_id', 'start_date', 'end_date'),
+        # Active/settled rental lists, sorted by start date
+        db.Index('ix_rental_refunded_start', 'deposit_refunded', 'start_date'),
+        # "Rented today" and open rental lookups
+        db.Index('ix_rental_end_start', 'end_date', 'start_date'),
+        db.Index('ix_rental_customer', 'customer_id'),
+        # Rentals the scheduler has to bill
+        db.Index('ix_rental_next_billing', 'next_billing_date'),
+    )
+
     def __repr__(self) -> str:
         return f"<Rental car={self.car_id} customer={self.customer_id}>"
 
@@ -129,10 +291,41 @@ class Payment(db.Model):
 
     rental = db.relationship('Rental', back_populates='payments')
 
+    __table_args__ = (
+        # Covers per-rental sums and the last payment date
+        db.Index('ix_payment_rental_date', 'rental_id', 'date', 'amount'),
+        db.Index('ix_payment_date', 'date'),
+        # Keyset sort keys of a rental's payment list (see pagination.py)
+        db.Index('ix_payment_rental_date_key', 'rental_id', nullable_sort_key('date', db.Date)),
+        db.Index('ix_payment_rental_amount_key', 'rental_id', nullable_sort_key('amount', db.Float)),
+    )
+
     def __repr__(self) -> str:
         return f"<Payment {self.amount} on {self.date}>"
 
 
+# Rent charged for one billing period of a rental.  Rows are written by the
+# scheduler (see run_scheduler) as periods fall due; a period is charged at
+# most once, which is what makes re-running the scheduler harmless.
+class RentCharge(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    rental_id = db.Column(db.Integer, db.ForeignKey('rental.id'), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    period_end = db.Column(db.Date, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    rental = db.relationship('Rental', backref=db.backref(
+        'charges', lazy=True, cascade='all, delete-orphan', order_by='RentCharge.period_start'))
+
+    __table_args__ = (
+        db.UniqueConstraint('rental_id', 'period_start', name='uq_rent_charge_period'),
+    )
+
+    def __repr__(self) -> str:
+        return f"<RentCharge rental={self.rental_id} {self.period_start} {self.amount}>"
+
+
 # ---------------------------------------------------------------------------
 # Additional tables to support car ordering and defleeting without changing
 # existing Car columns.  Defleeting a car moves it to an archived list.  A
@@ -164,6 +357,16 @@ class Expense(db.Model):
 
     car = db.relationship('Car', back_populates='expenses')
 
+    __table_args__ = (
+        db.Index('ix_expense_car_date', 'car_id', 'date'),
+        db.Index('ix_expense_date_category', 'date', 'category'),
+        # Recurring expenses the scheduler has to repeat
+        db.Index('ix_expense_next_due', 'next_due_date'),
+        # Keyset sort keys of a car's expense list
+        db.Index('ix_expense_car_date_key', 'car_id', nullable_sort_key('date', db.Date)),
+        db.Index('ix_expense_car_cost_key', 'car_id', nullable_sort_key('cost', db.Float)),
+    )
+
     def __repr__(self) -> str:
         return f"<Expense {self.category} {self.cost}>"
 
@@ -181,6 +384,16 @@ class Fine(db.Model):
     car = db.relationship('Car', back_populates='fines')
     customer = db.relationship('Customer', back_populates='fines')
 
+    __table_args__ = (
+        db.Index('ix_fine_paid', 'paid'),
+        db.Index('ix_fine_customer_car', 'customer_id', 'car_id'),
+        db.Index('ix_fine_car_date', 'car_id', 'date'),
+        # Keyset sort keys of a rental's fine list
+        db.Index('ix_fine_customer_car_date_key', 'customer_id', 'car_id', nullable_sort_key('date', db.Date)),
+        db.Index('ix_fine_customer_car_amount_key', 'customer_id', 'car_id',
+                 nullable_sort_key('amount', db.Float)),
+    )
+
     def __repr__(self) -> str:
         return f"<Fine {self.amount} paid={self.paid}>"
 
@@ -198,6 +411,16 @@ class Damage(db.Model):
     car = db.relationship('Car', back_populates='damages')
     customer = db.relationship('Customer', back_populates='damages')
 
+    __table_args__ = (
+        db.Index('ix_damage_paid', 'paid'),
+        db.Index('ix_damage_customer_car', 'customer_id', 'car_id'),
+        db.Index('ix_damage_car_date', 'car_id', 'date'),
+        # Keyset sort keys of a rental's damage list
+        db.Index('ix_damage_customer_car_date_key', 'customer_id', 'car_id', nullable_sort_key('date', db.Date)),
+        db.Index('ix_damage_customer_car_amount_key', 'customer_id', 'car_id',
+                 nullable_sort_key('amount', db.Float)),
+    )
+
     def __repr__(self) -> str:
         return f"<Damage {self.amount} paid={self.paid}>"
 
@@ -221,6 +444,14 @@ class Salik(db.Model):
     car = db.relationship('Car', backref=db.backref('salik', lazy=True))
     rental = db.relationship('Rental', backref=db.backref('salik_entries', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_salik_rental_paid', 'rental_id', 'paid'),
+        db.Index('ix_salik_car_dates', 'car_id', 'start_date', 'end_date'),
+        # Per-rental Salik list, paginated by start date
+        db.Index('ix_salik_rental_start', 'rental_id', 'start_date'),
+        db.Index('ix_salik_rental_amount', 'rental_id', 'amount'),
+    )
+
     def __repr__(self) -> str:
         return f"<Salik {self.amount} {self.start_date}-{self.end_date} paid={self.paid}>"
 
@@ -239,30 +470,563 @@ class Booking(db.Model):
     car = db.relationship('Car', backref=db.backref('bookings', lazy=True))
     customer = db.relationship('Customer', backref=db.backref('bookings', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_booking_car_dates', 'car_id', 'start_date', 'end_date'),
+        # Bookings covering a day; end_date first keeps the range to current ones
+        db.Index('ix_booking_end_start', 'end_date', 'start_date'),
+        # Booking list, newest first
+        db.Index('ix_booking_start', 'start_date'),
+        db.Index('ix_booking_end', 'end_date'),
+    )
+
     def __repr__(self) -> str:
         return f"<Booking {self.car_id} {self.start_date} to {self.end_date}>"
 
 
 # ---------------------------------------------------------------------------
-# Helper function to ensure every car has a corresponding ordering record.  If
-# a new car is added without an order entry this will create one at the end
-# of the list.  It also ensures that order indexes are consecutive so that
-# moving cars up or down in the list behaves predictably.
-def ensure_car_order():
-    """Ensure each car has a CarOrder record and normalise indices."""
-    # Create missing order entries and set order_index based on existing max
-    max_index = db.session.query(func.max(CarOrder.order_index)).scalar() or 0
-    existing_ids = {co.car_id for co in CarOrder.query.all()}
-    for car in Car.query.all():
-        if car.id not in existing_ids:
-            max_index += 1
-            db.session.add(CarOrder(car_id=car.id, order_index=max_index))
+# Materialised per-car financial summary.  Rows are kept up to date by the
+# flush hooks further down whenever payments, expenses, fines, damages, Salik
+# entries or rentals change, so list pages can read one row per car instead
+# of summing every relationship.  ``python app.py --rebuild-ledger``
+# recomputes the table from scratch.
+class CarLedger(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    car_id = db.Column(db.Integer, db.ForeignKey('car.id'), unique=True, nullable=False)
+    revenue = db.Column(db.Float, default=0.0)
+    expenses = db.Column(db.Float, default=0.0)
+    fines = db.Column(db.Float, default=0.0)
+    damages = db.Column(db.Float, default=0.0)
+    salik = db.Column(db.Float, default=0.0)
+    # Days covered by rentals that have an end date, summed per rental.
+    # Reports measure utilisation from the rental intervals themselves
+    # instead, which merges overlaps (see fleet_utilisation).
+    rented_days = db.Column(db.Integer, default=0)
+    first_rental_start = db.Column(db.Date, nullable=True)
+
+    car = db.relationship('Car', backref=db.backref('ledger', uselist=False))
+
+    @property
+    def total_costs(self) -> float:
+        """Expenses, fines, damages and Salik together (cost to company)."""
+        return (self.expenses or 0) + (self.fines or 0) + (self.damages or 0) + (self.salik or 0)
+
+    def __repr__(self) -> str:
+        return f"<CarLedger car={self.car_id} revenue={self.revenue}>"
+
+
+# ---------------------------------------------------------------------------
+# Interval index for overlap checks.  Rentals and bookings of a car are kept
+# in a sorted interval structure so that every create/edit path can ask
+# whether a date range collides with an existing one without loading the
+# car's whole rental history.  A car's intervals are loaded on first use and
+# dropped again whenever a commit inserts, edits or deletes one of its
+# rentals or bookings, and the whole index is dropped when the cross-process
+# data version moves.  The index lives in process memory, so it only
+# answers the early "please adjust the dates" check; commit_unless_overlapping
+# repeats the check against the database inside the write transaction.
+
+def _load_car_intervals(car_id: int):
+    rentals = (db.session.query(Rental.id, Rental.start_date, Rental.end_date)
+               .filter(Rental.car_id == car_id).all())
+    bookings = (db.session.query(Booking.id, Booking.start_date, Booking.end_date)
+                .filter(Booking.car_id == car_id).all())
+    intervals = [Interval(start, end or date.max, 'rental', rid) for rid, start, end in rentals]
+    intervals += [Interval(start, end or date.max, 'booking', bid) for bid, start, end in bookings]
+    return intervals
+
+
+car_intervals = IntervalIndex(_load_car_intervals, version=lambda: data_version.current())
+
+
+def stored_overlap(car_id: int, start: date, end, kinds, exclude=None):
+    """
+    The database's answer to IntervalIndex.find_overlap: the earliest rental
+    or booking of ``kinds`` on ``car_id`` overlapping [start, end], or None.
+    Served by the (car_id, start_date, end_date) indexes.
+    """
+    for kind in kinds:
+        model = Rental if kind == 'rental' else Booking
+        query = (db.session.query(model.id, model.start_date, model.end_date)
+                 .filter(model.car_id == car_id,
+                         or_(model.end_date.is_(None), model.end_date >= start)))
+        if end is not None:
+            query = query.filter(model.start_date <= end)
+        if exclude is not None and exclude[0] == kind:
+            query = query.filter(model.id != exclude[1])
+        row = query.order_by(model.start_date).first()
+        if row is not None:
+            return Interval(row.start_date, row.end_date or date.max, kind, row.id)
+    return None
+
+
+def commit_unless_overlapping(obj, kinds):
+    """
+    Commit the session unless ``obj``, a Rental or Booking, overlaps another
+    rental or booking of ``kinds`` on its car; in that case roll back and
+    return the conflicting Interval.  The row is flushed first, so the check
+    runs while this transaction holds the write lock and sees every
+    committed row, including those of other processes.
+    """
+    kind = 'rental' if isinstance(obj, Rental) else 'booking'
+    db.session.flush()
+    car_id = obj.car_id
+    conflict = stored_overlap(car_id, obj.start_date, obj.end_date, kinds, exclude=(kind, obj.id))
+    if conflict is not None:
+        db.session.rollback()
+        car_intervals.invalidate([car_id])
+        return conflict
     db.session.commit()
-    # Normalise indices to 1..N to avoid gaps; keeps current relative order
-    ordered = CarOrder.query.order_by(CarOrder.order_index.asc()).all()
-    for idx, co in enumerate(ordered, start=1):
-        co.order_index = idx
+    return None
+
+
+def describe_interval(interval: Interval) -> str:
+    """Format an interval as 'DD/MM/YYYY to DD/MM/YYYY' (or 'Open')."""
+    end = 'Open' if interval.end == date.max else interval.end.strftime('%d/%m/%Y')
+    return f"{interval.start.strftime('%d/%m/%Y')} to {end}"
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_interval_changes(session, flush_context):
+    """Remember which cars had rentals or bookings written in this transaction."""
+    touched = session.info.setdefault('interval_cars', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Rental, Booking)):
+            touched.add(obj.car_id)
+            # A rental moved to another car affects the old car as well
+            touched.update(inspect(obj).attrs.car_id.history.deleted or ())
+
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _invalidate_interval_changes(session):
+    touched = session.info.pop('interval_cars', None)
+    if touched:
+        car_intervals.invalidate(touched)
+
+
+# ---------------------------------------------------------------------------
+# Ledger maintenance.  After every flush the amounts written to the money
+# tables are turned into per-car deltas and applied to CarLedger with
+# UPDATE ... SET col = col + delta in the same transaction.  Rental changes
+# (and cars that have no ledger row yet) are handled by recomputing those
+# cars' rows from grouped queries instead, since moving or deleting a rental
+# shifts both its days and its payments.
+
+# model -> (ledger column, amount attribute)
+LEDGER_SOURCES = {
+    Payment: ('revenue', 'amount'),
+    Expense: ('expenses', 'cost'),
+    Fine: ('fines', 'amount'),
+    Damage: ('damages', 'amount'),
+    Salik: ('salik', 'amount'),
+}
+
+
+def _attr_values(obj, name: str):
+    """Return (old, new) values of an attribute of a flushed object."""
+    added, unchanged, deleted = inspect(obj).attrs[name].history
+    new = added[0] if added else (unchanged[0] if unchanged else None)
+    old = deleted[0] if deleted else (unchanged[0] if unchanged else new)
+    return old, new
+
+
+def ledger_totals(conn, car_ids=None) -> dict:
+    """
+    Compute ledger values from the source tables, grouped by car.  Returns
+    {car_id: {column: value}} for the given cars, or for every car with any
+    activity when ``car_ids`` is None.
+    """
+    def grouped(car_col, value, join=None):
+        query = select(car_col, value)
+        if join is not None:
+            query = query.select_from(join)
+        if car_ids is not None:
+            query = query.where(car_col.in_(car_ids))
+        return conn.execute(query.group_by(car_col)).all()
+
+    totals = {}
+
+    def put(car_id, column, value):
+        if car_id is not None:
+            totals.setdefault(car_id, {})[column] = value
+
+    payment_join = Payment.__table__.join(Rental.__table__, Payment.rental_id == Rental.id)
+    for car_id, value in grouped(Rental.car_id, func.sum(Payment.amount), join=payment_join):
+        put(car_id, 'revenue', value or 0.0)
+    for model, (column, attr) in LEDGER_SOURCES.items():
+        if model is Payment:
+            continue
+        for car_id, value in grouped(model.car_id, func.sum(getattr(model, attr))):
+            put(car_id, column, value or 0.0)
+    # Open rentals are left out here
+    closed_days = case((Rental.end_date.isnot(None),
+                        days_between(Rental.start_date, Rental.end_date) + 1),
+                       else_=0)
+    rental_query = (select(Rental.car_id, func.coalesce(func.sum(closed_days), 0), func.min(Rental.start_date))
+                    .where(Rental.start_date.isnot(None)))
+    if car_ids is not None:
+        rental_query = rental_query.where(Rental.car_id.in_(car_ids))
+    for car_id, days, first_start in conn.execute(rental_query.group_by(Rental.car_id)).all():
+        put(car_id, 'rented_days', int(days))
+        put(car_id, 'first_rental_start', first_start)
+    return totals
+
+
+def refresh_ledger(conn, car_ids):
+    """Recompute the ledger rows of the given cars from the source tables."""
+    car_ids = [c for c in set(car_ids) if c is not None]
+    if not car_ids:
+        return
+    totals = ledger_totals(conn, car_ids)
+    ledger = CarLedger.__table__
+    conn.execute(ledger.delete().where(ledger.c.car_id.in_(car_ids)))
+    empty = {'revenue': 0.0, 'expenses': 0.0, 'fines': 0.0, 'damages': 0.0,
+             'salik': 0.0, 'rented_days': 0, 'first_rental_start': None}
+    rows = [dict(empty, car_id=car_id, **totals.get(car_id, {})) for car_id in car_ids]
+    conn.execute(ledger.insert(), rows)
+
+
+def rebuild_ledger():
+    """Recompute the whole CarLedger table from the source tables."""
+    conn = db.session.connection()
+    conn.execute(CarLedger.__table__.delete())
+    car_ids = [car_id for (car_id,) in conn.execute(select(Car.id)).all()]
+    refresh_ledger(conn, car_ids)
+    db.session.info['data_changed'] = True
     db.session.commit()
+    print(f"Ledger rebuilt for {len(car_ids)} cars.")
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_ledger(session, flush_context):
+    deltas = {}        # (car_id, column) -> amount
+    payment_changes = []  # (rental_id, amount)
+    refresh = set()
+
+    def add(model, car_id, amount, sign):
+        column = LEDGER_SOURCES[model][0]
+        deltas[(car_id, column)] = deltas.get((car_id, column), 0.0) + sign * (amount or 0.0)
+
+    for obj in session.new:
+        model = type(obj)
+        if model is Rental:
+            refresh.add(obj.car_id)
+        elif model is Payment:
+            payment_changes.append((obj.rental_id, obj.amount or 0.0))
+        elif model in LEDGER_SOURCES:
+            add(model, obj.car_id, getattr(obj, LEDGER_SOURCES[model][1]), 1)
+    for obj in session.deleted:
+        model = type(obj)
+        if model is Rental:
+            refresh.add(obj.car_id)
+        elif model is Payment:
+            payment_changes.append((obj.rental_id, -(obj.amount or 0.0)))
+        elif model in LEDGER_SOURCES:
+            add(model, obj.car_id, getattr(obj, LEDGER_SOURCES[model][1]), -1)
+    for obj in session.dirty:
+        model = type(obj)
+        if model is Rental:
+            if session.is_modified(obj):
+                old_car, new_car = _attr_values(obj, 'car_id')
+                refresh.update((old_car, new_car))
+            continue
+        if model not in LEDGER_SOURCES or not session.is_modified(obj):
+            continue
+        key = 'rental_id' if model is Payment else 'car_id'
+        old_key, new_key = _attr_values(obj, key)
+        old_amount, new_amount = _attr_values(obj, LEDGER_SOURCES[model][1])
+        if model is Payment:
+            payment_changes.append((old_key, -(old_amount or 0.0)))
+            payment_changes.append((new_key, new_amount or 0.0))
+        else:
+            add(model, old_key, old_amount, -1)
+            add(model, new_key, new_amount, 1)
+
+    if not (deltas or payment_changes or refresh):
+        return
+    conn = session.connection()
+    rental_ids = {rid for rid, _ in payment_changes if rid is not None}
+    if rental_ids:
+        rental_cars = dict(conn.execute(select(Rental.id, Rental.car_id)
+                                        .where(Rental.id.in_(rental_ids))).all())
+        for rid, amount in payment_changes:
+            car_id = rental_cars.get(rid)
+            deltas[(car_id, 'revenue')] = deltas.get((car_id, 'revenue'), 0.0) + amount
+    ledger = CarLedger.__table__
+    for (car_id, column), delta in deltas.items():
+        if car_id is None or car_id in refresh or not delta:
+            continue
+        result = conn.execute(ledger.update()
+                              .where(ledger.c.car_id == car_id)
+                              .values({column: func.coalesce(ledger.c[column], 0.0) + delta}))
+        if result.rowcount == 0:
+            # No ledger row yet; the flushed rows already include this change
+            refresh.add(car_id)
+    refresh_ledger(conn, refresh)
+
+
+def ledger_by_car() -> dict:
+    """Return {car_id: CarLedger} for every car that has a ledger row."""
+    return {row.car_id: row for row in CarLedger.query.all()}
+
+
+# ---------------------------------------------------------------------------
+# View cache.  Pages that staff reload all day cache the data they render,
+# keyed on the data version.  Any commit that wrote a row bumps the version;
+# flushes that only touched unchanged objects do not.  Cached values must be
+# plain data (see car_view/rental_view) because the ORM objects they were
+# built from belong to the request's session.
+
+view_cache = LRUCache(maxsize=app.config['VIEW_CACHE_SIZE'], ttl=app.config['VIEW_CACHE_TTL'])
+os.makedirs(app.instance_path, exist_ok=True)
+data_version = DataVersion(os.path.join(app.instance_path, 'data_version'))
+
+
+def cached_view(key: tuple, builder):
+    """Return builder()'s result for key at the current data version."""
+    return view_cache.get_or_set(key + (data_version.current(),), builder)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _note_data_change(session, flush_context):
+    if session.new or session.deleted or any(session.is_modified(o) for o in session.dirty):
+        session.info['data_changed'] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _note_bulk_change(orm_execute_state):
+    # Query.update()/delete() bypass the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['data_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_data_version(session):
+    if session.info.pop('data_changed', False):
+        data_version.bump()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_data_change(session):
+    session.info.pop('data_changed', None)
+
+
+def car_view(car: Car) -> dict:
+    """Plain-data copy of the car fields list pages render."""
+    return {
+        'id': car.id,
+        'licence_plate': car.licence_plate,
+        'model': car.model,
+        'model_year': car.model_year,
+        'colour': car.colour,
+        'planned_rent': car.planned_rent,
+    }
+
+
+def rental_view(rental: Rental) -> dict:
+    """Plain-data copy of a rental with its car and customer name."""
+    return {
+        'id': rental.id,
+        'start_date': rental.start_date,
+        'end_date': rental.end_date,
+        'car': car_view(rental.car) if rental.car else None,
+        'customer': {'id': rental.customer.id, 'name': rental.customer.name} if rental.customer else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Loading plans.  Queries whose results a template walks declare the
+# relationships it reaches (joinedload for many-to-one), so a page renders
+# in a fixed number of queries however many rows it shows.  With the lazy
+# load guard on, a lazy load triggered while a template renders raises
+# instead of quietly costing one query per row.
+
+RENTAL_PARTIES = (joinedload(Rental.car), joinedload(Rental.customer))
+BOOKING_PARTIES = (joinedload(Booking.car), joinedload(Booking.customer))
+
+
+def lazy_load_guard_enabled() -> bool:
+    guard = app.config['LAZY_LOAD_GUARD']
+    return app.debug if guard is None else guard
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _guard_lazy_loads(orm_execute_state):
+    # lazy_loaded_from only exists on SELECTs; bulk UPDATE and DELETE pass through
+    if (not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None
+            or not lazy_load_guard_enabled()):
+        return
+    stats = current_request_stats()
+    if stats is not None and stats.rendering:
+        relationship = orm_execute_state.loader_strategy_path[-1]
+        raise RuntimeError(f"Template triggered a lazy load of {relationship}; "
+                           f"add it to the loading plan of the query that fetched the object.")
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters of the view cache as JSON, for monitoring."""
+    return jsonify(dict(view_cache.stats(), data_version=data_version.current()[0]))
+
+
+# ---------------------------------------------------------------------------
+# Request metrics.  Each request is timed along with the SQL it runs (counted
+# and timed through the engine's cursor events, see create_app) and its
+# template rendering.  The per-endpoint histograms are served at /metrics in
+# Prometheus text format, and requests slower than SLOW_REQUEST_SECONDS are
+# logged with the statements that took longest.
+
+request_metrics = RequestMetrics('car_rental')
+
+
+def current_request_stats():
+    """The RequestStats of the request being handled, or None outside one."""
+    return g.get('request_stats') if has_request_context() else None
+
+
+@app.before_request
+def _start_request_stats():
+    g.request_stats = RequestStats()
+
+
+@app.after_request
+def _record_request_stats(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    target = f"{request.method} {request.full_path.rstrip('?')}"
+    if response.is_streamed:
+        # A streamed body (the exports) runs its queries after this hook,
+        # inside the request context stream_with_context keeps, so the stats
+        # stay in g and are recorded once the server closes the response
+        response.response = _measured_body(response.response, stats)
+        response.call_on_close(lambda: finish_request_stats(endpoint, target, stats, stats.body_size))
+    else:
+        g.pop('request_stats')
+        finish_request_stats(endpoint, target, stats, response.content_length)
+    return response
+
+
+def _measured_body(chunks, stats: RequestStats):
+    """Pass a streamed body through as bytes, adding up its size in ``stats``."""
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            stats.body_size += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def finish_request_stats(endpoint: str, target: str, stats: RequestStats, size):
+    """Observe a finished request in /metrics and log it if it was slow."""
+    elapsed = stats.elapsed()
+    request_metrics.observe(endpoint, stats, elapsed, size)
+    threshold = app.config['SLOW_REQUEST_SECONDS']
+    if threshold and elapsed >= threshold:
+        log_slow_request(endpoint, target, stats, elapsed)
+
+
+def log_slow_request(endpoint: str, target: str, stats: RequestStats, elapsed: float):
+    lines = [f"Slow request {target} ({endpoint}): {elapsed * 1000:.0f} ms, "
+             f"{stats.sql_count} SQL statements in {stats.sql_time * 1000:.0f} ms, "
+             f"templates {stats.template_time * 1000:.0f} ms"]
+    for statement, executions, seconds in stats.statement_summary():
+        lines.append(f"  {executions} x {seconds * 1000:.1f} ms: {' '.join(statement.split())}")
+    app.logger.warning('\n'.join(lines))
+
+
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if current_request_stats() is not None:
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+
+def _finish_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request_stats()
+    started = conn.info.get('statement_started')
+    if stats is not None and started:
+        stats.add_statement(statement, time.perf_counter() - started.pop())
+
+
+@before_render_template.connect_via(app)
+def _start_template_timer(sender, template, context, **extra):
+    stats = current_request_stats()
+    if stats is not None:
+        stats.start_template()
+
+
+@template_rendered.connect_via(app)
+def _finish_template_timer(sender, template, context, **extra):
+    stats = current_request_stats()
+    if stats is not None:
+        stats.finish_template()
+
+
+@app.route('/metrics')
+def metrics():
+    """Request metrics of this process in Prometheus text format."""
+    return Response(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ---------------------------------------------------------------------------
+# Car ordering.  Order indexes are spaced ORDER_GAP apart and assigned once,
+# when a car is added, so that reading the car list never has to write.
+# Moving a car swaps indexes with its visible neighbour (two rows) and the
+# bulk reorder endpoint re-spaces the whole list in a single transaction.
+ORDER_GAP = 1024
+
+
+def next_car_order_index() -> int:
+    """Return the order index that places a new car at the end of the list."""
+    max_index = db.session.query(func.max(CarOrder.order_index)).scalar() or 0
+    return max_index + ORDER_GAP
+
+
+def backfill_car_order(conn):
+    """
+    Give cars that predate the ordering table a CarOrder record at the end of
+    the list.  Run by the schema migrations; request handlers never call this.
+    """
+    missing = conn.execute(select(Car.id)
+                           .outerjoin(CarOrder, Car.id == CarOrder.car_id)
+                           .where(CarOrder.id.is_(None))
+                           .order_by(Car.id.asc())).scalars().all()
+    index = (conn.execute(select(func.max(CarOrder.order_index))).scalar() or 0) + ORDER_GAP
+    rows = []
+    for car_id in missing:
+        rows.append({'car_id': car_id, 'order_index': index})
+        index += ORDER_GAP
+    if rows:
+        conn.execute(CarOrder.__table__.insert(), rows)
+
+
+def active_car_orders():
+    """CarOrder query restricted to cars that have not been defleeted."""
+    return (CarOrder.query
+            .outerjoin(DefleetedCar, CarOrder.car_id == DefleetedCar.car_id)
+            .filter(DefleetedCar.id.is_(None)))
+
+
+def ordered_active_cars():
+    """Active (non-defleeted) cars in list order; unordered cars go last."""
+    query = (db.session.query(Car)
+             .outerjoin(CarOrder, Car.id == CarOrder.car_id)
+             .outerjoin(DefleetedCar, Car.id == DefleetedCar.car_id))
+    return (query.filter(DefleetedCar.id.is_(None))
+            .order_by(CarOrder.order_index.is_(None), CarOrder.order_index.asc(), Car.id.asc())
+            .all())
+
+
+def _car_order_for(car_id: int):
+    """Return the car's CarOrder, creating one at the end of the list if missing."""
+    current = CarOrder.query.filter_by(car_id=car_id).first()
+    if current is None and db.session.get(Car, car_id) is not None:
+        current = CarOrder(car_id=car_id, order_index=next_car_order_index())
+        db.session.add(current)
+    return current
 
 
 # ---------------------------------------------------------------------------
@@ -271,29 +1035,64 @@ def ensure_car_order():
 # require POST because they modify data.
 @app.route('/cars/move_up/<int:car_id>', methods=['POST'])
 def move_car_up(car_id: int):
-    ensure_car_order()
-    current = CarOrder.query.filter_by(car_id=car_id).first()
+    current = _car_order_for(car_id)
     if current is None:
         return redirect(url_for('list_cars'))
-    # Find the car above (lower order index)
-    prev = CarOrder.query.filter(CarOrder.order_index < current.order_index).order_by(CarOrder.order_index.desc()).first()
+    # Find the visible car above (lower order index)
+    prev = (active_car_orders()
+            .filter(CarOrder.order_index < current.order_index)
+            .order_by(CarOrder.order_index.desc())
+            .first())
     if prev:
         current.order_index, prev.order_index = prev.order_index, current.order_index
-        db.session.commit()
+    db.session.commit()
     return redirect(url_for('list_cars'))
 
 
 @app.route('/cars/move_down/<int:car_id>', methods=['POST'])
 def move_car_down(car_id: int):
-    ensure_car_order()
-    current = CarOrder.query.filter_by(car_id=car_id).first()
+    current = _car_order_for(car_id)
     if current is None:
         return redirect(url_for('list_cars'))
-    # Find the car below (higher order index)
-    nxt = CarOrder.query.filter(CarOrder.order_index > current.order_index).order_by(CarOrder.order_index.asc()).first()
+    # Find the visible car below (higher order index)
+    nxt = (active_car_orders()
+           .filter(CarOrder.order_index > current.order_index)
+           .order_by(CarOrder.order_index.asc())
+           .first())
     if nxt:
         current.order_index, nxt.order_index = nxt.order_index, current.order_index
-        db.session.commit()
+    db.session.commit()
+    return redirect(url_for('list_cars'))
+
+
+@app.route('/cars/reorder', methods=['POST'])
+def reorder_cars():
+    """
+    Replace the order of the active fleet in one request.  Accepts the full
+    list of active car ids, first to last, either as repeated ``car_ids``
+    form fields or as a JSON body ``{"car_ids": [...]}``.  Only rows whose
+    index actually changes are written.
+    """
+    payload = request.get_json(silent=True) if request.is_json else None
+    raw_ids = payload.get('car_ids', []) if payload else request.form.getlist('car_ids')
+    try:
+        car_ids = [int(car_id) for car_id in raw_ids]
+    except (TypeError, ValueError):
+        abort(400)
+    active_ids = {car.id for car in ordered_active_cars()}
+    if len(car_ids) != len(set(car_ids)) or set(car_ids) != active_ids:
+        abort(400, description='car_ids must list every active car exactly once.')
+    orders = {co.car_id: co for co in CarOrder.query.filter(CarOrder.car_id.in_(car_ids)).all()}
+    for position, car_id in enumerate(car_ids, start=1):
+        index = position * ORDER_GAP
+        order = orders.get(car_id)
+        if order is None:
+            db.session.add(CarOrder(car_id=car_id, order_index=index))
+        elif order.order_index != index:
+            order.order_index = index
+    db.session.commit()
+    if request.is_json:
+        return jsonify({'car_ids': car_ids})
     return redirect(url_for('list_cars'))
 
 
@@ -308,10 +1107,9 @@ def defleet_car(car_id: int):
     today = date.today()
     # Check for active rental on this car.  A rental is active if it has
     # not been settled and its end date is in the future (or open).
-    for rental in car.rentals:
-        if not rental.deposit_refunded and (rental.end_date is None or rental.end_date >= today):
-            flash('Cannot defleet a car that is currently rented. Settle the rental first.')
-            return redirect(url_for('list_cars'))
+    if car_has_active_rental(car.id, today):
+        flash('Cannot defleet a car that is currently rented. Settle the rental first.')
+        return redirect(url_for('list_cars'))
     # Add defleet record if not already defleeted
     if car.defleet_record is None:
         rec = DefleetedCar(car_id=car.id, date=today)
@@ -324,9 +1122,175 @@ def defleet_car(car_id: int):
 # ---------------------------------------------------------------------------
 # Serve uploaded documents from the uploads directory.  Allows viewing and
 # downloading passport and licence files associated with customers.
+# Content-addressed documents never change under their URL
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename: str):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=False)
+    """
+    Serve a customer document.  Stored blobs use their SHA-256 as a strong
+    ETag and may be cached for good; a matching If-None-Match is answered
+    with 304 before the database or disk is touched.  Range requests are
+    honoured, and with DOCUMENT_SENDFILE set the front end server sends the
+    bytes instead of the worker.
+    """
+    digest, _, name = filename.partition('/')
+    if is_digest(digest) and name:
+        if digest in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(digest)
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+            return response
+        blob = db.session.get(Blob, digest)
+        if blob is None or not blob_store.exists(digest):
+            abort(404)
+        response = _send_document(blob_store.path_for(digest), blob.content_type, name, etag=digest)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+    # Documents uploaded before content-addressed storage; the name alone
+    # does not guarantee the content, so clients revalidate.
+    folder = app.config['UPLOAD_FOLDER']
+    if app.config['DOCUMENT_SENDFILE'] == 'x-accel':
+        path = safe_join(folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        response = _send_document(path, mimetypes.guess_type(filename)[0], None, etag=None)
+    else:
+        response = send_from_directory(folder, filename, as_attachment=False)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _send_document(path: str, mimetype, download_name, etag):
+    """send_file(), or an empty X-Accel-Redirect response for nginx to fill."""
+    if app.config['DOCUMENT_SENDFILE'] != 'x-accel':
+        return send_file(path, mimetype=mimetype, download_name=download_name,
+                         conditional=True, etag=etag if etag else True)
+    relative = os.path.relpath(path, app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+    response = Response(mimetype=mimetype or 'application/octet-stream')
+    response.headers['X-Accel-Redirect'] = app.config['DOCUMENT_ACCEL_PREFIX'].rstrip('/') + '/' + quote(relative)
+    if download_name:
+        response.headers['Content-Disposition'] = f'inline; filename="{download_name}"'
+    if etag:
+        response.set_etag(etag)
+    else:
+        stat = os.stat(path)
+        response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    return response.make_conditional(request)
+
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    limit = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    message = f"The uploaded file is too large (limit {limit} MB)."
+    # Form pages show the message on the form again; a POST-only endpoint
+    # cannot be fetched with GET, so it gets a plain 413
+    if request.url_rule is None or 'GET' not in request.url_rule.methods:
+        return message, 413
+    flash(message)
+    return redirect(request.path)
+
+
+# ---------------------------------------------------------------------------
+# Document storage.  Uploads are hashed while they are streamed to disk and
+# kept once per content; the Blob row counts the customer fields referring
+# to each file.  ``python app.py --gc-uploads`` recounts the references and
+# deletes files nothing refers to any more.
+
+blob_store = BlobStore(os.path.join(app.config['UPLOAD_FOLDER'], 'blobs'))
+DOCUMENT_FIELDS = ('passport_file', 'license_file')
+# Files younger than this are left alone by the collector, so an upload
+# whose request has not committed yet is not removed under it.
+UPLOAD_GC_GRACE = 3600
+
+
+def document_digest(ref):
+    """The blob digest of a document reference, or None for legacy file names."""
+    digest = (ref or '').partition('/')[0]
+    return digest if is_digest(digest) else None
+
+
+def store_upload(file_storage):
+    """Store an uploaded file and return its reference, or None if no file was sent."""
+    if not file_storage or not file_storage.filename:
+        return None
+    digest, size = blob_store.save_stream(file_storage.stream)
+    content_type = file_storage.mimetype or mimetypes.guess_type(file_storage.filename)[0]
+    # One statement, so two first uploads of the same file at once both count
+    blobs = Blob.__table__
+    db.session.execute(
+        _dialect_insert(blobs)
+        .values(sha256=digest, size=size, content_type=content_type, ref_count=1)
+        .on_conflict_do_update(index_elements=[blobs.c.sha256],
+                               set_={'ref_count': blobs.c.ref_count + 1}))
+    name = secure_filename(file_storage.filename) or 'document'
+    return f"{digest}/{name}"
+
+
+def release_upload(ref):
+    """Drop one reference to a stored document; the collector removes it at zero."""
+    digest = document_digest(ref)
+    if digest:
+        db.session.query(Blob).filter(Blob.sha256 == digest, Blob.ref_count > 0) \
+            .update({Blob.ref_count: Blob.ref_count - 1}, synchronize_session=False)
+
+
+def replace_document(customer: 'Customer', field: str, file_storage):
+    """Store a new upload for one of the customer's document fields, if one was sent."""
+    ref = store_upload(file_storage)
+    if ref:
+        release_upload(getattr(customer, field))
+        setattr(customer, field, ref)
+
+
+def document_references() -> Counter:
+    """How many customer fields refer to each blob digest."""
+    counts = Counter()
+    for field in DOCUMENT_FIELDS:
+        column = getattr(Customer, field)
+        for (ref,) in db.session.query(column).filter(column.isnot(None)):
+            counts[document_digest(ref)] += 1
+    counts.pop(None, None)
+    return counts
+
+
+def gc_uploads():
+    """Recount document references and delete blobs and legacy files nobody uses."""
+    refs = document_references()
+    cutoff = time.time() - UPLOAD_GC_GRACE
+    blobs = {blob.sha256: blob for blob in Blob.query}
+    for digest, blob in blobs.items():
+        blob.ref_count = refs[digest]
+    removed = 0
+    for digest, mtime in list(blob_store.digests()):
+        if refs[digest] == 0 and mtime < cutoff:
+            blob_store.delete(digest)
+            removed += 1
+            if digest in blobs:
+                db.session.delete(blobs.pop(digest))
+    # Rows whose file has gone (e.g. removed by hand)
+    for digest, blob in blobs.items():
+        if refs[digest] == 0 and not blob_store.exists(digest):
+            db.session.delete(blob)
+    for path in blob_store.stale_temp_files(cutoff):
+        os.remove(path)
+    # Files saved under their upload name before blobs existed
+    legacy_refs = set()
+    for field in DOCUMENT_FIELDS:
+        column = getattr(Customer, field)
+        legacy_refs.update(ref for (ref,) in db.session.query(column).filter(column.isnot(None))
+                           if not document_digest(ref))
+    folder = app.config['UPLOAD_FOLDER']
+    legacy_removed = 0
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path) and name not in legacy_refs and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                legacy_removed += 1
+    db.session.commit()
+    print(f"Removed {removed} unreferenced blobs and {legacy_removed} legacy files.")
 
 
 # ---------------------------------------------------------------------------
@@ -336,18 +1300,31 @@ def uploaded_file(filename: str):
 @app.route('/cars/defleeted')
 def list_defleeted_cars():
     # Join car with defleeted record to fetch defleet date
-    cars = db.session.query(Car).join(DefleetedCar).all()
+    cars = db.session.query(Car).join(DefleetedCar).options(contains_eager(Car.defleet_record)).all()
     return render_template('cars_defleeted.html', cars=cars)
 
 
+# ---------------------------------------------------------------------------
+# List pagination.  Every list page is paged with a keyset cursor over an
+# indexed sort column (see pagination.py) so a page costs the same however
+# long the history grows.  ``sorts`` is the whitelist of ?sort= values.
+
+def list_page(query, id_column, sorts: dict, default_sort: str, default_direction: str = 'asc', **view_args):
+    """Paginate query for the current request's list endpoint."""
+    return paginate(query, id_column, sorts, default_sort, default_direction,
+                    request.args, request.endpoint, view_args,
+                    per_page=app.config['PAGE_SIZE'])
+
+
 # ---------------------------------------------------------------------------
 # Settled rentals listing.  Shows rentals where the deposit has been fully
 # refunded (i.e. settled).  These rentals are separated from active rentals
 # to reduce clutter on the main rentals page.
 @app.route('/rentals/settled')
 def list_settled_rentals():
-    rentals = Rental.query.filter_by(deposit_refunded=True).all()
-    return render_template('settled_rentals.html', rentals=rentals)
+    page = list_page(Rental.query.options(*RENTAL_PARTIES).filter_by(deposit_refunded=True), Rental.id,
+                     {'start': Rental.start_date}, 'start')
+    return render_template('settled_rentals.html', rentals=page.items, page=page)
 
 
 @app.route('/')
@@ -359,33 +1336,48 @@ def index():
     and Salik costs for the current month.
     """
     today = date.today()
+    context = cached_view(('index', today), lambda: dashboard_context(today))
+    return render_template('index.html', today=today, **context)
+
+
+def overdue_rentals(today: date) -> list:
+    """
+    Active rentals with no payment, or whose last payment is more than one
+    billing interval before ``today``.  The last payment date is a MAX per
+    active rental, read from ix_payment_rental_date, and the active rentals
+    come from ix_rental_end_start, so the cost follows the number of active
+    rentals rather than the rental history.  (Grouping a join by rental id
+    instead would make SQLite walk every rental in primary key order.)
+    """
+    last_paid = (select(func.max(Payment.date))
+                 .where(Payment.rental_id == Rental.id)
+                 .scalar_subquery())
+    return (Rental.query
+            .filter(Rental.start_date.is_not(None),
+                    or_(Rental.end_date.is_(None), Rental.end_date >= today),
+                    or_(last_paid.is_(None),
+                        days_between(last_paid, today) > func.coalesce(Rental.billing_interval_days, 30)))
+            .options(*RENTAL_PARTIES)
+            .all())
+
+
+def dashboard_context(today: date) -> dict:
+    """Build the plain-data view model rendered by index()."""
     cars = Car.query.all()
     total_cars = len(cars)
-    rented_count = sum(1 for c in cars if is_rented_today(c, today))
-    booked_count = sum(1 for c in cars if (not is_rented_today(c, today)) and is_booked_today(c, today))
-    available_count = total_cars - rented_count - booked_count
+    counts = fleet_availability(today).counts(c.id for c in cars)
+    rented_count = counts['Rented']
+    booked_count = counts['Booked']
+    available_count = counts['Available']
 
     # upcoming renewals: currently only based on registration_date
     soon = today + timedelta(days=30)
     upcoming_renewals = []
     for c in cars:
         if c.registration_date and today <= c.registration_date <= soon:
-            upcoming_renewals.append({'car': c, 'type': 'Registration', 'date': c.registration_date})
+            upcoming_renewals.append({'car': car_view(c), 'type': 'Registration', 'date': c.registration_date})
     upcoming_renewals.sort(key=lambda x: x['date'])
 
-    # overdue rentals: rentals where last payment older than 30 days or no payment
-    overdue_rentals = []
-    rentals = Rental.query.all()
-    for r in rentals:
-        # only consider active rentals (no end date or end date >= today)
-        if r.start_date and (r.end_date is None or r.end_date >= today):
-            last_payment_date = None
-            # sort payments by date to find last
-            for p in sorted(r.payments, key=lambda p: p.date or date.min):
-                last_payment_date = p.date
-            if last_payment_date is None or (last_payment_date and (today - last_payment_date).days > 30):
-                overdue_rentals.append(r)
-
     # unpaid fines and damages totals
     unpaid_fines = Fine.query.filter_by(paid=False).all()
     unpaid_damages = Damage.query.filter_by(paid=False).all()
@@ -403,21 +1395,21 @@ def index():
         'unpaid_damages': sum(d.amount or 0 for d in unpaid_damages),
         'salik_unpaid_month': sum(e.cost or 0 for e in salik_expenses),
     }
-    return render_template('index.html',
-                           total_cars=total_cars,
-                           rented=rented_count,
-                           booked=booked_count,
-                           available=available_count,
-                           upcoming_renewals=upcoming_renewals,
-                           overdue_rentals=overdue_rentals,
-                           totals=totals,
-                           today=today)
+    return {
+        'total_cars': total_cars,
+        'rented': rented_count,
+        'booked': booked_count,
+        'available': available_count,
+        'upcoming_renewals': upcoming_renewals,
+        'overdue_rentals': [rental_view(r) for r in sorted(overdue_rentals(today), key=lambda r: r.id)],
+        'totals': totals,
+    }
 
 
 @app.route('/customers')
 def list_customers():
-    customers = Customer.query.all()
-    return render_template('customers.html', customers=customers)
+    page = list_page(Customer.query, Customer.id, {'name': Customer.name}, 'name')
+    return render_template('customers.html', customers=page.items, page=page)
 
 
 @app.route('/customers/add', methods=['GET', 'POST'])
@@ -426,23 +1418,11 @@ def add_customer():
         name = request.form['name']
         phone = request.form.get('phone')
         address = request.form.get('address')
-        # Handle file uploads. Save to UPLOAD_FOLDER and store filename
-        passport_file_obj = request.files.get('passport_file')
-        license_file_obj = request.files.get('license_file')
-        passport_filename = None
-        license_filename = None
-        import os
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        if passport_file_obj and passport_file_obj.filename:
-            passport_filename = f"passport_{datetime.utcnow().timestamp()}_{passport_file_obj.filename}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], passport_filename)
-            passport_file_obj.save(save_path)
-        if license_file_obj and license_file_obj.filename:
-            license_filename = f"license_{datetime.utcnow().timestamp()}_{license_file_obj.filename}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], license_filename)
-            license_file_obj.save(save_path)
+        # Handle file uploads; each is stored once per content in the blob store
+        passport_ref = store_upload(request.files.get('passport_file'))
+        license_ref = store_upload(request.files.get('license_file'))
         customer = Customer(name=name, phone=phone, address=address,
-                            passport_file=passport_filename, license_file=license_filename)
+                            passport_file=passport_ref, license_file=license_ref)
         db.session.add(customer)
         db.session.commit()
         return redirect(url_for('list_customers'))
@@ -457,20 +1437,8 @@ def edit_customer(customer_id: int):
         customer.phone = request.form.get('phone')
         customer.address = request.form.get('address')
         # handle file uploads (replace existing files if provided)
-        passport_file_obj = request.files.get('passport_file')
-        license_file_obj = request.files.get('license_file')
-        import os
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        if passport_file_obj and passport_file_obj.filename:
-            passport_filename = f"passport_{datetime.utcnow().timestamp()}_{passport_file_obj.filename}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], passport_filename)
-            passport_file_obj.save(save_path)
-            customer.passport_file = passport_filename
-        if license_file_obj and license_file_obj.filename:
-            license_filename = f"license_{datetime.utcnow().timestamp()}_{license_file_obj.filename}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], license_filename)
-            license_file_obj.save(save_path)
-            customer.license_file = license_filename
+        for field in DOCUMENT_FIELDS:
+            replace_document(customer, field, request.files.get(field))
         db.session.commit()
         return redirect(url_for('list_customers'))
     return render_template('edit_customer.html', customer=customer)
@@ -479,6 +1447,8 @@ def edit_customer(customer_id: int):
 @app.route('/customers/delete/<int:customer_id>', methods=['POST'])
 def delete_customer(customer_id: int):
     customer = Customer.query.get_or_404(customer_id)
+    for field in DOCUMENT_FIELDS:
+        release_upload(getattr(customer, field))
     db.session.delete(customer)
     db.session.commit()
     return redirect(url_for('list_customers'))
@@ -495,12 +1465,13 @@ def list_cars():
     expenses along with controls to reorder (up/down), defleet, add
     expenses, view expenses and edit/delete the car.
     """
-    ensure_car_order()
-    # Join car with order and defleet tables to sort and filter
-    query = (db.session.query(Car)
-             .outerjoin(CarOrder, Car.id == CarOrder.car_id)
-             .outerjoin(DefleetedCar, Car.id == DefleetedCar.car_id))
-    cars = query.filter(DefleetedCar.id.is_(None)).order_by(CarOrder.order_index.asc()).all()
+    context = cached_view(('cars', date.today()), cars_context)
+    return render_template('cars.html', **context)
+
+
+def cars_context() -> dict:
+    """Build the plain-data view model rendered by list_cars()."""
+    cars = ordered_active_cars()
     # Compute per-car totals and global summary
     car_infos = []
     total_initial_value = 0.0
@@ -508,10 +1479,12 @@ def list_cars():
     total_expenses_sum = 0.0
     age_values = []
     current_year = date.today().year
+    ledgers = ledger_by_car()
     for car in cars:
         total_value = (car.purchase_price or 0.0) + (car.initial_investment or 0.0)
-        total_expenses = sum(exp.cost or 0.0 for exp in car.expenses)
-        car_infos.append({'car': car, 'total_value': total_value, 'total_expenses': total_expenses})
+        ledger = ledgers.get(car.id)
+        total_expenses = (ledger.expenses or 0.0) if ledger else 0
+        car_infos.append({'car': car_view(car), 'total_value': total_value, 'total_expenses': total_expenses})
         total_initial_value += total_value
         total_planned_rent += (car.planned_rent or 0.0)
         total_expenses_sum += total_expenses
@@ -524,7 +1497,7 @@ def list_cars():
         'total_planned_rent': total_planned_rent,
         'total_expenses': total_expenses_sum
     }
-    return render_template('cars.html', car_infos=car_infos, summary=summary)
+    return {'car_infos': car_infos, 'summary': summary}
 
 
 @app.route('/cars/add', methods=['GET', 'POST'])
@@ -563,14 +1536,10 @@ def add_car():
             planned_rent=float(planned_rent) if planned_rent else None,
         )
         db.session.add(car)
-        db.session.commit()
+        db.session.flush()
         # Assign ordering for the new car at the end of the list
-        ensure_car_order()
-        max_index = db.session.query(func.max(CarOrder.order_index)).scalar() or 0
-        # Only create a CarOrder if one does not exist (should not for new cars)
-        if not CarOrder.query.filter_by(car_id=car.id).first():
-            db.session.add(CarOrder(car_id=car.id, order_index=max_index + 1))
-            db.session.commit()
+        db.session.add(CarOrder(car_id=car.id, order_index=next_car_order_index()))
+        db.session.commit()
         return redirect(url_for('list_cars'))
     return render_template('add_car.html')
 
@@ -615,6 +1584,7 @@ def delete_car(car_id: int):
     # Remove associated ordering and defleet records
     CarOrder.query.filter_by(car_id=car.id).delete()
     DefleetedCar.query.filter_by(car_id=car.id).delete()
+    CarLedger.query.filter_by(car_id=car.id).delete()
     db.session.delete(car)
     db.session.commit()
     return redirect(url_for('list_cars'))
@@ -628,8 +1598,9 @@ def list_rentals():
     separate 'Settled Rentals' section.  Sorting by start date keeps
     current rentals at the top.
     """
-    rentals = Rental.query.filter_by(deposit_refunded=False).order_by(Rental.start_date.asc()).all()
-    return render_template('rentals.html', rentals=rentals)
+    page = list_page(Rental.query.options(*RENTAL_PARTIES).filter_by(deposit_refunded=False), Rental.id,
+                     {'start': Rental.start_date}, 'start')
+    return render_template('rentals.html', rentals=page.items, page=page)
 
 
 @app.route('/rentals/add', methods=['GET', 'POST'])
@@ -653,20 +1624,9 @@ def add_rental():
         # and its end (if any) is after or on the new rental start.  We allow
         # creating a new rental if the existing rental's end date is before the
         # new start date.
-        overlapping = False
-        existing_rentals = Rental.query.filter_by(car_id=car_id).all()
-        for r in existing_rentals:
-            # Skip if the rental is the same (should not occur on add)
-            # Determine r's end for comparison
-            r_end = r.end_date or date.max
-            new_end = end_date or date.max
-            # Overlap occurs when ranges intersect
-            if r.start_date <= new_end and start_date <= r_end:
-                overlapping = True
-                conflict_rental = r
-                break
-        if overlapping:
-            flash(f"This car is already assigned to another rental (start {conflict_rental.start_date.strftime('%d/%m/%Y')} to {'Open' if not conflict_rental.end_date else conflict_rental.end_date.strftime('%d/%m/%Y')}). Please choose a different car or adjust dates.")
+        conflict = car_intervals.find_overlap(car_id, start_date, end_date, kinds=('rental',))
+        if conflict:
+            flash(f"This car is already assigned to another rental ({describe_interval(conflict)}). Please choose a different car or adjust dates.")
             return render_template('add_rental.html', cars=cars, customers=customers)
 
         rental = Rental(
@@ -679,11 +1639,14 @@ def add_rental():
             actual_rent=float(actual_rent) if actual_rent else None,
             deposit=float(deposit) if deposit else None,
         )
-        # Initialize billing interval and next billing date
+        # Initialize billing interval; the first period is due on the start date
         rental.billing_interval_days = 30
-        rental.next_billing_date = start_date + timedelta(days=rental.billing_interval_days)
+        rental.next_billing_date = start_date
         db.session.add(rental)
-        db.session.commit()
+        conflict = commit_unless_overlapping(rental, kinds=('rental',))
+        if conflict:
+            flash(f"This car is already assigned to another rental ({describe_interval(conflict)}). Please choose a different car or adjust dates.")
+            return render_template('add_rental.html', cars=cars, customers=customers)
         return redirect(url_for('list_rentals'))
     return render_template('add_rental.html', cars=cars, customers=customers)
 
@@ -694,11 +1657,22 @@ def edit_rental(rental_id: int):
     cars = Car.query.all()
     customers = Customer.query.all()
     if request.method == 'POST':
-        rental.car_id = int(request.form['car_id'])
-        rental.customer_id = int(request.form['customer_id'])
+        car_id = int(request.form['car_id'])
         start_date = datetime.strptime(request.form['start_date'], '%d/%m/%Y').date()
         end_date_str = request.form.get('end_date')
         end_date = datetime.strptime(end_date_str, '%d/%m/%Y').date() if end_date_str else None
+        # Same overlap rule as add_rental, ignoring this rental itself.  The
+        # check runs before any attribute is changed so nothing is flushed.
+        conflict = car_intervals.find_overlap(car_id, start_date, end_date, kinds=('rental',),
+                                              exclude=('rental', rental.id))
+        if conflict:
+            flash(f"This car is already assigned to another rental ({describe_interval(conflict)}). Please choose a different car or adjust dates.")
+            return redirect(url_for('edit_rental', rental_id=rental.id))
+        rental.car_id = car_id
+        rental.customer_id = int(request.form['customer_id'])
+        # Billing has not started yet: keep the first period on the start date
+        if rental.next_billing_date == rental.start_date:
+            rental.next_billing_date = start_date
         rental.start_date = start_date
         rental.end_date = end_date
         rental.contract_type = 'fixed' if end_date else 'open'
@@ -708,7 +1682,10 @@ def edit_rental(rental_id: int):
         rental.planned_rent = float(planned_rent) if planned_rent else None
         rental.actual_rent = float(actual_rent) if actual_rent else None
         rental.deposit = float(deposit) if deposit else None
-        db.session.commit()
+        conflict = commit_unless_overlapping(rental, kinds=('rental',))
+        if conflict:
+            flash(f"This car is already assigned to another rental ({describe_interval(conflict)}). Please choose a different car or adjust dates.")
+            return redirect(url_for('edit_rental', rental_id=rental_id))
         return redirect(url_for('list_rentals'))
     # Format dates for display
     start = rental.start_date.strftime('%d/%m/%Y') if rental.start_date else ''
@@ -739,42 +1716,23 @@ def add_payment(rental_id):
     payment.  Unchecked items remain outstanding and will appear in future
     due summaries or settlements.
     """
-    rental = Rental.query.get_or_404(rental_id)
+    rental = Rental.query.options(*RENTAL_PARTIES).get_or_404(rental_id)
+    if request.method == 'POST':
+        # Same checks and set-based writes as a bulk posting of one payment,
+        # except that a zero or negative amount records a refund or correction
+        row = {field: request.form.getlist(field) for field in ('fine_ids', 'damage_ids', 'salik_ids')}
+        row.update(rental_id=rental.id, amount=request.form.get('amount'),
+                   date=request.form.get('date'), location=request.form.get('location'))
+        try:
+            post_payments(parse_postings([row], label=None, positive_only=False), label=None)
+        except (PostingError, RuntimeError) as exc:
+            flash(str(exc))
+            return redirect(url_for('add_payment', rental_id=rental.id))
+        return redirect(url_for('list_rentals'))
     # Gather outstanding fines, damages and salik for this rental
     outstanding_fines = [f for f in rental.customer.fines if f.car_id == rental.car_id and not f.paid]
     outstanding_damages = [d for d in rental.customer.damages if d.car_id == rental.car_id and not d.paid]
     outstanding_salik = [s for s in rental.salik_entries if not getattr(s, 'paid', False)]
-    if request.method == 'POST':
-        amount = float(request.form['amount'])
-        pay_date = datetime.strptime(request.form['date'], '%d/%m/%Y').date()
-        location = request.form.get('location')
-        payment = Payment(rental_id=rental.id, amount=amount, date=pay_date, location=location)
-        db.session.add(payment)
-        # Process selected fines/damages/salik: mark as paid via rent
-        # request.form.getlist returns list of strings for the given name
-        selected_fines = request.form.getlist('fine_ids')
-        selected_damages = request.form.getlist('damage_ids')
-        selected_salik = request.form.getlist('salik_ids')
-        # Mark fines
-        for fid in selected_fines:
-            fine_obj = Fine.query.get(int(fid))
-            if fine_obj:
-                fine_obj.paid = True
-                fine_obj.settled_via = 'rent'
-        # Mark damages
-        for did in selected_damages:
-            dmg_obj = Damage.query.get(int(did))
-            if dmg_obj:
-                dmg_obj.paid = True
-                dmg_obj.settled_via = 'rent'
-        # Mark salik
-        for sid in selected_salik:
-            salik_obj = Salik.query.get(int(sid))
-            if salik_obj:
-                salik_obj.paid = True
-                salik_obj.settled_via = 'rent'
-        db.session.commit()
-        return redirect(url_for('list_rentals'))
     return render_template('add_payment.html', rental=rental,
                            outstanding_fines=outstanding_fines,
                            outstanding_damages=outstanding_damages,
@@ -805,9 +1763,11 @@ def delete_payment(payment_id: int):
 
 @app.route('/payments/rental/<int:rental_id>')
 def list_payments_for_rental(rental_id: int):
-    rental = Rental.query.get_or_404(rental_id)
-    payments = rental.payments
-    return render_template('payments_list.html', rental=rental, payments=payments)
+    rental = Rental.query.options(*RENTAL_PARTIES).get_or_404(rental_id)
+    page = list_page(Payment.query.filter_by(rental_id=rental.id), Payment.id,
+                     {'date': Payment.date, 'amount': Payment.amount}, 'date',
+                     rental_id=rental.id)
+    return render_template('payments_list.html', rental=rental, payments=page.items, page=page)
 
 
 @app.route('/expenses/add/<int:car_id>', methods=['GET', 'POST'])
@@ -837,9 +1797,11 @@ def add_expense(car_id):
 def expenses_overview():
     """Show total expenses per car."""
     cars = Car.query.all()
+    ledgers = ledger_by_car()
     rows = []
     for car in cars:
-        total = sum(e.cost or 0 for e in car.expenses)
+        ledger = ledgers.get(car.id)
+        total = (ledger.expenses or 0) if ledger else 0
         rows.append({'car': car, 'total': total})
     return render_template('expenses_overview.html', rows=rows)
 
@@ -847,8 +1809,10 @@ def expenses_overview():
 @app.route('/expenses/car/<int:car_id>')
 def expenses_by_car(car_id: int):
     car = Car.query.get_or_404(car_id)
-    expenses = car.expenses
-    return render_template('expenses_list.html', car=car, expenses=expenses)
+    page = list_page(Expense.query.filter_by(car_id=car.id), Expense.id,
+                     {'date': Expense.date, 'cost': Expense.cost}, 'date',
+                     car_id=car.id)
+    return render_template('expenses_list.html', car=car, expenses=page.items, page=page)
 
 
 @app.route('/expenses/edit/<int:expense_id>', methods=['GET', 'POST'])
@@ -926,10 +1890,12 @@ def delete_fine(fine_id: int):
 
 @app.route('/fines/rental/<int:rental_id>')
 def list_fines_for_rental(rental_id: int):
-    rental = Rental.query.get_or_404(rental_id)
+    rental = Rental.query.options(*RENTAL_PARTIES).get_or_404(rental_id)
     # Only fines for this car and customer during this rental period
-    fines = [f for f in rental.customer.fines if f.car_id == rental.car_id]
-    return render_template('fines_list.html', rental=rental, fines=fines)
+    page = list_page(Fine.query.filter_by(customer_id=rental.customer_id, car_id=rental.car_id),
+                     Fine.id, {'date': Fine.date, 'amount': Fine.amount}, 'date',
+                     rental_id=rental.id)
+    return render_template('fines_list.html', rental=rental, fines=page.items, page=page)
 
 
 @app.route('/damages/add/<int:car_id>/<int:customer_id>', methods=['GET', 'POST'])
@@ -978,9 +1944,11 @@ def delete_damage(damage_id: int):
 
 @app.route('/damages/rental/<int:rental_id>')
 def list_damages_for_rental(rental_id: int):
-    rental = Rental.query.get_or_404(rental_id)
-    damages = [d for d in rental.customer.damages if d.car_id == rental.car_id]
-    return render_template('damages_list.html', rental=rental, damages=damages)
+    rental = Rental.query.options(*RENTAL_PARTIES).get_or_404(rental_id)
+    page = list_page(Damage.query.filter_by(customer_id=rental.customer_id, car_id=rental.car_id),
+                     Damage.id, {'date': Damage.date, 'amount': Damage.amount}, 'date',
+                     rental_id=rental.id)
+    return render_template('damages_list.html', rental=rental, damages=page.items, page=page)
 
 
 # ---------------------------------------------------------------------------
@@ -989,8 +1957,9 @@ def list_damages_for_rental(rental_id: int):
 @app.route('/bookings')
 def list_bookings():
     """List all bookings."""
-    bookings = Booking.query.order_by(Booking.start_date.desc()).all()
-    return render_template('bookings.html', bookings=bookings)
+    page = list_page(Booking.query.options(*BOOKING_PARTIES), Booking.id,
+                     {'start': Booking.start_date, 'end': Booking.end_date}, 'start', 'desc')
+    return render_template('bookings.html', bookings=page.items, page=page)
 
 
 @app.route('/bookings/add', methods=['GET', 'POST'])
@@ -1005,26 +1974,19 @@ def add_booking():
         start_date = datetime.strptime(request.form['start_date'], '%d/%m/%Y').date()
         end_date = datetime.strptime(request.form['end_date'], '%d/%m/%Y').date()
         note = request.form.get('note')
-        # Check if the car has an active rental whose end date overlaps the booking start
-        conflict_rental = None
-        rentals_for_car = Rental.query.filter_by(car_id=car_id).all()
-        for r in rentals_for_car:
-            # A rental is active if it started and has not ended yet (or ends in future)
-            if r.start_date and (r.end_date is None or r.end_date >= start_date):
-                # Only consider conflict if rental started before or on the booking start date
-                if r.start_date <= start_date:
-                    conflict_rental = r
-                    break
-        if conflict_rental and conflict_rental.end_date and conflict_rental.end_date >= start_date:
-            # Warn the user that booking overlaps existing rental
-            from flask import flash
-            flash(f"Selected start date overlaps an active rental for this car which ends on {conflict_rental.end_date.strftime('%d/%m/%Y')}. Please adjust the booking dates.")
+        # A booking may not overlap a rental or another booking of the car
+        conflict = car_intervals.find_overlap(car_id, start_date, end_date, kinds=('rental', 'booking'))
+        if conflict:
+            flash(f"Selected dates overlap an existing {conflict.kind} for this car ({describe_interval(conflict)}). Please adjust the booking dates.")
             return render_template('add_booking.html', cars=cars, customers=customers)
         # Otherwise proceed to create booking
         b = Booking(car_id=car_id, customer_id=cust_id_val,
                     start_date=start_date, end_date=end_date, note=note)
         db.session.add(b)
-        db.session.commit()
+        conflict = commit_unless_overlapping(b, kinds=('rental', 'booking'))
+        if conflict:
+            flash(f"Selected dates overlap an existing {conflict.kind} for this car ({describe_interval(conflict)}). Please adjust the booking dates.")
+            return render_template('add_booking.html', cars=cars, customers=customers)
         return redirect(url_for('list_bookings'))
     return render_template('add_booking.html', cars=cars, customers=customers)
 
@@ -1035,13 +1997,24 @@ def edit_booking(booking_id: int):
     cars = Car.query.order_by(Car.licence_plate.asc()).all()
     customers = Customer.query.order_by(Customer.name.asc()).all()
     if request.method == 'POST':
-        booking.car_id = int(request.form['car_id'])
+        car_id = int(request.form['car_id'])
+        start_date = datetime.strptime(request.form['start_date'], '%d/%m/%Y').date()
+        end_date = datetime.strptime(request.form['end_date'], '%d/%m/%Y').date()
+        conflict = car_intervals.find_overlap(car_id, start_date, end_date, kinds=('rental', 'booking'),
+                                              exclude=('booking', booking.id))
+        if conflict:
+            flash(f"Selected dates overlap an existing {conflict.kind} for this car ({describe_interval(conflict)}). Please adjust the booking dates.")
+            return redirect(url_for('edit_booking', booking_id=booking.id))
+        booking.car_id = car_id
         cust_id = request.form.get('customer_id')
         booking.customer_id = int(cust_id) if cust_id else None
-        booking.start_date = datetime.strptime(request.form['start_date'], '%d/%m/%Y').date()
-        booking.end_date = datetime.strptime(request.form['end_date'], '%d/%m/%Y').date()
+        booking.start_date = start_date
+        booking.end_date = end_date
         booking.note = request.form.get('note')
-        db.session.commit()
+        conflict = commit_unless_overlapping(booking, kinds=('rental', 'booking'))
+        if conflict:
+            flash(f"Selected dates overlap an existing {conflict.kind} for this car ({describe_interval(conflict)}). Please adjust the booking dates.")
+            return redirect(url_for('edit_booking', booking_id=booking_id))
         return redirect(url_for('list_bookings'))
     start = booking.start_date.strftime('%d/%m/%Y') if booking.start_date else ''
     end = booking.end_date.strftime('%d/%m/%Y') if booking.end_date else ''
@@ -1065,48 +2038,72 @@ def availability():
     open ended.  This helps users plan future bookings.
     """
     today = date.today()
-    # Sort cars by custom ordering and exclude defleeted cars
-    ensure_car_order()
-    query = (db.session.query(Car)
-             .outerjoin(CarOrder, Car.id == CarOrder.car_id)
-             .outerjoin(DefleetedCar, Car.id == DefleetedCar.car_id))
-    cars = query.filter(DefleetedCar.id.is_(None)).order_by(CarOrder.order_index.asc()).all()
-    rows = []
-    for c in cars:
-        status = 'Available'
-        info = ''
-        if is_rented_today(c, today):
-            status = 'Rented'
-            # Determine the active rental overlapping today
-            active_rental = None
-            for r in c.rentals:
-                if r.start_date and (r.end_date is None or r.end_date >= today) and r.start_date <= today:
-                    active_rental = r
-                    break
-            if active_rental:
-                if active_rental.end_date:
-                    # Show when the car will be free again (the day after end date)
-                    available_date = active_rental.end_date + timedelta(days=1)
-                    info = f"Available from {available_date.strftime('%d/%m/%Y')}"
-                else:
-                    info = "Open ended"
-        elif is_booked_today(c, today):
-            status = 'Booked'
-            # Determine the active booking overlapping today
-            active_booking = None
-            for b in c.bookings:
-                if date_in_range(today, b.start_date, b.end_date):
-                    active_booking = b
-                    break
-            if active_booking:
-                info = f"Booked until {active_booking.end_date.strftime('%d/%m/%Y')}"
-        else:
-            status = 'Available'
-            info = ''
-        rows.append({'car': c, 'status': status, 'info': info})
+    rows = cached_view(('availability', today), lambda: availability_rows(today))
     return render_template('availability.html', rows=rows, today=today)
 
 
+def availability_rows(today: date) -> list:
+    """Build the plain-data rows rendered by availability()."""
+    # Sort cars by custom ordering and exclude defleeted cars
+    cars = ordered_active_cars()
+    fleet = fleet_availability(today)
+    return [{'car': car_view(c), 'status': fleet.status(c.id), 'info': fleet.info(c.id)} for c in cars]
+
+
+# ---------------------------------------------------------------------------
+# Occupancy planning.  /api/occupancy returns the state of every car on every
+# day of a range (90 days from today unless ?from=&to= say otherwise, both
+# DD/MM/YYYY).  Rentals, bookings and defleet dates are loaded with one query
+# each and painted onto a cars x days grid by occupancy.py.  Each car's row is
+# sent as a string with one digit per day, indexing ``states``.
+
+OCCUPANCY_DEFAULT_DAYS = 90
+OCCUPANCY_MAX_DAYS = 731
+
+
+def occupancy(first: date, last: date) -> dict:
+    """Cars (active first, in list order, then defleeted) and their daily states."""
+    # Imported here so NumPy is only loaded by the processes that plan occupancy
+    from occupancy import STATES, encode_rows, occupancy_grid
+    cars = (db.session.query(Car.id, Car.licence_plate, Car.model, DefleetedCar.date)
+            .outerjoin(CarOrder, Car.id == CarOrder.car_id)
+            .outerjoin(DefleetedCar, Car.id == DefleetedCar.car_id)
+            .order_by(DefleetedCar.id.isnot(None), CarOrder.order_index.is_(None),
+                      CarOrder.order_index.asc(), Car.id.asc())
+            .all())
+    rentals = (db.session.query(Rental.car_id, Rental.start_date, Rental.end_date)
+               .filter(Rental.start_date <= last,
+                       or_(Rental.end_date.is_(None), Rental.end_date >= first))
+               .all())
+    bookings = (db.session.query(Booking.car_id, Booking.start_date, Booking.end_date)
+                .filter(Booking.start_date <= last, Booking.end_date >= first)
+                .all())
+    defleets = [(car_id, defleeted) for car_id, _, _, defleeted in cars
+                if defleeted is not None and defleeted <= last]
+    grid = occupancy_grid([car_id for car_id, *_ in cars], first, last, rentals, bookings, defleets)
+    return {
+        'from': first.strftime('%d/%m/%Y'),
+        'to': last.strftime('%d/%m/%Y'),
+        'days': grid.shape[1],
+        'states': list(STATES),
+        'cars': [{'id': car_id, 'licence_plate': plate, 'model': model}
+                 for car_id, plate, model, _ in cars],
+        'rows': encode_rows(grid),
+    }
+
+
+@app.route('/api/occupancy')
+def api_occupancy():
+    first = _request_date('from', date.today())
+    last = _request_date('to', first + timedelta(days=OCCUPANCY_DEFAULT_DAYS - 1))
+    if last < first:
+        abort(400, description="'to' is before 'from'.")
+    if (last - first).days >= OCCUPANCY_MAX_DAYS:
+        abort(400, description=f"At most {OCCUPANCY_MAX_DAYS} days can be requested at once.")
+    payload = cached_view(('occupancy', first, last), lambda: occupancy(first, last))
+    return jsonify(payload)
+
+
 # ---------------------------------------------------------------------------
 # Rental settlement – close a rental and handle deposit refund and charge settlement
 
@@ -1117,7 +2114,7 @@ def settle_rental(rental_id: int):
     and calculating any refund due to the customer. Displays a confirmation
     form on GET and performs the settlement on POST.
     """
-    rental = Rental.query.get_or_404(rental_id)
+    rental = Rental.query.options(*RENTAL_PARTIES).get_or_404(rental_id)
     # Determine all fines/damages linked to this rental's car/customer that are unpaid
     outstanding_fines = [f for f in rental.customer.fines if f.car_id == rental.car_id and not f.paid]
     outstanding_damages = [d for d in rental.customer.damages if d.car_id == rental.car_id and not d.paid]
@@ -1168,7 +2165,7 @@ def add_salik(rental_id: int):
     a specific date range. The cost will be associated with the rental's
     car and the rental itself.
     """
-    rental = Rental.query.get_or_404(rental_id)
+    rental = Rental.query.options(*RENTAL_PARTIES).get_or_404(rental_id)
     if request.method == 'POST':
         start_date = datetime.strptime(request.form['start_date'], '%d/%m/%Y').date()
         end_date = datetime.strptime(request.form['end_date'], '%d/%m/%Y').date()
@@ -1216,9 +2213,310 @@ def delete_salik(salik_id: int):
 @app.route('/salik/rental/<int:rental_id>')
 def list_salik_for_rental(rental_id: int):
     """List all Salik entries for a given rental."""
-    rental = Rental.query.get_or_404(rental_id)
-    entries = rental.salik_entries
-    return render_template('salik_list.html', rental=rental, entries=entries)
+    rental = Rental.query.options(*RENTAL_PARTIES).get_or_404(rental_id)
+    page = list_page(Salik.query.filter_by(rental_id=rental.id), Salik.id,
+                     {'start': Salik.start_date, 'amount': Salik.amount}, 'start',
+                     rental_id=rental.id)
+    return render_template('salik_list.html', rental=rental, entries=page.items, page=page)
+
+
+# ---------------------------------------------------------------------------
+# Salik statement import.  An uploaded statement is first matched and shown
+# as a preview (nothing is written); confirming re-reads the saved file and
+# inserts one Salik row per rental in a single transaction.  Rows identical
+# to an existing entry (same rental and dates) are skipped so a statement
+# imported twice does not double charge.  See salik_import.py.
+
+SALIK_IMPORT_DIR = os.path.join(app.instance_path, 'salik_imports')
+# Statement formats salik_import.read_statement() understands
+SALIK_EXTENSIONS = ('.csv', '.xlsx')
+
+
+def plan_salik_import(path: str):
+    """Match a statement file against cars and rentals; returns (plan, rows)."""
+    # Imported here so pandas is only loaded by the processes that import statements
+    from salik_import import normalise_tag, plan_import, read_statement
+    car_by_tag = {}
+    for car_id, tag in db.session.query(Car.id, Car.salik_tag).filter(Car.salik_tag.isnot(None)):
+        if normalise_tag(tag):
+            car_by_tag[normalise_tag(tag)] = car_id
+    rentals = (db.session.query(Rental.id, Rental.car_id, Rental.start_date, Rental.end_date)
+               .filter(Rental.car_id.in_(set(car_by_tag.values())))
+               .all())
+    plan = plan_import(read_statement(path), car_by_tag, rentals)
+    rows = plan.rows
+    existing = set(db.session.query(Salik.rental_id, Salik.start_date, Salik.end_date)
+                   .filter(Salik.rental_id.in_({row['rental_id'] for row in rows}))
+                   .all())
+    for row in rows:
+        row['duplicate'] = (row['rental_id'], row['start_date'], row['end_date']) in existing
+    return plan, rows
+
+
+def apply_salik_import(rows) -> tuple:
+    """Insert the non-duplicate rows in one commit; returns (entries, total amount)."""
+    new_rows = [row for row in rows if not row['duplicate']]
+    db.session.add_all([Salik(car_id=row['car_id'], rental_id=row['rental_id'],
+                              start_date=row['start_date'], end_date=row['end_date'],
+                              amount=row['amount'], paid=False)
+                        for row in new_rows])
+    db.session.commit()
+    return len(new_rows), round(sum(row['amount'] for row in new_rows), 2)
+
+
+def _salik_upload_path(token: str):
+    """Path of a previously uploaded statement, or None if unknown."""
+    if not re.fullmatch(r'[0-9a-f]{32}', token or ''):
+        return None
+    for extension in SALIK_EXTENSIONS:
+        path = os.path.join(SALIK_IMPORT_DIR, token + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _discard_stale_salik_uploads(max_age: int = 86400):
+    """Remove statements that were previewed but never imported."""
+    cutoff = datetime.now().timestamp() - max_age
+    for name in os.listdir(SALIK_IMPORT_DIR):
+        path = os.path.join(SALIK_IMPORT_DIR, name)
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+
+@app.route('/salik/import', methods=['GET', 'POST'])
+def import_salik():
+    """Upload a Salik toll statement, preview the matched entries and import them."""
+    if request.method == 'POST' and request.form.get('token'):
+        path = _salik_upload_path(request.form['token'])
+        if path is None:
+            flash('That statement is no longer available. Please upload it again.')
+            return redirect(url_for('import_salik'))
+        plan, rows = plan_salik_import(path)
+        created, total = apply_salik_import(rows)
+        os.remove(path)
+        flash(f"Imported {created} Salik entries totalling AED {total:.2f}.")
+        return redirect(url_for('list_rentals'))
+    if request.method == 'POST':
+        upload = request.files.get('statement')
+        extension = os.path.splitext(upload.filename)[1].lower() if upload and upload.filename else ''
+        if extension not in SALIK_EXTENSIONS:
+            flash('Please choose a CSV or XLSX statement.')
+            return redirect(url_for('import_salik'))
+        os.makedirs(SALIK_IMPORT_DIR, exist_ok=True)
+        _discard_stale_salik_uploads()
+        token = uuid.uuid4().hex
+        path = os.path.join(SALIK_IMPORT_DIR, token + extension)
+        upload.save(path)
+        try:
+            plan, rows = plan_salik_import(path)
+        except ValueError as exc:
+            os.remove(path)
+            flash(str(exc))
+            return redirect(url_for('import_salik'))
+        labels = {rental_id: (plate, name) for rental_id, plate, name in
+                  db.session.query(Rental.id, Car.licence_plate, Customer.name)
+                  .join(Car, Rental.car_id == Car.id).join(Customer, Rental.customer_id == Customer.id)
+                  .filter(Rental.id.in_({row['rental_id'] for row in rows}))}
+        plates = dict(db.session.query(Car.id, Car.licence_plate)
+                      .filter(Car.id.in_(set(plan.unrented))).all())
+        return render_template('salik_import.html', plan=plan, rows=rows, token=token,
+                               labels=labels, plates=plates, filename=upload.filename)
+    return render_template('salik_import.html', plan=None)
+
+
+def import_salik_file(path: str, dry_run: bool = False):
+    """Command line import of a statement, printing the same summary as the preview."""
+    plan, rows = plan_salik_import(path)
+    duplicates = sum(1 for row in rows if row['duplicate'])
+    print(f"{plan.trips} trips read: {plan.matched} matched, {sum(plan.unknown_tags.values())} on "
+          f"unknown tags, {sum(plan.unrented.values())} outside rentals, {plan.invalid} invalid.")
+    print(f"{len(rows) - duplicates} Salik entries to create, {duplicates} already imported.")
+    if not dry_run:
+        created, total = apply_salik_import(rows)
+        print(f"Imported {created} Salik entries totalling AED {total:.2f}.")
+
+
+# ---------------------------------------------------------------------------
+# Bulk payment posting.  A month-end run posts the rent received for many
+# rentals at once, each payment optionally settling fines, damages and Salik
+# entries (see bulk_payments.py for the input formats).  Charges are looked up
+# with one query per table, checked against their rentals, and the payments
+# and allocations are written with set-based statements in one transaction,
+# so a posting either goes through whole or not at all.
+
+CHARGE_MODELS = (('fine_ids', Fine), ('damage_ids', Damage), ('salik_ids', Salik))
+
+# Ids per IN list, below SQLite's limit on bound parameters
+POSTING_CHUNK = 5000
+
+
+def _chunked(ids) -> list:
+    ids = sorted(ids)
+    return [ids[offset:offset + POSTING_CHUNK] for offset in range(0, len(ids), POSTING_CHUNK)]
+
+
+def _allocation_errors(conn, postings: list, rentals: dict, label: str) -> tuple:
+    """
+    Check the charges each posting settles.  Fines and damages belong to a
+    rental when they are for its car and customer, Salik entries when they
+    name it.  Returns (errors, {field: charge ids to mark paid}).
+    """
+    errors, allocated = [], {}
+    for field, model in CHARGE_MODELS:
+        kind = model.__tablename__
+        wanted = {charge_id for posting in postings for charge_id in getattr(posting, field)}
+        owner = (model.rental_id,) if model is Salik else (model.car_id, model.customer_id)
+        charges = {}
+        for ids in _chunked(wanted):
+            for row in conn.execute(select(model.id, model.paid, *owner).where(model.id.in_(ids))):
+                charges[row[0]] = (row[1], tuple(row[2:]))
+        claimed = {}
+        for posting in postings:
+            rental = rentals.get(posting.rental_id)
+            if rental is None:
+                continue
+            expected = (rental.id,) if model is Salik else (rental.car_id, rental.customer_id)
+            for charge_id in getattr(posting, field):
+                where = (f"{label} {posting.line}: " if label else '') + f"{kind} {charge_id}"
+                if charge_id not in charges:
+                    errors.append(f"{where} does not exist.")
+                elif charges[charge_id][1] != expected:
+                    errors.append(f"{where} does not belong to rental {rental.id}.")
+                elif charges[charge_id][0]:
+                    errors.append(f"{where} is already paid.")
+                elif charge_id in claimed:
+                    errors.append(f"{where} is settled twice.")
+                else:
+                    claimed[charge_id] = posting.line
+        allocated[field] = list(claimed)
+    return errors, allocated
+
+
+def post_payments(postings: list, dry_run: bool = False, label: str = 'Payment') -> dict:
+    """
+    Record ``postings`` (from bulk_payments.parse_postings) and mark the
+    charges they settle as paid via rent, in one transaction.  Raises
+    PostingError, writing nothing, if a rental does not exist or a charge is
+    unknown, belongs to another rental, is paid or is settled twice.
+    ``dry_run`` runs every check but leaves the database untouched; ``label``
+    prefixes problems as in parse_postings.
+    """
+    conn = db.session.connection()
+    try:
+        rentals = {}
+        for ids in _chunked({posting.rental_id for posting in postings}):
+            for row in conn.execute(select(Rental.id, Rental.car_id, Rental.customer_id)
+                                    .where(Rental.id.in_(ids))):
+                rentals[row.id] = row
+        errors = [(f"{label} {posting.line}: " if label else '') + f"rental {posting.rental_id} does not exist."
+                  for posting in postings if posting.rental_id not in rentals]
+        charge_errors, allocated = _allocation_errors(conn, postings, rentals, label)
+        errors.extend(charge_errors)
+        if errors:
+            raise PostingError(errors)
+        done = {'payments': len(postings), 'amount': round(sum(p.amount for p in postings), 2),
+                'fines': len(allocated['fine_ids']), 'damages': len(allocated['damage_ids']),
+                'salik': len(allocated['salik_ids'])}
+        if dry_run:
+            db.session.rollback()
+            return done
+        conn.execute(Payment.__table__.insert(),
+                     [{'rental_id': p.rental_id, 'amount': p.amount, 'date': p.date, 'location': p.location}
+                      for p in postings])
+        for field, model in CHARGE_MODELS:
+            table = model.__table__
+            for ids in _chunked(allocated[field]):
+                # Guarded so a charge paid since it was checked is not settled twice
+                result = conn.execute(table.update()
+                                      .where(table.c.id.in_(ids),
+                                             or_(table.c.paid.is_(False), table.c.paid.is_(None)))
+                                      .values(paid=True, settled_via='rent'))
+                if result.rowcount != len(ids):
+                    raise RuntimeError('Charges were paid while the payments were being posted; post them again.')
+        refresh_ledger(conn, {rentals[p.rental_id].car_id for p in postings})
+        db.session.info['data_changed'] = True
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return done
+
+
+@app.route('/api/payments/bulk', methods=['POST'])
+def api_post_payments():
+    """
+    Post many payments in one request.  The JSON body is
+
+        {"payments": [{"rental_id": 12, "amount": 3500, "date": "01/10/2026",
+                       "location": "Dubai", "fine_ids": [4], "salik_ids": [31, 32]}, ...]}
+
+    Either every payment is recorded, or none is and the response is a 400
+    listing the problems, or a 409 if charges were paid by another request
+    meanwhile.
+    """
+    payload = request.get_json(silent=True) if request.is_json else None
+    if not isinstance(payload, dict) or not isinstance(payload.get('payments'), list):
+        abort(400, description="Expected a JSON body with a 'payments' list.")
+    try:
+        done = post_payments(parse_postings(payload['payments']))
+    except PostingError as exc:
+        abort(400, description=str(exc))
+    except RuntimeError as exc:
+        abort(409, description=str(exc))
+    return jsonify(done)
+
+
+def post_payments_file(path: str, dry_run: bool = False):
+    """Command line posting of a payments CSV; prints the problems instead when there are any."""
+    try:
+        done = post_payments(parse_postings(read_csv(path), label='Line', first=2),
+                             dry_run=dry_run, label='Line')
+    except PostingError as exc:
+        sys.exit('\n'.join(['Nothing was posted:'] + exc.errors))
+    except RuntimeError as exc:
+        sys.exit(f"Nothing was posted: {exc}")
+    verb = 'Would post' if dry_run else 'Posted'
+    print(f"{verb} {done['payments']} payments totalling AED {done['amount']:.2f}, settling "
+          f"{done['fines']} fines, {done['damages']} damages and {done['salik']} Salik entries.")
+
+
+# ---------------------------------------------------------------------------
+# Global search.  Backed by the SQLite FTS5 table in search.py, which the
+# database keeps current through triggers; ``python app.py --rebuild-search``
+# repopulates it from scratch.
+
+# Search result kind -> (edit endpoint, its id argument, label)
+SEARCH_LINKS = {
+    'customer': ('edit_customer', 'customer_id', 'Customer'),
+    'car': ('edit_car', 'car_id', 'Car'),
+    'booking': ('edit_booking', 'booking_id', 'Booking'),
+    'fine': ('edit_fine', 'fine_id', 'Fine'),
+    'damage': ('edit_damage', 'damage_id', 'Damage'),
+    'expense': ('edit_expense', 'expense_id', 'Expense'),
+}
+
+
+@app.route('/search')
+def search():
+    """Ranked full-text search across customers, cars, bookings and charges."""
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('kind')
+    results = []
+    if query:
+        if DB_DIALECT != 'sqlite':
+            flash('Search is only available on the SQLite database.')
+        else:
+            kinds = [kind] if kind in SEARCH_LINKS else None
+            results = search_index(db.session.connection(), query, limit=app.config['PAGE_SIZE'], kinds=kinds)
+    return render_template('search.html', query=query, kind=kind, results=results, links=SEARCH_LINKS)
+
+
+def rebuild_search():
+    """Repopulate the full-text search index from the source tables."""
+    rebuild_search_index(db.session.connection())
+    db.session.commit()
+    print("Search index rebuilt.")
 
 
 # ---------------------------------------------------------------------------
@@ -1228,46 +2526,66 @@ def list_salik_for_rental(rental_id: int):
 def reports():
     """
     Generate utilisation and financial reports for each car. Utilisation is
-    calculated as the total days a car has been rented compared to the
-    duration from the earliest rental start to today (or 365 days if that
-    period is shorter). Financials include total revenue from payments,
-    total expenses (expenses + fines + damages), profit/loss and investment
-    recovery progress.
+    the share of the days a car was in service (from its first rental until
+    it was defleeted, up to today) that a rental covered. Financials include
+    total revenue from payments, total expenses (expenses + fines + damages
+    + Salik), profit/loss and investment recovery progress.
+
+    Optional ``from`` and ``to`` query parameters (DD/MM/YYYY) restrict the
+    report to a period: payments and charges are filtered by date, rentals
+    are clipped to the period and utilisation is measured against it.  A
+    second table breaks utilisation down by ``by`` (month, quarter or year).
+
+    Financial figures come from a grouped query keyed by car and utilisation
+    from the rentals overlapping the period, read once for both tables, so
+    the page costs the same handful of queries however many cars and
+    rentals there are.
     """
     today = date.today()
-    report_rows = []
+    period_from = parse_date_arg('from')
+    period_to = parse_date_arg('to')
+    by = request.args.get('by', 'month')
+    if by not in UTILISATION_PERIODS:
+        by = 'month'
+    report = cached_view(('reports', today, period_from, period_to, by),
+                         lambda: report_view(today, period_from, period_to, by))
+    return render_template('reports.html', rows=report['rows'], today=today, series=report['series'], by=by,
+                           periods=UTILISATION_PERIODS,
+                           period_from=period_from, period_to=period_to)
+
+
+def report_view(today: date, period_from, period_to, by: str) -> dict:
+    """The per-car rows and the ``by`` utilisation series of reports(), from one Utilisation."""
+    usage = fleet_utilisation(period_from, period_to or today, by)
+    return {'rows': report_rows(today, period_from, period_to, usage),
+            'series': utilisation_series(period_from, period_to or today, by, usage)}
+
+
+def report_rows(today: date, period_from, period_to, usage=None) -> list:
+    """
+    Build the plain-data rows rendered by reports().  Utilisation totals
+    are summed over the windows of ``usage`` when it is given.
+    """
+    if period_from or period_to:
+        figures = car_report_figures(period_from, period_to)
+    else:
+        figures = ledger_report_figures()
+    rows = []
     cars = Car.query.all()
+    if usage is None:
+        usage = fleet_utilisation(period_from, period_to or today)
+    position = {car_id: row for row, car_id in enumerate(usage.car_ids)} if usage else {}
     for car in cars:
-        # Gather rentals for this car
-        car_rentals = car.rentals
-        # Compute earliest start date
-        start_dates = [r.start_date for r in car_rentals if r.start_date]
-        if start_dates:
-            earliest = min(start_dates)
-        else:
-            earliest = today
-        # Utilisation days rented
-        days_rented = 0
-        for r in car_rentals:
-            s = r.start_date
-            if not s:
-                continue
-            e = r.end_date or today
-            days_rented += (e - s).days + 1
-        total_period = (today - earliest).days + 1
-        if total_period < 1:
-            total_period = 1
-        utilisation_pct = round((days_rented / total_period) * 100, 2)
-        # Revenue from payments
-        payments = Payment.query.join(Rental).filter(Rental.car_id == car.id).all()
-        total_revenue = sum(p.amount or 0 for p in payments)
-        # Expenses: car expenses + fines + damages (cost to company)
-        car_expenses = sum(e.cost or 0 for e in car.expenses)
-        fines_cost = sum(f.amount or 0 for f in car.fines)
-        damages_cost = sum(d.amount or 0 for d in car.damages)
-        # Include Salik costs as part of expenses.  These represent toll charges paid by the company.
-        salik_cost = sum(s.amount or 0 for s in car.salik)
-        total_expenses = car_expenses + fines_cost + damages_cost + salik_cost
+        days_rented, utilisation_pct = 0, 0.0
+        if car.id in position:
+            days_rented = int(usage.rented[position[car.id]].sum())
+            utilisation_pct = usage.car_total_percent(position[car.id]) or 0.0
+        total_revenue = figures['payments'].get(car.id, 0)
+        # Expenses: car expenses + fines + damages + Salik (cost to company)
+        total_expenses = (figures['expenses'].get(car.id, 0) +
+                          figures['fines'].get(car.id, 0) +
+                          figures['damages'].get(car.id, 0) +
+                          figures['salik'].get(car.id, 0))
         # Purchase and initial investment
         purchase = car.purchase_price or 0
         investment = car.initial_investment or 0
@@ -1279,8 +2597,8 @@ def reports():
             recovery_pct = round((total_revenue / invested_total) * 100, 2)
         else:
             recovery_pct = None
-        report_rows.append({
-            'car': car,
+        rows.append({
+            'car': car_view(car),
             'utilisation_pct': utilisation_pct,
             'days_rented': days_rented,
             'total_revenue': total_revenue,
@@ -1288,37 +2606,574 @@ def reports():
             'profit_loss': profit_loss,
             'recovery_pct': recovery_pct,
         })
-    return render_template('reports.html', rows=report_rows, today=today)
+    return rows
+
+
+def ledger_report_figures() -> dict:
+    """All-time report figures read from CarLedger, shaped like car_report_figures."""
+    ledgers = ledger_by_car()
+    figures = {name: {car_id: getattr(row, name) or 0 for car_id, row in ledgers.items()}
+               for name in ('expenses', 'fines', 'damages', 'salik')}
+    figures['payments'] = {car_id: row.revenue or 0 for car_id, row in ledgers.items()}
+    return figures
+
+
+def car_report_figures(period_from, period_to) -> dict:
+    """
+    Return per-car report figures as dictionaries keyed by car id:
+    ``payments``, ``expenses``, ``fines``, ``damages`` and ``salik`` map to
+    summed amounts.  Either end of the period may be None to leave it open.
+    """
+    def in_period(column):
+        filters = []
+        if period_from:
+            filters.append(column >= period_from)
+        if period_to:
+            filters.append(column <= period_to)
+        return filters
+
+    def sums(car_col, amount_col, *filters, join=None):
+        query = db.session.query(car_col, func.coalesce(func.sum(amount_col), 0.0))
+        if join is not None:
+            query = query.join(join)
+        return dict(query.filter(*filters).group_by(car_col).all())
+
+    figures = {
+        'payments': sums(Rental.car_id, Payment.amount, *in_period(Payment.date), join=Payment.rental),
+        'expenses': sums(Expense.car_id, Expense.cost, *in_period(Expense.date)),
+        'fines': sums(Fine.car_id, Fine.amount, *in_period(Fine.date)),
+        'damages': sums(Damage.car_id, Damage.amount, *in_period(Damage.date)),
+    }
+    # A Salik entry covers a date range; count it if the range touches the period
+    salik_filters = []
+    if period_from:
+        salik_filters.append(Salik.end_date >= period_from)
+    if period_to:
+        salik_filters.append(Salik.start_date <= period_to)
+    figures['salik'] = sums(Salik.car_id, Salik.amount, *salik_filters)
+    return figures
+
+
+UTILISATION_PERIODS = ('month', 'quarter', 'year')
+
+
+def fleet_utilisation(first, last: date, period=None):
+    """
+    Utilisation of every car from ``first`` (None: the first rental) to
+    ``last``, per ``period`` window or over the whole range when None.
+    Only the rentals overlapping that range are read; each car's service
+    start comes from a grouped MIN over its rentals.  Returns an
+    occupancy.Utilisation, or None when there are no rentals.
+    """
+    # Imported here so NumPy is only loaded by the processes that build reports
+    from occupancy import utilisation
+    service_starts = (db.session.query(Rental.car_id, func.min(Rental.start_date))
+                      .group_by(Rental.car_id).all())
+    if not service_starts:
+        return None
+    first = first or min(start for _, start in service_starts)
+    rentals = (db.session.query(Rental.car_id, Rental.start_date, Rental.end_date)
+               .filter(Rental.start_date <= last,
+                       or_(Rental.end_date.is_(None), Rental.end_date >= first))
+               .all())
+    cars = db.session.query(Car.id, DefleetedCar.date).outerjoin(DefleetedCar).all()
+    defleets = [(car_id, defleeted) for car_id, defleeted in cars if defleeted is not None]
+    return utilisation([car_id for car_id, _ in cars], first, last, period, rentals, defleets,
+                       service_starts=service_starts)
+
+
+def utilisation_series(first, last: date, period: str, usage=None) -> dict:
+    """
+    Plain-data utilisation per car and for the fleet, one column per
+    window; ``usage`` is reused when the caller has already built it.
+    """
+    if usage is None:
+        usage = fleet_utilisation(first, last, period)
+    if usage is None:
+        return {'period': period, 'windows': [], 'cars': [], 'fleet': None}
+    cars = {car.id: car for car in Car.query.all()}
+    return {
+        'period': period,
+        'windows': [{'from': start.strftime('%d/%m/%Y'), 'to': end.strftime('%d/%m/%Y')}
+                    for start, end in usage.windows],
+        'cars': [{'id': car_id,
+                  'licence_plate': cars[car_id].licence_plate,
+                  'model': cars[car_id].model,
+                  'rented_days': usage.rented[row].tolist(),
+                  'available_days': usage.available[row].tolist(),
+                  'utilisation_pct': usage.car_percent(row)}
+                 for row, car_id in enumerate(usage.car_ids)
+                 if usage.available[row].any()],
+        'fleet': {'rented_days': usage.fleet_rented().tolist(),
+                  'available_days': usage.fleet_available().tolist(),
+                  'utilisation_pct': usage.fleet_percent()},
+    }
+
+
+@app.route('/api/utilisation')
+def api_utilisation():
+    """
+    Utilisation time series as JSON: ``by`` is month (default), quarter or
+    year and ``from``/``to`` (DD/MM/YYYY) bound the range, which defaults to
+    the first rental up to today.
+    """
+    by = request.args.get('by', 'month')
+    if by not in UTILISATION_PERIODS:
+        abort(400, description=f"'by' must be one of {', '.join(UTILISATION_PERIODS)}.")
+    today = date.today()
+    first = _request_date('from', None)
+    last = _request_date('to', today)
+    if first and last < first:
+        abort(400, description="'to' is before 'from'.")
+    payload = cached_view(('utilisation', today, first, last, by),
+                          lambda: utilisation_series(first, last, by))
+    return jsonify(payload)
+
+
+# ---------------------------------------------------------------------------
+# Exports.  Each dataset is a query streamed with ``yield_per`` into a CSV or
+# XLSX download (see exports.py), so years of history export in constant
+# memory.  Dated datasets honour the same ``from``/``to`` arguments as the
+# reports page.
+
+EXPORT_BATCH = 1000
+
+
+def _period(column, period_from, period_to) -> list:
+    filters = []
+    if period_from:
+        filters.append(column >= period_from)
+    if period_to:
+        filters.append(column <= period_to)
+    return filters
+
+
+def _stream(stmt):
+    return db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH))
+
+
+def _export_report(period_from, period_to):
+    headers = ['Car', 'Model', 'Utilisation (%)', 'Days Rented', 'Revenue (AED)',
+               'Expenses (AED)', 'Profit/Loss (AED)', 'Recovery (%)']
+    # One row per car, already aggregated
+    rows = ((r['car']['licence_plate'], r['car']['model'], r['utilisation_pct'], r['days_rented'],
+             round(r['total_revenue'], 2), round(r['total_expenses'], 2), round(r['profit_loss'], 2),
+             r['recovery_pct'])
+            for r in report_rows(date.today(), period_from, period_to))
+    return headers, rows
+
+
+def _export_payments(period_from, period_to):
+    stmt = (select(Payment.date, Payment.rental_id, Car.licence_plate, Customer.name,
+                   Payment.amount, Payment.location)
+            .select_from(Payment)
+            .outerjoin(Rental, Payment.rental_id == Rental.id)
+            .outerjoin(Car, Rental.car_id == Car.id)
+            .outerjoin(Customer, Rental.customer_id == Customer.id)
+            .where(*_period(Payment.date, period_from, period_to))
+            .order_by(Payment.date, Payment.id))
+    return ['Date', 'Rental', 'Car', 'Customer', 'Amount (AED)', 'Location'], _stream(stmt)
+
+
+def _export_expenses(period_from, period_to):
+    stmt = (select(Expense.date, Car.licence_plate, Expense.category, Expense.description,
+                   Expense.cost, Expense.recurring, Expense.next_due_date)
+            .select_from(Expense)
+            .outerjoin(Car, Expense.car_id == Car.id)
+            .where(*_period(Expense.date, period_from, period_to))
+            .order_by(Expense.date, Expense.id))
+    return ['Date', 'Car', 'Category', 'Description', 'Cost (AED)', 'Recurring', 'Next Due'], _stream(stmt)
+
+
+def _export_charges(model):
+    """Exporter for Fine or Damage, which share their columns."""
+    def export(period_from, period_to):
+        stmt = (select(model.date, Car.licence_plate, Customer.name, model.description,
+                       model.amount, model.paid, model.settled_via)
+                .select_from(model)
+                .outerjoin(Car, model.car_id == Car.id)
+                .outerjoin(Customer, model.customer_id == Customer.id)
+                .where(*_period(model.date, period_from, period_to))
+                .order_by(model.date, model.id))
+        return ['Date', 'Car', 'Customer', 'Description', 'Amount (AED)', 'Paid', 'Settled Via'], _stream(stmt)
+    return export
+
+
+def _export_salik(period_from, period_to):
+    # Like the reports, an entry counts if its range touches the period
+    filters = []
+    if period_from:
+        filters.append(Salik.end_date >= period_from)
+    if period_to:
+        filters.append(Salik.start_date <= period_to)
+    stmt = (select(Salik.start_date, Salik.end_date, Salik.rental_id, Car.licence_plate,
+                   Customer.name, Salik.amount, Salik.paid, Salik.settled_via)
+            .select_from(Salik)
+            .join(Car, Salik.car_id == Car.id)
+            .join(Rental, Salik.rental_id == Rental.id)
+            .outerjoin(Customer, Rental.customer_id == Customer.id)
+            .where(*filters)
+            .order_by(Salik.start_date, Salik.id))
+    return ['Start', 'End', 'Rental', 'Car', 'Customer', 'Amount (AED)', 'Paid', 'Settled Via'], _stream(stmt)
+
+
+def _export_settled_rentals(period_from, period_to):
+    stmt = (select(Rental.id, Car.licence_plate, Customer.name, Rental.start_date, Rental.end_date,
+                   Rental.actual_rent, Rental.deposit, Rental.deposit_refunded_amount,
+                   Rental.deposit_refund_date)
+            .select_from(Rental)
+            .outerjoin(Car, Rental.car_id == Car.id)
+            .outerjoin(Customer, Rental.customer_id == Customer.id)
+            .where(Rental.deposit_refunded.is_(True),
+                   *_period(Rental.deposit_refund_date, period_from, period_to))
+            .order_by(Rental.start_date, Rental.id))
+    headers = ['Rental', 'Car', 'Customer', 'Start', 'End', 'Actual Rent (AED)', 'Deposit (AED)',
+               'Refunded (AED)', 'Refund Date']
+    return headers, _stream(stmt)
+
+
+# Dataset name in the URL -> exporter(period_from, period_to) -> (headers, rows)
+EXPORTS = {
+    'report': _export_report,
+    'payments': _export_payments,
+    'expenses': _export_expenses,
+    'fines': _export_charges(Fine),
+    'damages': _export_charges(Damage),
+    'salik': _export_salik,
+    'settled-rentals': _export_settled_rentals,
+}
+
+
+@app.route('/export/<dataset>.<fmt>')
+def export(dataset: str, fmt: str):
+    """Download a dataset as CSV or XLSX, optionally limited to ?from=&to=."""
+    if dataset not in EXPORTS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    period_from = parse_date_arg('from')
+    period_to = parse_date_arg('to')
+    headers, rows = EXPORTS[dataset](period_from, period_to)
+    name = dataset
+    if period_from or period_to:
+        name += '_' + '-'.join(d.strftime('%Y%m%d') if d else '' for d in (period_from, period_to))
+    return export_response(name, fmt, headers, rows)
+
+
+# ---------------------------------------------------------------------------
+# Schema migrations.  Append new steps to MIGRATIONS; never edit one that has
+# shipped.  See migrations.py for how they are applied.
+
+def _migrate_baseline(conn):
+    """Create missing tables, order records and the ledger."""
+    db.metadata.create_all(conn)
+    backfill_car_order(conn)
+    refresh_ledger(conn, conn.execute(select(Car.id)).scalars().all())
+
+
+def _migrate_hot_filter_indexes(conn):
+    """Create the model-declared indexes on tables that predate them."""
+    # IF NOT EXISTS rather than checkfirst: reflection skips expression indexes
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _migrate_search_index(conn):
+    """Create and fill the FTS5 search table (SQLite only)."""
+    if conn.dialect.name == 'sqlite':
+        create_search_index(conn)
+
+
+def _migrate_document_blobs(conn):
+    """Copy legacy customer documents into the blob store and point customers at them."""
+    Blob.__table__.create(conn, checkfirst=True)
+    customers = Customer.__table__
+    refs = Counter()
+    rows = conn.execute(select(customers.c.id, *(customers.c[f] for f in DOCUMENT_FIELDS))).all()
+    for row in rows:
+        updates = {}
+        for field in DOCUMENT_FIELDS:
+            ref = getattr(row, field)
+            if ref and not document_digest(ref):
+                path = os.path.join(app.config['UPLOAD_FOLDER'], ref)
+                if not os.path.isfile(path):
+                    continue
+                digest, size = blob_store.save_file(path)
+                # Legacy names were "<field>_<timestamp>_<original name>"
+                name = secure_filename(ref.split('_', 2)[-1]) or 'document'
+                if not conn.execute(select(Blob.sha256).where(Blob.sha256 == digest)).first():
+                    conn.execute(Blob.__table__.insert().values(
+                        sha256=digest, size=size, content_type=mimetypes.guess_type(name)[0],
+                        ref_count=0, created_at=datetime.utcnow()))
+                ref = updates[field] = f"{digest}/{name}"
+            if document_digest(ref):
+                refs[document_digest(ref)] += 1
+        if updates:
+            conn.execute(customers.update().where(customers.c.id == row.id).values(**updates))
+    for digest, count in refs.items():
+        conn.execute(Blob.__table__.update().where(Blob.sha256 == digest).values(ref_count=count))
+
+
+def _migrate_rent_charges(conn):
+    """
+    Create the charge table and start billing active rentals from their
+    first period.  Settled rentals (deposit refunded) were paid off before
+    the scheduler existed: they get no billing date, so their history is
+    not charged again and they stay out of receivables.
+    """
+    RentCharge.__table__.create(conn, checkfirst=True)
+    _migrate_hot_filter_indexes(conn)
+    rentals = Rental.__table__
+    unbilled = ~select(RentCharge.id).where(RentCharge.rental_id == rentals.c.id).exists()
+    settled = rentals.c.deposit_refunded.is_(True)
+    conn.execute(rentals.update().where(unbilled, ~settled)
+                 .values(next_billing_date=rentals.c.start_date))
+    conn.execute(rentals.update().where(unbilled, settled).values(next_billing_date=None))
+
+
+MIGRATIONS = [
+    Migration(1, 'baseline', _migrate_baseline),
+    Migration(2, 'hot_filter_indexes', _migrate_hot_filter_indexes),
+    # ix_customer_name and ix_salik_rental_start for the paginated lists
+    Migration(3, 'list_sort_indexes', _migrate_hot_filter_indexes),
+    Migration(4, 'search_index', _migrate_search_index),
+    Migration(5, 'document_blobs', _migrate_document_blobs),
+    Migration(6, 'rent_charges', _migrate_rent_charges),
+    # Expression indexes matching the coalesced keyset sort keys of list pages
+    Migration(7, 'keyset_sort_indexes', _migrate_hot_filter_indexes),
+]
 
 
 def init_db():
-    """Initialise the database tables."""
-    db.create_all()
+    """Create or upgrade the database schema to the latest migration."""
+    applied = upgrade_schema(db.engine, MIGRATIONS)
+    if applied:
+        # Migrations write through the engine, outside the session events
+        data_version.bump()
+    for name in applied:
+        print(f"Applied migration {name}")
     print("Database initialised.")
 
+
+def route_sample_args() -> dict:
+    """The first id of each table, to fill in the arguments of routes that take one."""
+    sample_args = {}
+    for arg, model in (('car_id', Car), ('customer_id', Customer), ('rental_id', Rental),
+                       ('booking_id', Booking), ('payment_id', Payment), ('expense_id', Expense),
+                       ('fine_id', Fine), ('damage_id', Damage), ('salik_id', Salik)):
+        first_id = db.session.query(func.min(model.id)).scalar()
+        if first_id is not None:
+            sample_args[arg] = first_id
+    db.session.remove()
+    return sample_args
+
+
+def sample_query_urls() -> list:
+    """Pages whose interesting work only happens with query string arguments."""
+    today = date.today()
+    period = {'from': date(today.year, 1, 1).strftime('%d/%m/%Y'), 'to': today.strftime('%d/%m/%Y')}
+    return ['/reports?' + urlencode(period), '/search?q=a']
+
+
+def check_plans() -> bool:
+    """Report route queries that scan a large table; return True when clean."""
+    problems = check_query_plans(
+        app, db.engine, route_sample_args(),
+        # Reference tables that list pages read in full by design
+        allowed_scans={'car', 'customer', 'car_order', 'defleeted_car', 'car_ledger', 'schema_version'},
+        extra_urls=sample_query_urls())
+    for url, statement, detail in problems:
+        print(f"{url}: {detail}")
+        if statement:
+            print(f"    {' '.join(statement.split())}")
+    print(f"{len(problems)} full table scan(s) found.")
+    return not problems
+
+
+# SQL statement budgets per endpoint for one request at the 'small' synthetic
+# scale (50 cars, see synthetic.py), checked by --check-query-budgets with an
+# empty view cache.  Endpoints not listed get DEFAULT_QUERY_BUDGET.
+QUERY_BUDGET_SCALE = 'small'
+DEFAULT_QUERY_BUDGET = 10
+QUERY_BUDGETS = {
+    # Period reports add one grouped sum per source table
+    'reports': 12,
+}
+
+
+def check_budgets(show_all: bool = False) -> bool:
+    """Report routes over their SQL statement budget; return True when all are within it."""
+    from synthetic import PRESETS
+    expected = PRESETS[QUERY_BUDGET_SCALE].cars
+    cars = db.session.query(func.count(Car.id)).scalar()
+    if cars != expected:
+        print(f"Warning: budgets are set for the {QUERY_BUDGET_SCALE} scale ({expected} cars) but the "
+              f"database has {cars}; generate one with --generate-data {QUERY_BUDGET_SCALE}.")
+    urls = route_urls(app, route_sample_args()) + sample_query_urls()
+    results = check_query_budgets(app, db.engine, urls, QUERY_BUDGETS, DEFAULT_QUERY_BUDGET,
+                                  before_each=lambda: view_cache.clear())
+    failures = 0
+    for result in results:
+        failed = result.over_budget or result.status >= 500
+        failures += failed
+        flag = 'OVER' if result.over_budget else f'HTTP {result.status}' if failed else 'ok'
+        print(f"{flag:>8} {result.count:>4}/{result.budget:<4} {result.endpoint:<28} {result.url}")
+        if failed or show_all:
+            for executions, origin, statement in result.summary():
+                print(f"{executions:>14} x {origin}: {statement[:160]}")
+    print(f"{failures} route(s) over budget or failing.")
+    return not failures
+
+
+def load_synthetic_data(scale, seed: int = 1) -> dict:
+    """Fill an empty database with seeded synthetic data (see synthetic.py); returns row counts."""
+    from synthetic import generate
+    conn = db.session.connection()
+    counts = generate(conn, db.metadata.tables, scale, seed=seed, order_gap=ORDER_GAP)
+    # Bulk inserts bypass the session events that keep the ledger current
+    # and mark the data as changed for the view cache
+    refresh_ledger(conn, [car_id for (car_id,) in conn.execute(select(Car.id)).all()])
+    db.session.info['data_changed'] = True
+    db.session.commit()
+    return counts
+
+
+def generate_data(scale: str, payments: int = None, seed: int = 1):
+    """Command line front end of load_synthetic_data()."""
+    from synthetic import scale_for
+    started = time.perf_counter()
+    try:
+        counts = load_synthetic_data(scale_for(scale, payments), seed=seed)
+    except ValueError as error:
+        db.session.rollback()
+        sys.exit(str(error))
+    for table, count in counts.items():
+        print(f"{table:>14}: {count}")
+    print(f"Generated in {time.perf_counter() - started:.1f} s.")
+
+
+def benchmark_routes(runs: int = 20, cold: bool = False) -> dict:
+    """Latency and memory of every GET route (see benchmark.py); ``cold`` empties the view cache first."""
+    from benchmark import benchmark_routes as run_benchmark
+    urls = route_urls(app, route_sample_args()) + sample_query_urls()
+    results = run_benchmark(app, urls, runs=runs, before_each=view_cache.clear if cold else None)
+    results['cold'] = cold
+    results['database'] = {table: db.session.query(model).count()
+                           for table, model in (('car', Car), ('rental', Rental), ('payment', Payment))}
+    return results
+
+
 # ---------------------------------------------------------------------------
 # Helper functions
 
+def parse_date_arg(name: str):
+    """
+    Parse an optional DD/MM/YYYY query string parameter.  Returns None when
+    the parameter is missing or malformed (flashing a message in the latter
+    case) so reports fall back to their unfiltered form.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%d/%m/%Y').date()
+    except ValueError:
+        flash(f"Ignoring invalid date '{value}', expected DD/MM/YYYY.")
+        return None
+
+
+def _request_date(name: str, default):
+    """Parse a DD/MM/YYYY query parameter for a JSON endpoint; 400 when malformed."""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%d/%m/%Y').date()
+    except ValueError:
+        abort(400, description=f"Invalid {name} date '{value}', expected DD/MM/YYYY.")
+
+
 def date_in_range(d: date, start: date, end: date) -> bool:
     """Return True if date d falls between start and end inclusive."""
     return start <= d <= end
 
 
-def is_rented_today(car: Car, today: date) -> bool:
-    """Return True if the given car has an active rental overlapping today."""
-    for r in car.rentals:
-        if r.start_date and (r.end_date is None or r.end_date >= today):
-            if r.start_date <= today:
-                return True
-    return False
-
-
-def is_booked_today(car: Car, today: date) -> bool:
-    """Return True if the given car has a booking that overlaps today but isn't rented."""
-    for b in car.bookings:
-        if date_in_range(today, b.start_date, b.end_date):
-            return True
-    return False
+# ---------------------------------------------------------------------------
+# Availability service.  Works out the rented/booked/available status of the
+# whole fleet for a single day with one query against rentals and one against
+# bookings, instead of lazy loading ``car.rentals`` and ``car.bookings`` for
+# every car.  The dashboard, the availability page and the defleet check all
+# go through here so they agree on what "rented" means.
+
+class FleetAvailability:
+    """Status of every car on ``day``, keyed by car id."""
+
+    def __init__(self, day: date, rentals: dict, bookings: dict):
+        self.day = day
+        # car_id -> end date (None for open ended) of the rental covering day
+        self.rentals = rentals
+        # car_id -> end date of the booking covering day
+        self.bookings = bookings
+
+    def status(self, car_id: int) -> str:
+        """Return 'Rented', 'Booked' or 'Available' for the given car."""
+        if car_id in self.rentals:
+            return 'Rented'
+        if car_id in self.bookings:
+            return 'Booked'
+        return 'Available'
+
+    def info(self, car_id: int) -> str:
+        """Return the hint shown next to the status on the availability page."""
+        if car_id in self.rentals:
+            end_date = self.rentals[car_id]
+            if end_date is None:
+                return "Open ended"
+            # Show when the car will be free again (the day after end date)
+            available_date = end_date + timedelta(days=1)
+            return f"Available from {available_date.strftime('%d/%m/%Y')}"
+        if car_id in self.bookings:
+            return f"Booked until {self.bookings[car_id].strftime('%d/%m/%Y')}"
+        return ''
+
+    def counts(self, car_ids) -> dict:
+        """Return the number of rented, booked and available cars among car_ids."""
+        counts = {'Rented': 0, 'Booked': 0, 'Available': 0}
+        for car_id in car_ids:
+            counts[self.status(car_id)] += 1
+        return counts
+
+
+def fleet_availability(day: date) -> FleetAvailability:
+    """Load rental and booking coverage of ``day`` for all cars in two queries."""
+    # Rows are sorted by id in Python; an ORDER BY id would make SQLite walk
+    # the primary key instead of the date indexes.
+    rental_rows = (db.session.query(Rental.id, Rental.car_id, Rental.end_date)
+                   .filter(Rental.start_date <= day,
+                           or_(Rental.end_date.is_(None), Rental.end_date >= day))
+                   .all())
+    booking_rows = (db.session.query(Booking.id, Booking.car_id, Booking.end_date)
+                    .filter(Booking.start_date <= day, Booking.end_date >= day)
+                    .all())
+    rentals = {}
+    for _, car_id, end_date in sorted(rental_rows):
+        # Keep the first matching rental, as the per-car scan used to
+        rentals.setdefault(car_id, end_date)
+    bookings = {}
+    for _, car_id, end_date in sorted(booking_rows):
+        bookings.setdefault(car_id, end_date)
+    return FleetAvailability(day, rentals, bookings)
+
+
+def car_has_active_rental(car_id: int, day: date) -> bool:
+    """
+    Return True if the car has a rental that has not been settled and has not
+    ended before ``day``.  Future rentals count as well, which is what blocks
+    a car from being defleeted.
+    """
+    query = Rental.query.filter(Rental.car_id == car_id,
+                                Rental.deposit_refunded.isnot(True),
+                                or_(Rental.end_date.is_(None), Rental.end_date >= day))
+    return db.session.query(query.exists()).scalar()
 
 
 def rental_deposit_balance(rental: Rental) -> float:
@@ -1346,9 +3201,9 @@ def rental_deposit_balance(rental: Rental) -> float:
 def rental_due_summary(rental_id: int):
     """
     Display a summary of the amounts currently due for a rental.  The due
-    calculation is based on the number of billing intervals that have elapsed
-    since the rental start date, multiplied by the agreed rent, minus any
-    payments already recorded.  Outstanding fines, damages and Salik costs
+    calculation is based on the billing periods that have started since the
+    rental start date (those the scheduler has charged, plus any it has not
+    reached yet at the agreed rent), minus any payments already recorded.  Outstanding fines, damages and Salik costs
     associated with the rental's car and customer are added to the base
     amount.  Payments are not allocated to specific charges, but reduce
     the overall balance.
@@ -1357,16 +3212,16 @@ def rental_due_summary(rental_id: int):
     the end date; otherwise it uses today's date.  Billing interval days
     are stored on the rental and default to 30.
     """
-    rental = Rental.query.get_or_404(rental_id)
+    rental = Rental.query.options(*RENTAL_PARTIES).get_or_404(rental_id)
     today = date.today()
     # Determine the end of the billing period: either rental end date or today
     period_end = rental.end_date if rental.end_date and rental.end_date < today else today
-    days_active = (period_end - rental.start_date).days
-    # At least one interval has elapsed once the rental starts
-    intervals = (days_active // (rental.billing_interval_days or 30)) + 1
-    # Calculate base rent due
+    # Rent charged by the scheduler, plus periods started since its last run
+    pending = billing_periods(rental.next_billing_date or rental.start_date,
+                              rental.billing_interval_days, period_end, rental.end_date)
+    intervals = len(rental.charges) + len(pending)
     rent_rate = rental.actual_rent if rental.actual_rent is not None else rental.planned_rent or 0.0
-    base_due = rent_rate * intervals
+    base_due = sum(charge.amount for charge in rental.charges) + rent_rate * len(pending)
     # Sum payments for this rental
     total_payments = sum(p.amount or 0 for p in rental.payments)
     # Outstanding fines and damages for this rental's car and customer
@@ -1390,12 +3245,451 @@ def rental_due_summary(rental_id: int):
                            period_end=period_end)
 
 
+# ---------------------------------------------------------------------------
+# Receivables.  What every active rental owes, built from one query per
+# source table however many rentals there are (see receivables.py for how
+# balances are aged).  Fines and damages count against the rental of the
+# same car and customer, as on the due summary.  /receivables lists rentals
+# with a balance, largest first; /api/receivables returns the same as JSON.
+
+def _receivable_bucket(due, today: date):
+    """SQL expression for the aging bucket (index into RECEIVABLE_BUCKETS) of a due date."""
+    whens = [(due >= today - timedelta(days=limit), index)
+             for index, limit in enumerate(RECEIVABLE_BUCKET_LIMITS)]
+    return case(*whens, else_=len(RECEIVABLE_BUCKET_LIMITS))
+
+
+def receivable_balances(today: date) -> list:
+    """(rental row, aged Balance) for every active rental."""
+    active = Rental.deposit_refunded.is_(False)
+    rentals = (db.session.query(Rental.id, Rental.car_id, Rental.customer_id, Rental.start_date,
+                                Rental.end_date, Rental.next_billing_date, Rental.billing_interval_days,
+                                Rental.actual_rent, Rental.planned_rent,
+                                Car.licence_plate, Customer.name.label('customer_name'))
+               .outerjoin(Car, Rental.car_id == Car.id)
+               .outerjoin(Customer, Rental.customer_id == Customer.id)
+               .filter(active)
+               .all())
+
+    def by_bucket(key_columns, due, amount, *criteria, join=None):
+        """{key: [amount per bucket]} summed in SQL."""
+        bucket = _receivable_bucket(due, today)
+        query = db.session.query(*key_columns, bucket, func.sum(amount))
+        if join is not None:
+            query = query.join(join[0], join[1])
+        totals = {}
+        for *key, index, total in query.filter(*criteria).group_by(*key_columns, bucket):
+            key = key[0] if len(key) == 1 else tuple(key)
+            totals.setdefault(key, [0.0] * len(RECEIVABLE_BUCKETS))[index] += total or 0.0
+        return totals
+
+    rent = by_bucket([RentCharge.rental_id], RentCharge.period_start, RentCharge.amount, active,
+                     join=(Rental, RentCharge.rental_id == Rental.id))
+    payments = dict(db.session.query(Payment.rental_id, func.sum(Payment.amount))
+                    .join(Rental, Payment.rental_id == Rental.id).filter(active)
+                    .group_by(Payment.rental_id).all())
+    # Unpaid fines and damages by (car, customer), Salik by rental
+    charge_sets = [by_bucket([model.car_id, model.customer_id], func.coalesce(model.date, today),
+                             model.amount, or_(model.paid.is_(False), model.paid.is_(None)))
+                   for model in (Fine, Damage)]
+    salik = by_bucket([Salik.rental_id], Salik.end_date, Salik.amount,
+                      active, or_(Salik.paid.is_(False), Salik.paid.is_(None)),
+                      join=(Rental, Salik.rental_id == Rental.id))
+
+    empty = [0.0] * len(RECEIVABLE_BUCKETS)
+    balances = []
+    for rental in rentals:
+        due = list(rent.get(rental.id, empty))
+        # Periods started since the scheduler last ran, at the current rate
+        period_end = rental.end_date if rental.end_date and rental.end_date < today else today
+        rate = rental.actual_rent if rental.actual_rent is not None else rental.planned_rent or 0.0
+        for start, _ in billing_periods(rental.next_billing_date or rental.start_date,
+                                        rental.billing_interval_days, period_end, rental.end_date):
+            due[receivable_bucket_for((today - start).days)] += rate
+        rent_due = sum(due)
+        for charges in (charge_sets[0].get((rental.car_id, rental.customer_id)),
+                        charge_sets[1].get((rental.car_id, rental.customer_id)),
+                        salik.get(rental.id)):
+            due = [total + amount for total, amount in zip(due, charges or empty)]
+        balances.append((rental, age_balance(rental.id, rent_due, sum(due) - rent_due,
+                                             payments.get(rental.id), due)))
+    return balances
+
+
+def receivables_view(today: date) -> dict:
+    """Plain-data receivables: rentals with a balance (largest first) and totals per bucket."""
+    rows = []
+    totals = {'rent': 0.0, 'charges': 0.0, 'payments': 0.0, 'balance': 0.0,
+              'aged': [0.0] * len(RECEIVABLE_BUCKETS)}
+    for rental, balance in receivable_balances(today):
+        totals['rent'] += balance.rent
+        totals['charges'] += balance.charges
+        totals['payments'] += balance.payments
+        totals['balance'] += balance.balance
+        totals['aged'] = [t + a for t, a in zip(totals['aged'], balance.aged)]
+        if abs(balance.balance) < 0.005:
+            continue
+        rows.append({
+            'rental_id': rental.id,
+            'licence_plate': rental.licence_plate,
+            'customer': rental.customer_name,
+            'rent': round(balance.rent, 2),
+            'charges': round(balance.charges, 2),
+            'payments': round(balance.payments, 2),
+            'balance': round(balance.balance, 2),
+            'aged': [round(amount, 2) for amount in balance.aged],
+        })
+    rows.sort(key=lambda row: row['balance'], reverse=True)
+    totals = {name: ([round(a, 2) for a in value] if name == 'aged' else round(value, 2))
+              for name, value in totals.items()}
+    return {'buckets': list(RECEIVABLE_BUCKETS), 'rows': rows, 'totals': totals}
+
+
+@app.route('/receivables')
+def receivables():
+    """What the fleet is owed, per rental and by age."""
+    today = date.today()
+    view = cached_view(('receivables', today), lambda: receivables_view(today))
+    return render_template('receivables.html', today=today, **view)
+
+
+@app.route('/api/receivables')
+def api_receivables():
+    today = date.today()
+    view = cached_view(('receivables', today), lambda: receivables_view(today))
+    return jsonify({'as_of': today.strftime('%d/%m/%Y'), 'buckets': view['buckets'],
+                    'totals': view['totals'], 'rentals': view['rows']})
+
+
+# ---------------------------------------------------------------------------
+# Scheduler.  ``run_scheduler`` repeats every recurring expense whose next due
+# date has passed and charges every rent period that has started, catching up
+# on everything missed since the last run in a few batched statements.  Each
+# recurring expense hands its recurrence over to the newest occurrence, and
+# each rental's next_billing_date moves past the periods just charged.  Runs
+# may overlap or repeat: a period is charged once per rental (unique key,
+# duplicates skipped) and cursors only move with a compare-and-set UPDATE.
+#
+# Run it daily from cron with ``python app.py --run-scheduler``, or set
+# SCHEDULER_INTERVAL (seconds) to run it from a background thread of the
+# serving processes.  gunicorn starts that thread in each worker after the
+# fork (see gunicorn.conf.py), never in the preloaded master; the worker
+# holding the scheduler lock file runs it and the others stand by.
+
+SCHEDULER_BATCH = 500
+
+
+def add_months(day: date, months: int) -> date:
+    """``day`` moved by whole months, clamped to the end of shorter months."""
+    index = day.month - 1 + months
+    year, month = day.year + index // 12, index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def recurrence_step(previous: date, next_due: date):
+    """
+    Function that advances a due date by the interval between an expense's
+    date and its next due date: whole months when they are a whole number of
+    months apart, otherwise days.  Returns None for a next due date that is
+    not after the expense.
+    """
+    if previous is None or next_due is None or next_due <= previous:
+        return None
+    months = (next_due.year - previous.year) * 12 + next_due.month - previous.month
+    if months > 0 and add_months(previous, months) == next_due:
+        return lambda day: add_months(day, months)
+    days = timedelta(days=(next_due - previous).days)
+    return lambda day: day + days
+
+
+def billing_periods(first_start: date, interval_days, until: date, end_date=None) -> list:
+    """
+    (start, end) of each billing period from ``first_start`` that has started
+    by ``until``.  The rental's end date, if any, stops billing and cuts the
+    last period short.
+    """
+    step = timedelta(days=interval_days or 30)
+    last = min(until, end_date) if end_date else until
+    periods = []
+    start = first_start
+    while start <= last:
+        end = start + step - timedelta(days=1)
+        periods.append((start, min(end, end_date) if end_date else end))
+        start += step
+    return periods
+
+
+def _dialect_insert(table):
+    """INSERT for the configured database, with its ON CONFLICT clauses."""
+    if DB_DIALECT == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def _insert_skipping_duplicates(table):
+    """INSERT that leaves out rows violating a unique constraint."""
+    return _dialect_insert(table).on_conflict_do_nothing()
+
+
+def repeat_expenses(conn, today: date) -> int:
+    """Create the occurrences of recurring expenses due by ``today``; returns how many."""
+    expenses = Expense.__table__
+    due = conn.execute(select(expenses)
+                       .where(expenses.c.next_due_date <= today, expenses.c.recurring.is_(True))).all()
+    occurrences, handed_over = [], []
+    for row in due:
+        step = recurrence_step(row.date, row.next_due_date)
+        if step is None:
+            continue
+        day = row.next_due_date
+        while day <= today:
+            occurrences.append({'car_id': row.car_id, 'date': day, 'category': row.category,
+                                'description': row.description, 'cost': row.cost,
+                                'recurring': False, 'next_due_date': None})
+            day = step(day)
+        # The newest occurrence carries the recurrence on
+        occurrences[-1].update(recurring=True, next_due_date=day)
+        handed_over.append(row)
+    if not handed_over:
+        return 0
+    result = conn.execute(expenses.update()
+                          .where(expenses.c.id.in_([row.id for row in handed_over]),
+                                 expenses.c.recurring.is_(True),
+                                 expenses.c.next_due_date <= today)
+                          .values(recurring=False))
+    if result.rowcount != len(handed_over):
+        raise RuntimeError('Recurring expenses changed during the scheduler run; run it again.')
+    conn.execute(expenses.insert(), occurrences)
+    refresh_ledger(conn, {row.car_id for row in handed_over})
+    return len(occurrences)
+
+
+def due_rentals(conn, today: date) -> list:
+    """Rentals with a billing period that has started and not been charged."""
+    rentals = Rental.__table__
+    return conn.execute(select(rentals.c.id, rentals.c.next_billing_date, rentals.c.billing_interval_days,
+                               rentals.c.end_date, rentals.c.actual_rent, rentals.c.planned_rent)
+                        .where(rentals.c.next_billing_date <= today,
+                               or_(rentals.c.end_date.is_(None),
+                                   rentals.c.next_billing_date <= rentals.c.end_date))).all()
+
+
+def charge_rentals(conn, due: list, today: date) -> int:
+    """Charge the started periods of the ``due`` rentals and move their cursors; returns charges."""
+    charges, cursors = [], []
+    for row in due:
+        rate = row.actual_rent if row.actual_rent is not None else row.planned_rent or 0.0
+        periods = billing_periods(row.next_billing_date, row.billing_interval_days, today, row.end_date)
+        if not periods:
+            continue
+        charges.extend({'rental_id': row.id, 'period_start': start, 'period_end': end,
+                        'amount': rate, 'created_at': datetime.utcnow()} for start, end in periods)
+        cursors.append({'rental': row.id, 'charged_from': row.next_billing_date,
+                        'next_billing': periods[-1][0] + timedelta(days=row.billing_interval_days or 30)})
+    if charges:
+        conn.execute(_insert_skipping_duplicates(RentCharge.__table__), charges)
+        rentals = Rental.__table__
+        conn.execute(rentals.update()
+                     .where(rentals.c.id == bindparam('rental'),
+                            rentals.c.next_billing_date == bindparam('charged_from'))
+                     .values(next_billing_date=bindparam('next_billing')), cursors)
+    return len(charges)
+
+
+def run_scheduler(today: date = None) -> dict:
+    """Process everything due by ``today``, committing every SCHEDULER_BATCH rentals."""
+    today = today or date.today()
+    expenses = repeat_expenses(db.session.connection(), today)
+    if expenses:
+        db.session.info['data_changed'] = True
+    db.session.commit()
+    due = due_rentals(db.session.connection(), today)
+    charges = 0
+    for offset in range(0, len(due), SCHEDULER_BATCH):
+        created = charge_rentals(db.session.connection(), due[offset:offset + SCHEDULER_BATCH], today)
+        if created:
+            db.session.info['data_changed'] = True
+        db.session.commit()
+        charges += created
+    return {'expenses': expenses, 'rentals': len(due), 'charges': charges}
+
+
+def claim_scheduler_lock(path: str):
+    """
+    An open descriptor holding an exclusive lock on ``path``, or None if
+    another process holds it.  The lock lasts until the process exits.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def start_scheduler(interval: int):
+    """
+    Call run_scheduler() now and then every ``interval`` seconds from a
+    daemon thread, while this process holds the scheduler lock.  A process
+    that does not hold it tries again each interval, so when the worker
+    running the scheduler exits another one takes over.
+    """
+    os.makedirs(app.instance_path, exist_ok=True)
+    lock_path = os.path.join(app.instance_path, 'scheduler.lock')
+
+    def loop():
+        lock = None
+        while True:
+            if lock is None:
+                lock = claim_scheduler_lock(lock_path)
+            if lock is not None:
+                with app.app_context():
+                    try:
+                        run_scheduler()
+                    except Exception:
+                        db.session.rollback()
+                        app.logger.exception('Scheduler run failed')
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name='scheduler', daemon=True).start()
+
+
+# ---------------------------------------------------------------------------
+# Application factory.  Servers load the app with ``create_app()``, which
+# applies configuration overrides and binds the database, e.g.
+#
+#     gunicorn -c gunicorn.conf.py 'app:create_app()'
+#
+# Routes stay registered on the module level ``app`` so endpoint names and
+# templates are unchanged; the factory is what makes an imported app usable.
+# It opens no connection and starts no thread: with preloading it runs in
+# the gunicorn master, which then forks the workers.
+
+def create_app(config: dict = None) -> Flask:
+    """Configure the application and bind the database; returns ``app``."""
+    global DB_DIALECT, view_cache, blob_store
+    if 'sqlalchemy' in app.extensions:
+        if config:
+            raise RuntimeError('create_app() was already called; configuration can no longer change.')
+        return app
+    app.config.update(config or {})
+    view_cache = LRUCache(maxsize=app.config['VIEW_CACHE_SIZE'], ttl=app.config['VIEW_CACHE_TTL'])
+    blob_store = BlobStore(os.path.join(app.config['UPLOAD_FOLDER'], 'blobs'))
+    db.init_app(app)
+    with app.app_context():
+        DB_DIALECT = db.engine.dialect.name
+        if DB_DIALECT == 'sqlite':
+            event.listen(db.engine, 'connect', _apply_sqlite_pragmas)
+        event.listen(db.engine, 'before_cursor_execute', _start_statement_timer)
+        event.listen(db.engine, 'after_cursor_execute', _finish_statement_timer)
+        engines = list(db.engines.values())
+    # With --preload the master may already hold pooled connections; each
+    # forked worker must open its own instead of sharing those sockets.
+    os.register_at_fork(after_in_child=lambda: [engine.dispose(close=False) for engine in engines])
+    return app
+
+
+def benchmark_startup(runs: int = 5):
+    """Print median cold import, create_app() and first request times over fresh interpreters."""
+    import statistics
+    import subprocess
+    script = ("import time; t0 = time.perf_counter(); import app; t1 = time.perf_counter(); "
+              "a = app.create_app(); t2 = time.perf_counter(); "
+              "status = a.test_client().get('/').status_code; t3 = time.perf_counter(); "
+              "print(t1 - t0, t2 - t1, t3 - t2, status)")
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        *timings, status = result.stdout.split()
+        if status != '200':
+            raise RuntimeError(f"First request returned HTTP {status}")
+        samples.append([float(t) for t in timings])
+    labels = ('import', 'create_app()', 'first request')
+    medians = [statistics.median(column) for column in zip(*samples)]
+    for label, value in zip(labels, medians):
+        print(f"{label:>14}: {value * 1000:7.1f} ms")
+    print(f"{'total':>14}: {sum(medians) * 1000:7.1f} ms (median of {runs} runs)")
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Car rental management app")
     parser.add_argument('--init-db', action='store_true', help='Initialise the database')
+    parser.add_argument('--upgrade-db', action='store_true',
+                        help='Apply pending schema migrations (same as --init-db)')
+    parser.add_argument('--rebuild-ledger', action='store_true',
+                        help='Recompute the per-car financial ledger from scratch')
+    parser.add_argument('--rebuild-search', action='store_true',
+                        help='Repopulate the full-text search index')
+    parser.add_argument('--import-salik', metavar='STATEMENT',
+                        help='Import a Salik toll statement (CSV or XLSX)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='With --import-salik or --post-payments, only report what would be done')
+    parser.add_argument('--post-payments', metavar='CSV',
+                        help='Post a file of payments and the charges they settle in one transaction')
+    parser.add_argument('--gc-uploads', action='store_true',
+                        help='Delete uploaded documents no customer refers to')
+    parser.add_argument('--check-query-plans', action='store_true',
+                        help='Fail if any page query scans a large table without an index')
+    parser.add_argument('--check-query-budgets', action='store_true',
+                        help='Fail if any page runs more SQL statements than its budget')
+    parser.add_argument('--show-queries', action='store_true',
+                        help='With --check-query-budgets, list the statements of every page')
+    parser.add_argument('--benchmark-startup', type=int, nargs='?', const=5, metavar='RUNS',
+                        help='Report cold import and first request latency')
+    parser.add_argument('--run-scheduler', action='store_true',
+                        help='Create due recurring expenses and rent charges (run daily from cron)')
+    parser.add_argument('--generate-data', metavar='SCALE',
+                        help='Fill an empty database with synthetic data: small, medium, large '
+                             'or a number of cars')
+    parser.add_argument('--payments', type=int,
+                        help='With --generate-data, the number of payments to create')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='With --generate-data, the random seed (default 1)')
+    parser.add_argument('--benchmark-routes', type=int, nargs='?', const=20, metavar='RUNS',
+                        help='Print p50/p95 latency and peak memory of every page as JSON')
+    parser.add_argument('--cold', action='store_true',
+                        help='With --benchmark-routes, empty the view cache before each request')
     args = parser.parse_args()
-    if args.init_db:
+    if args.benchmark_startup:
+        benchmark_startup(args.benchmark_startup)
+        sys.exit(0)
+    maintenance = (args.init_db or args.upgrade_db or args.rebuild_ledger or args.rebuild_search
+                   or args.import_salik or args.gc_uploads or args.check_query_plans
+                   or args.run_scheduler or args.generate_data or args.benchmark_routes
+                   or args.check_query_budgets or args.post_payments)
+    # Maintenance commands never start the background scheduler
+    create_app({'SCHEDULER_INTERVAL': 0} if maintenance else None)
+    if maintenance:
         with app.app_context():
-            init_db()
+            if args.init_db or args.upgrade_db:
+                init_db()
+            if args.rebuild_ledger:
+                rebuild_ledger()
+            if args.rebuild_search:
+                rebuild_search()
+            if args.import_salik:
+                import_salik_file(args.import_salik, dry_run=args.dry_run)
+            if args.post_payments:
+                post_payments_file(args.post_payments, dry_run=args.dry_run)
+            if args.gc_uploads:
+                gc_uploads()
+            if args.run_scheduler:
+                done = run_scheduler()
+                print(f"Created {done['expenses']} recurring expenses and {done['charges']} rent "
+                      f"charges for {done['rentals']} rentals.")
+            if args.generate_data:
+                generate_data(args.generate_data, payments=args.payments, seed=args.seed)
+            if args.benchmark_routes:
+                print(json.dumps(benchmark_routes(args.benchmark_routes, cold=args.cold), indent=2))
+            if args.check_query_plans and not check_plans():
+                sys.exit(1)
+            if args.check_query_budgets and not check_budgets(show_all=args.show_queries):
+                sys.exit(1)
     else:
-         app.run(debug=True)
\ No newline at end of file
+        if app.config['SCHEDULER_INTERVAL']:
+            start_scheduler(app.config['SCHEDULER_INTERVAL'])
+        app.run(debug=True)
\ No newline at end of file
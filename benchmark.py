@@ -0,0 +1,86 @@
+"""Route latency and memory benchmark.
+
+Every URL is requested through the Flask test client: a few warm-up
+requests first, then ``runs`` timed ones, from which the p50 and p95
+latency are taken.  One further request runs under ``tracemalloc`` to
+find the peak Python memory allocated while serving it (tracing slows
+requests down, so it is kept out of the timed runs).  The process's peak
+resident set size is reported for the whole run.
+
+``benchmark_routes`` returns plain data that ``app.py`` prints as JSON, so
+runs against the same synthetic data (see synthetic.py) can be compared
+with any JSON tool.
+"""
+
+import math
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def benchmark_routes(app, urls: list, runs: int = 20, warmup: int = 2, before_each=None) -> dict:
+    """
+    Time ``runs`` GET requests of each URL in ``urls``.  ``before_each`` is
+    called before every request, e.g. to empty caches for cold timings.
+    """
+    client = app.test_client()
+    routes = []
+    started = time.perf_counter()
+    for url in urls:
+        for _ in range(warmup):
+            if before_each:
+                before_each()
+            client.get(url)
+        timings = []
+        status = None
+        size = 0
+        for _ in range(runs):
+            if before_each:
+                before_each()
+            began = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - began)
+            status = response.status_code
+            size = len(response.get_data())
+        if before_each:
+            before_each()
+        tracemalloc.start()
+        try:
+            client.get(url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        routes.append({
+            'url': url,
+            'status': status,
+            'bytes': size,
+            'runs': runs,
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'max_ms': round(max(timings) * 1000, 3),
+            'peak_alloc_kb': round(peak / 1024, 1),
+        })
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'warmup': warmup,
+        'seconds': round(time.perf_counter() - started, 2),
+        'peak_rss_kb': _peak_rss_kb(),
+        'routes': routes,
+    }
@@ -0,0 +1,105 @@
+"""Content-addressed file storage for uploaded documents.
+
+Every file is stored once, under the SHA-256 of its content
+(``<root>/ab/abcdef...``), however many times it is uploaded.  Uploads are
+copied to a temporary file in fixed-size chunks while being hashed, then
+renamed into place, so a file is never held in memory and a half-written
+blob is never visible under its final name.
+
+The store only deals with files.  Which blobs are still in use is tracked
+by ``app.py`` (the ``Blob`` table and its reference counts), which also
+decides when a blob may be deleted.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+
+CHUNK_SIZE = 64 * 1024
+
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+def is_digest(value: str) -> bool:
+    return bool(_SHA256.match(value or ''))
+
+
+class BlobStore:
+    """Files under ``root`` named by their SHA-256 digest."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+
+    def path_for(self, digest: str) -> str:
+        if not is_digest(digest):
+            raise ValueError(f"Not a SHA-256 digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def save_stream(self, stream) -> tuple:
+        """
+        Store the contents of a binary file object and return
+        (digest, size).  If the blob already exists the new copy is
+        discarded and the stored one gets a fresh modification time, which
+        the collector in app.py reads as "uploaded just now".
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            path = self.path_for(digest)
+            try:
+                os.utime(path)
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest, size
+
+    def save_file(self, path: str) -> tuple:
+        with open(path, 'rb') as fh:
+            return self.save_stream(fh)
+
+    def delete(self, digest: str):
+        try:
+            os.remove(self.path_for(digest))
+        except FileNotFoundError:
+            pass
+
+    def digests(self):
+        """Yield (digest, modification time) for every stored blob."""
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if is_digest(name):
+                    yield name, os.path.getmtime(os.path.join(directory, name))
+
+    def stale_temp_files(self, older_than: float):
+        """Paths of temporary files left behind by interrupted uploads."""
+        if not os.path.isdir(self.tmp_dir):
+            return []
+        paths = [os.path.join(self.tmp_dir, name) for name in os.listdir(self.tmp_dir)]
+        return [path for path in paths if os.path.getmtime(path) < older_than]
@@ -0,0 +1,109 @@
+"""Bulk payment posting.
+
+A posting is a list of payments, each for one rental with an amount, a
+date and optionally the fines, damages and Salik entries it settles.  It
+arrives as JSON (``POST /api/payments/bulk``) or as a CSV file
+(``python app.py --post-payments FILE``) with the columns
+
+    rental_id, amount, date, location, fine_ids, damage_ids, salik_ids
+
+where dates are DD/MM/YYYY and each ``*_ids`` cell lists ids separated by
+spaces or semicolons.  ``parse_postings`` checks every row and reports all
+the problems at once, so a month-end file can be fixed in one go.
+
+The module does not touch the database: ``app.py`` checks that the rentals
+exist and that each charge belongs to its rental and is unpaid, then writes
+the whole posting in one transaction.
+"""
+
+import csv
+import re
+from collections import namedtuple
+from datetime import datetime
+
+
+PaymentPosting = namedtuple('PaymentPosting', ['line', 'rental_id', 'amount', 'date', 'location',
+                                               'fine_ids', 'damage_ids', 'salik_ids'])
+
+CHARGE_FIELDS = ('fine_ids', 'damage_ids', 'salik_ids')
+
+
+class PostingError(ValueError):
+    """A posting that cannot be written; ``errors`` lists every problem found."""
+
+    def __init__(self, errors: list):
+        super().__init__(' '.join(errors))
+        self.errors = errors
+
+
+def _ids(value) -> list:
+    """Charge ids from a JSON list or a CSV cell ('4 7' or '4;7')."""
+    if value is None or value == '':
+        return []
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = [item for item in re.split(r'[\s;,]+', str(value).strip()) if item]
+    ids = [int(item) for item in items]
+    if any(charge_id <= 0 for charge_id in ids):
+        raise ValueError
+    return ids
+
+
+def parse_postings(rows, label: str = 'Payment', first: int = 1, positive_only: bool = True) -> list:
+    """
+    Validate ``rows`` (dicts with the posting columns) and return a
+    PaymentPosting for each.  Problems are reported as '<label> <n>: ...'
+    counting from ``first``; a ``label`` of None leaves the prefix out.
+    Amounts must be positive unless ``positive_only`` is false, which lets
+    a single payment entered by hand record a refund or correction.
+    Raises PostingError listing every problem.
+    """
+    postings, errors = [], []
+    for line, row in enumerate(rows, start=first):
+        where = f"{label} {line}: " if label else ''
+        if not isinstance(row, dict):
+            errors.append(f"{where}expected an object with rental_id, amount and date.")
+            continue
+        problems = []
+        try:
+            rental_id = int(row.get('rental_id'))
+        except (TypeError, ValueError):
+            problems.append('rental_id must be a number.')
+        try:
+            amount = round(float(row.get('amount')), 2)
+            if positive_only and not amount > 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            problems.append('amount must be a positive number.' if positive_only else 'amount must be a number.')
+        try:
+            day = datetime.strptime(str(row.get('date') or '').strip(), '%d/%m/%Y').date()
+        except ValueError:
+            problems.append('date must be DD/MM/YYYY.')
+        charges = {}
+        for field in CHARGE_FIELDS:
+            try:
+                charges[field] = _ids(row.get(field))
+            except (TypeError, ValueError):
+                problems.append(f"{field} must list charge ids.")
+        if problems:
+            errors.append(where + ' '.join(problems))
+            continue
+        location = (row.get('location') or '').strip() or None
+        postings.append(PaymentPosting(line, rental_id, amount, day, location, **charges))
+    if errors:
+        raise PostingError(errors)
+    if not postings:
+        raise PostingError(['There are no payments to post.'])
+    return postings
+
+
+def read_csv(path: str) -> list:
+    """Rows of a posting CSV as dicts keyed by lowercased column names."""
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        reader = csv.DictReader(fh, skipinitialspace=True)
+        missing = {'rental_id', 'amount', 'date'} - {(name or '').strip().lower()
+                                                      for name in reader.fieldnames or ()}
+        if missing:
+            raise PostingError([f"The file has no {', '.join(sorted(missing))} column."])
+        return [{(key or '').strip().lower(): value for key, value in row.items()} for row in reader]
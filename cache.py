@@ -0,0 +1,128 @@
+"""In-process read-through cache for page view models.
+
+``LRUCache`` is a small thread-safe LRU with an optional time to live.  The
+app stores the data each page renders under keys that include the current
+``DataVersion``, which is bumped after every commit that wrote something.
+A write therefore makes every older entry unreachable (they simply age out
+of the LRU) without the cache having to know which pages a write affects.
+
+The version is an in-process counter paired with a counter stored in a
+marker file, so a commit in one gunicorn worker also moves the version seen
+by the other workers on the same host.  The file holds a number that every
+bump increments under an exclusive lock; unlike a modification time it
+cannot miss two bumps that land within one filesystem timestamp tick.
+"""
+
+import fcntl
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """Bounded LRU mapping with optional per-entry time to live (seconds)."""
+
+    def __init__(self, maxsize: int = 128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return (True, value) for a live entry or (False, None) otherwise."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, builder):
+        """Return the cached value for key, calling builder() on a miss."""
+        hit, value = self.get(key)
+        if not hit:
+            value = builder()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+class DataVersion:
+    """Version stamp of the data, bumped after each committed write."""
+
+    def __init__(self, marker_path=None):
+        self.marker_path = marker_path
+        self._counter = 0
+        self._lock = Lock()
+
+    def bump(self):
+        with self._lock:
+            self._counter += 1
+            if self.marker_path:
+                fd = os.open(self.marker_path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    # Read, increment and write back while other processes wait
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    value = _marker_value(os.pread(fd, MARKER_WIDTH, 0)) + 1
+                    os.pwrite(fd, b'%0*d' % (MARKER_WIDTH, value), 0)
+                    os.ftruncate(fd, MARKER_WIDTH)
+                finally:
+                    os.close(fd)    # also releases the lock
+
+    def current(self):
+        marker = None
+        if self.marker_path:
+            try:
+                fd = os.open(self.marker_path, os.O_RDONLY)
+            except OSError:
+                fd = None
+            if fd is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_SH)
+                    marker = _marker_value(os.pread(fd, MARKER_WIDTH, 0))
+                finally:
+                    os.close(fd)
+        return self._counter, marker
+
+
+# Digits of the counter in the marker file, written zero-padded in place
+MARKER_WIDTH = 20
+
+
+def _marker_value(data: bytes) -> int:
+    try:
+        return int(data.strip() or 0)
+    except ValueError:
+        # A marker from before the counter held a timestamp
+        return 0
@@ -0,0 +1,24 @@
+"""gunicorn settings: ``gunicorn -c gunicorn.conf.py 'app:create_app()'``.
+
+The app is loaded once in the master and forked into the workers.  The
+master must not hold a database connection when it forks, and the
+SCHEDULER_INTERVAL thread has to start in the workers: a thread started
+before the fork would only run in the master, next to its forks.
+"""
+
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Close anything opened while loading, so no worker shares a socket
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def post_worker_init(worker):
+    # Every worker starts the thread; the one holding the lock runs it
+    from app import app, start_scheduler
+    if app.config['SCHEDULER_INTERVAL']:
+        start_scheduler(app.config['SCHEDULER_INTERVAL'])
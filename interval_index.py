@@ -0,0 +1,125 @@
+"""Sorted interval index used for rental and booking overlap checks.
+
+Each car gets a list of date intervals sorted by start date together with a
+running maximum of the end dates.  Because the running maximum never
+decreases, the first interval that reaches a given date can be found with a
+binary search, which makes "does [start, end] overlap anything" a
+logarithmic lookup instead of a scan over every historical rental.
+
+Open ended intervals are stored with ``date.max`` as their end.  The index is
+plain Python and knows nothing about the database; ``app.py`` fills it from
+``Rental`` and ``Booking`` rows and drops a car's entry whenever a commit
+touches that car so it is rebuilt on the next lookup.  An optional
+``version`` callable (the cross-process data version) empties the whole
+index when it changes, which covers writes made by other processes.  The
+index is only a fast pre-filter: ``app.py`` re-checks against the database
+inside the write transaction before committing.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date
+from threading import Lock
+
+
+Interval = namedtuple('Interval', ['start', 'end', 'kind', 'id'])
+
+
+class SortedIntervals:
+    """Intervals for a single car, sorted by start date."""
+
+    def __init__(self, intervals=()):
+        self._items = sorted(intervals)
+        self._starts = [i.start for i in self._items]
+        self._max_ends = []
+        running = date.min
+        for item in self._items:
+            if item.end > running:
+                running = item.end
+            self._max_ends.append(running)
+
+    def __len__(self):
+        return len(self._items)
+
+    def find_overlap(self, start: date, end: date, exclude=None):
+        """
+        Return an interval overlapping [start, end] (inclusive) or None.
+        ``exclude`` is an interval id to ignore, used when an existing
+        rental or booking is being edited.
+        """
+        # Only intervals starting on or before ``end`` can overlap ...
+        upper = bisect_right(self._starts, end)
+        # ... and the first one whose running max end reaches ``start`` is
+        # the earliest interval that actually ends on or after ``start``.
+        first = bisect_left(self._max_ends, start, 0, upper)
+        for index in range(first, upper):
+            item = self._items[index]
+            if item.end >= start and item.id != exclude:
+                return item
+        return None
+
+
+class IntervalIndex:
+    """
+    Per-car interval index.  ``loader(car_id)`` must return the intervals
+    for a car; it is only called the first time a car is looked up or after
+    the car has been invalidated.  Intervals are kept apart by kind so a
+    lookup restricted to rentals never has to step over bookings.
+    ``version()``, when given, is checked on every lookup and any change
+    invalidates every car.
+    """
+
+    def __init__(self, loader, version=None):
+        self._loader = loader
+        self._version = version
+        self._seen_version = None
+        self._cars = {}
+        self._generation = 0
+        self._lock = Lock()
+
+    def _intervals_for(self, car_id: int) -> dict:
+        current = self._version() if self._version else None
+        with self._lock:
+            if current != self._seen_version:
+                self._seen_version = current
+                self._generation += 1
+                self._cars.clear()
+            by_kind = self._cars.get(car_id)
+            generation = self._generation
+        if by_kind is None:
+            grouped = {}
+            for interval in self._loader(car_id):
+                grouped.setdefault(interval.kind, []).append(interval)
+            by_kind = {kind: SortedIntervals(items) for kind, items in grouped.items()}
+            with self._lock:
+                # Don't cache a load that raced with an invalidation
+                if generation == self._generation:
+                    self._cars[car_id] = by_kind
+        return by_kind
+
+    def find_overlap(self, car_id: int, start: date, end, kinds, exclude=None):
+        """
+        Return an interval of one of ``kinds`` on ``car_id`` overlapping
+        [start, end], or None.  ``end`` may be None for an open ended range
+        and ``exclude`` is a (kind, id) pair to ignore.
+        """
+        by_kind = self._intervals_for(car_id)
+        for kind in kinds:
+            intervals = by_kind.get(kind)
+            if intervals is None:
+                continue
+            skip = exclude[1] if exclude is not None and exclude[0] == kind else None
+            match = intervals.find_overlap(start, end or date.max, exclude=skip)
+            if match is not None:
+                return match
+        return None
+
+    def invalidate(self, car_ids=None):
+        """Forget the given cars (or every car) so they are reloaded on demand."""
+        with self._lock:
+            self._generation += 1
+            if car_ids is None:
+                self._cars.clear()
+            else:
+                for car_id in car_ids:
+                    self._cars.pop(car_id, None)
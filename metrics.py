@@ -0,0 +1,146 @@
+"""Per-request performance metrics in Prometheus text format.
+
+``app.py`` opens a ``RequestStats`` when a request starts, feeds it every
+SQL statement the request runs (from SQLAlchemy's cursor events) and the
+time spent rendering templates, and hands it to ``RequestMetrics.observe``
+once the response is ready.  That adds one sample per endpoint to each
+histogram: wall time, SQL statement count, SQL time, template render time
+and response size.  ``RequestMetrics.render`` produces the text served at
+/metrics.
+
+Metrics live in the memory of one process.  Under gunicorn every worker
+keeps its own, so a scrape sees the worker that happened to answer it.
+"""
+
+import time
+from collections import Counter, defaultdict
+from threading import Lock
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Statements kept per request for the slow request log; the rest are only counted
+MAX_STATEMENTS = 200
+
+
+class Histogram:
+    """Cumulative histogram with one series per endpoint."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}   # endpoint -> [bucket counts..., +Inf count, sum]
+        self._lock = Lock()
+
+    def observe(self, endpoint: str, value: float):
+        with self._lock:
+            series = self._series.get(endpoint)
+            if series is None:
+                series = self._series[endpoint] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((endpoint, list(values)) for endpoint, values in self._series.items())
+        for endpoint, values in series:
+            label = _escape(endpoint)
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{endpoint="{label}",le="+Inf"}} {values[-2]}')
+            lines.append(f'{self.name}_sum{{endpoint="{label}"}} {values[-1]:g}')
+            lines.append(f'{self.name}_count{{endpoint="{label}"}} {values[-2]}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestStats:
+    """What one request has spent so far."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = []    # (statement, seconds), at most MAX_STATEMENTS
+        self.body_size = 0      # bytes of a streamed body sent so far
+        self._template_started = None
+
+    def add_statement(self, statement: str, seconds: float):
+        self.sql_count += 1
+        self.sql_time += seconds
+        if len(self.statements) < MAX_STATEMENTS:
+            self.statements.append((statement, seconds))
+
+    def start_template(self):
+        self._template_started = time.perf_counter()
+
+    def finish_template(self):
+        if self._template_started is not None:
+            self.template_time += time.perf_counter() - self._template_started
+            self._template_started = None
+
+    @property
+    def rendering(self) -> bool:
+        """True while a template is being rendered."""
+        return self._template_started is not None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def statement_summary(self, limit: int = 10) -> list:
+        """
+        (statement, executions, total seconds) for the statements that took
+        longest in total.  Identical SQL run many times, as in an N+1
+        pattern, is grouped together.
+        """
+        counts = Counter()
+        totals = defaultdict(float)
+        for statement, seconds in self.statements:
+            counts[statement] += 1
+            totals[statement] += seconds
+        ranked = sorted(totals, key=totals.get, reverse=True)[:limit]
+        return [(statement, counts[statement], totals[statement]) for statement in ranked]
+
+
+class RequestMetrics:
+    """The per-endpoint histograms of an application."""
+
+    def __init__(self, prefix: str = 'app'):
+        self.duration = Histogram(f'{prefix}_request_duration_seconds',
+                                  'Wall time from request start to response.', DURATION_BUCKETS)
+        self.sql_statements = Histogram(f'{prefix}_request_sql_statements',
+                                        'SQL statements executed per request.', COUNT_BUCKETS)
+        self.sql_duration = Histogram(f'{prefix}_request_sql_duration_seconds',
+                                      'Time spent executing SQL per request.', DURATION_BUCKETS)
+        self.template_duration = Histogram(f'{prefix}_request_template_duration_seconds',
+                                           'Time spent rendering templates per request.', DURATION_BUCKETS)
+        self.response_size = Histogram(f'{prefix}_response_size_bytes',
+                                       'Response body size.', SIZE_BUCKETS)
+        self.histograms = (self.duration, self.sql_statements, self.sql_duration,
+                           self.template_duration, self.response_size)
+
+    def observe(self, endpoint: str, stats: RequestStats, elapsed: float, size=None):
+        """Record a finished request; ``size`` is the body length in bytes, or None when unknown."""
+        self.duration.observe(endpoint, elapsed)
+        self.sql_statements.observe(endpoint, stats.sql_count)
+        self.sql_duration.observe(endpoint, stats.sql_time)
+        self.template_duration.observe(endpoint, stats.template_time)
+        if size is not None:
+            self.response_size.observe(endpoint, size)
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
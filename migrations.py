@@ -0,0 +1,60 @@
+"""Versioned schema migrations.
+
+The database records the highest migration it has run in a one-row
+``schema_version`` table.  ``upgrade()`` runs every newer migration in
+order, each in its own transaction together with the version bump, so an
+interrupted upgrade resumes where it stopped.  This lets an existing
+``instance/car_rental.db`` be brought up to date in place with
+``python app.py --upgrade-db``.
+
+Migrations are ``Migration(version, name, upgrade)`` tuples whose
+``upgrade(conn)`` receives a SQLAlchemy connection.  The first migration
+creates the tables from the current models, so later migrations must be
+idempotent (``checkfirst=True``, ``IF NOT EXISTS``) for databases created
+after they were written.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, select
+
+
+Migration = namedtuple('Migration', ['version', 'name', 'upgrade'])
+
+_version_meta = MetaData()
+schema_version = Table('schema_version', _version_meta,
+                       Column('version', Integer, nullable=False))
+
+
+def current_version(conn) -> int:
+    """Return the schema version recorded in the database (0 if none)."""
+    if not inspect(conn).has_table('schema_version'):
+        return 0
+    return conn.execute(select(schema_version.c.version)).scalar() or 0
+
+
+def _set_version(conn, version: int):
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+
+def upgrade(engine, migrations, target=None) -> list:
+    """
+    Apply pending migrations up to ``target`` (default: the latest) and
+    return the names of the ones that ran.
+    """
+    applied = []
+    with engine.begin() as conn:
+        _version_meta.create_all(conn)
+        version = current_version(conn)
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= version:
+            continue
+        if target is not None and migration.version > target:
+            break
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            _set_version(conn, migration.version)
+        version = migration.version
+        applied.append(f"{migration.version:03d}_{migration.name}")
+    return applied
@@ -0,0 +1,196 @@
+"""Fleet occupancy over a range of days.
+
+The occupancy of the fleet is a cars x days grid of small integer states
+(free, booked, rented, defleeted).  Rentals, bookings and defleet dates are
+passed in as plain rows and painted onto the grid a whole layer at a time:
+each interval adds +1 at its first day and -1 after its last day of a
+difference array, a cumulative sum along the days turns that into coverage,
+and the covered cells take the layer's state.  Later layers win, so a car
+that is both booked and rented on a day shows as rented.
+
+The same coverage masks give utilisation: rented days and in-service days
+are summed per calendar window (month, quarter or year) for every car at
+once, so overlapping rentals are only counted once.
+
+The module does not touch the database: ``app.py`` runs one query per
+source table and hands the rows to ``occupancy_grid`` or ``utilisation``.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+
+
+FREE, BOOKED, RENTED, DEFLEETED = 0, 1, 2, 3
+STATES = ('free', 'booked', 'rented', 'defleeted')
+
+
+def _offsets(dates, origin: int, missing: int) -> np.ndarray:
+    """Day numbers of ``dates`` relative to ``origin`` (an ordinal); None becomes ``missing``."""
+    return np.fromiter((missing if d is None else d.toordinal() - origin for d in dates),
+                       dtype=np.int64)
+
+
+def _intervals(car_ids: np.ndarray, origin: int, days: int, items):
+    """
+    Grid rows, start offsets and inclusive end offsets of ``items``, which
+    are (car_id, start, end) with None for an open end, or (car_id, start)
+    for intervals that never end.  Items for unknown cars are dropped.
+    """
+    items = list(items)
+    if not items or not len(car_ids):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    columns = list(zip(*items))
+    ids = np.fromiter(columns[0], dtype=np.int64, count=len(items))
+    starts = _offsets(columns[1], origin, 0)
+    ends = _offsets(columns[2], origin, days) if len(columns) > 2 else np.full(len(items), days)
+    order = np.argsort(car_ids, kind='stable')
+    sorted_ids = car_ids[order]
+    positions = np.searchsorted(sorted_ids, ids).clip(max=len(sorted_ids) - 1)
+    known = sorted_ids[positions] == ids
+    return order[positions[known]], starts[known], ends[known]
+
+
+def coverage(shape: tuple, rows: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Boolean cars x days mask of the days covered by any interval
+    (``rows[i]``, ``starts[i]`` to ``ends[i]`` inclusive).  Offsets may lie
+    outside the grid; overlapping intervals are merged.
+    """
+    cars, days = shape
+    starts = np.clip(starts, 0, days)
+    ends = np.clip(ends + 1, 0, days)
+    keep = starts < ends
+    if not keep.any():
+        return np.zeros(shape, dtype=bool)
+    rows, starts, ends = rows[keep], starts[keep], ends[keep]
+    delta = np.zeros((cars, days + 1), dtype=np.int32)
+    np.add.at(delta, (rows, starts), 1)
+    np.add.at(delta, (rows, ends), -1)
+    return np.cumsum(delta[:, :days], axis=1) > 0
+
+
+def occupancy_grid(car_ids, first: date, last: date, rentals=(), bookings=(), defleets=()) -> np.ndarray:
+    """
+    State of each car in ``car_ids`` on each day from ``first`` to ``last``
+    inclusive, as a uint8 array with one row per car.
+
+    ``rentals`` and ``bookings`` are iterables of (car_id, start_date,
+    end_date) with an inclusive end date (None for an open ended rental);
+    ``defleets`` holds (car_id, date) pairs, the car being defleeted from
+    that date on.  Rows for cars not in ``car_ids`` are ignored.
+    """
+    car_ids = np.asarray(list(car_ids), dtype=np.int64)
+    origin = first.toordinal()
+    days = max(last.toordinal() - origin + 1, 0)
+    grid = np.zeros((len(car_ids), days), dtype=np.uint8)
+    for items, state in ((defleets, DEFLEETED), (bookings, BOOKED), (rentals, RENTED)):
+        grid[coverage(grid.shape, *_intervals(car_ids, origin, days, items))] = state
+    return grid
+
+
+# ---------------------------------------------------------------------------
+# Utilisation over calendar windows.  A car is in service from its first
+# rental until the day before it is defleeted; utilisation in a window is the
+# share of its in-service days there that some rental covers.
+
+_PERIOD_MONTHS = {'month': 1, 'quarter': 3, 'year': 12}
+
+
+def windows(first: date, last: date, period: str) -> list:
+    """
+    Calendar (start, end) windows of ``period`` covering ``first`` to
+    ``last``, clipped to them.  A ``period`` of None gives a single window.
+    """
+    if period is None:
+        return [(first, last)] if first <= last else []
+    step = _PERIOD_MONTHS[period]
+    month = (first.month - 1) // step * step
+    year = first.year
+    result = []
+    start = first
+    while start <= last:
+        month += step
+        year, month = year + month // 12, month % 12
+        following = date(year, month + 1, 1)
+        end = min(following - timedelta(days=1), last)
+        result.append((start, end))
+        start = following
+    return result
+
+
+class Utilisation:
+    """Rented and in-service days per car (rows) and window (columns)."""
+
+    def __init__(self, car_ids: list, windows: list, rented: np.ndarray, available: np.ndarray):
+        self.car_ids = car_ids
+        self.windows = windows
+        self.rented = rented
+        self.available = available
+
+    @staticmethod
+    def _percent(rented: np.ndarray, available: np.ndarray) -> list:
+        return [round(float(r) / a * 100, 2) if a else None for r, a in zip(rented, available)]
+
+    def car_percent(self, row: int) -> list:
+        """Utilisation (%) of the car in ``row`` per window; None when it was not in service."""
+        return self._percent(self.rented[row], self.available[row])
+
+    def car_total_percent(self, row: int):
+        """Utilisation (%) of the car in ``row`` over all the windows together."""
+        return self._percent([self.rented[row].sum()], [self.available[row].sum()])[0]
+
+    def fleet_rented(self) -> np.ndarray:
+        return self.rented.sum(axis=0)
+
+    def fleet_available(self) -> np.ndarray:
+        return self.available.sum(axis=0)
+
+    def fleet_percent(self) -> list:
+        return self._percent(self.fleet_rented(), self.fleet_available())
+
+
+def utilisation(car_ids, first: date, last: date, period: str, rentals, defleets=(),
+                service_starts=None) -> Utilisation:
+    """
+    Utilisation of every car in ``car_ids`` for each ``period`` window from
+    ``first`` to ``last``.  ``rentals`` holds (car_id, start_date, end_date)
+    rows; open rentals run to ``last``.  A car's service starts with its
+    first rental: pass (car_id, first start date) pairs as
+    ``service_starts`` when ``rentals`` only holds the rentals in the range,
+    otherwise it is taken from ``rentals``.  ``defleets`` holds (car_id,
+    date) pairs.
+    """
+    car_ids = np.asarray(list(car_ids), dtype=np.int64)
+    spans = windows(first, last, period)
+    origin = first.toordinal()
+    days = max(last.toordinal() - origin + 1, 0)
+    shape = (len(car_ids), days)
+    rows, starts, ends = _intervals(car_ids, origin, days, rentals)
+    rented = coverage(shape, rows, starts, ends)
+    # Service runs from each car's first rental to the day before its defleet date
+    service_start = np.full(len(car_ids), days, dtype=np.int64)
+    if service_starts is None:
+        np.minimum.at(service_start, rows, starts)
+    else:
+        start_rows, start_days, _ = _intervals(car_ids, origin, days, service_starts)
+        np.minimum.at(service_start, start_rows, start_days)
+    service_end = np.full(len(car_ids), days, dtype=np.int64)
+    defleet_rows, defleet_days, _ = _intervals(car_ids, origin, days, defleets)
+    np.minimum.at(service_end, defleet_rows, defleet_days - 1)
+    in_service = coverage(shape, np.arange(len(car_ids)), service_start, service_end)
+    if not spans or not len(car_ids):
+        empty = np.zeros((len(car_ids), len(spans)), dtype=np.int64)
+        return Utilisation(car_ids.tolist(), spans, empty, empty)
+    # Sum each window's columns in one reduceat per grid
+    bounds = np.array([start.toordinal() - origin for start, _ in spans])
+    return Utilisation(car_ids.tolist(), spans,
+                       np.add.reduceat((rented & in_service).astype(np.int32), bounds, axis=1),
+                       np.add.reduceat(in_service.astype(np.int32), bounds, axis=1))
+
+
+def encode_rows(grid: np.ndarray) -> list:
+    """One string of state digits per car, e.g. '0011222'."""
+    text = (grid + ord('0')).astype(np.uint8)
+    return [row.tobytes().decode('ascii') for row in text]
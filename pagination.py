@@ -0,0 +1,175 @@
+"""Keyset (cursor) pagination for list pages.
+
+Instead of OFFSET, each page is fetched with ``WHERE (sort_col, id) > (?, ?)
+ORDER BY sort_col, id LIMIT n + 1`` starting from the last row of the
+previous page, so every page costs the same index range read and only one
+page of rows is ever held in memory, however long the history is.
+
+The position is carried in an opaque ``after``/``before`` cursor (URL-safe
+base64 of the sort value and id).  Sort columns should be indexed; ``id``
+breaks ties so the order is total.  NULLs in a nullable sort column are
+treated as the lowest value of its type, since a row comparison with NULL
+would never match.  That makes the sort key ``coalesce(column, floor)``
+with the floor written inline, and such a column needs an expression index
+on exactly that key, which ``nullable_sort_key`` spells out for the model's
+``__table_args__``.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, func, literal_column, text, tuple_
+
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+# Value standing in for NULL per type, and its SQL literal.  The literal is
+# rendered inline rather than bound so the key matches its index expression.
+_NULL_FLOOR = {date: (date.min, "'0001-01-01'"),
+               datetime: (datetime.min, "'0001-01-01 00:00:00.000000'"),
+               str: ('', "''"),
+               int: (-1e308, '-1e308'),
+               float: (-1e308, '-1e308')}
+
+
+def nullable_sort_key(column_name: str, column_type):
+    """
+    The sort key of a nullable column as an index expression for db.Index(),
+    e.g. ``nullable_sort_key('date', db.Date)``.
+    """
+    if isinstance(column_type, type):
+        column_type = column_type()
+    return text(f"coalesce({column_name}, {_NULL_FLOOR[column_type.python_type][1]})")
+
+
+def _sort_key(column):
+    """The expression to order by: the column itself, or NULLs mapped to a floor."""
+    if not column.nullable:
+        return column, None
+    floor, floor_sql = _NULL_FLOOR[column.type.python_type]
+    return func.coalesce(column, literal_column(floor_sql, column.type)), floor
+
+
+def _beyond(sort_expr, key, cursor, forwards: bool):
+    """
+    Rows past ``cursor`` in ascending (``forwards``) or descending order.
+    The extra bound on the sort key alone is implied by the row comparison,
+    but it is what lets SQLite start the index range at the cursor when the
+    key is an expression.
+    """
+    value, row_id = cursor
+    bound = tuple_(value, row_id)
+    if forwards:
+        return and_(sort_expr >= value, key > bound)
+    return and_(sort_expr <= value, key < bound)
+
+
+def encode_cursor(value, row_id: int) -> str:
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, column):
+    """Return (value, id) from a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+        python_type = column.type.python_type
+        if value is not None and python_type is date:
+            value = date.fromisoformat(value)
+        elif value is not None and python_type is datetime:
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+class Page:
+    """One page of a keyset-paginated list plus the arguments for its links."""
+
+    def __init__(self, items, endpoint, view_args, sort, direction, per_page,
+                 next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.endpoint = endpoint
+        self.sort = sort
+        self.direction = direction
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self._base_args = dict(view_args, sort=sort, dir=direction, per_page=per_page)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+    @property
+    def next_args(self) -> dict:
+        return dict(self._base_args, after=self.next_cursor)
+
+    @property
+    def prev_args(self) -> dict:
+        return dict(self._base_args, before=self.prev_cursor)
+
+    def sort_args(self, sort: str) -> dict:
+        """Link arguments for sorting by ``sort``; toggles direction if already sorted by it."""
+        direction = 'desc' if sort == self.sort and self.direction == 'asc' else 'asc'
+        return dict(self._base_args, sort=sort, dir=direction)
+
+
+def paginate(query, id_column, sorts: dict, default_sort: str, default_direction: str,
+             args, endpoint: str, view_args=None, per_page=DEFAULT_PER_PAGE) -> Page:
+    """
+    Return a Page of ``query``.  ``sorts`` maps the names accepted in the
+    ``sort`` argument to columns; ``args`` is the request's query string
+    (``sort``, ``dir``, ``after``, ``before``, ``per_page``).
+    """
+    sort = args.get('sort') if args.get('sort') in sorts else default_sort
+    direction = args.get('dir') if args.get('dir') in ('asc', 'desc') else default_direction
+    try:
+        per_page = min(max(int(args.get('per_page', per_page)), 1), MAX_PER_PAGE)
+    except ValueError:
+        pass
+    column = sorts[sort]
+    sort_expr, floor = _sort_key(column)
+    key = tuple_(sort_expr, id_column)
+    ascending = direction == 'asc'
+
+    before = decode_cursor(args['before'], column) if args.get('before') else None
+    after = decode_cursor(args['after'], column) if args.get('after') and before is None else None
+
+    if before is not None:
+        # Walk backwards from the cursor, then restore display order
+        query = query.filter(_beyond(sort_expr, key, before, forwards=not ascending))
+        backwards = ascending
+    else:
+        if after is not None:
+            query = query.filter(_beyond(sort_expr, key, after, forwards=ascending))
+        backwards = not ascending
+    if backwards:
+        query = query.order_by(sort_expr.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_expr.asc(), id_column.asc())
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    def cursor_of(item):
+        value = getattr(item, column.key)
+        return encode_cursor(floor if value is None else value, getattr(item, id_column.key))
+
+    if before is not None:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after is not None, more
+    return Page(rows, endpoint, view_args or {}, sort, direction, per_page,
+                next_cursor=cursor_of(rows[-1]) if rows and has_next else None,
+                prev_cursor=cursor_of(rows[0]) if rows and has_prev else None)
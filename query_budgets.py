@@ -0,0 +1,101 @@
+"""SQL statement budgets per route.
+
+Each endpoint may run at most a declared number of SQL statements for one
+request.  ``check_query_budgets`` requests every URL through the Flask test
+client, records the statements it executes and compares their number with
+the endpoint's budget.  Budgets only mean something at a known data scale,
+so ``app.py`` declares them for one of the synthetic presets (see
+synthetic.py): a template edit that turns a list into one lazy load per row
+then exceeds the budget long before it would be noticed in production.
+
+For every statement the report names where it was triggered: the template
+and line when it came from rendering (for example a lazy ``rental.car`` in
+``rentals.html``), otherwise the innermost line of application code.
+
+Run it with ``python app.py --check-query-budgets``; the command exits with
+a non-zero status when a route is over budget.
+"""
+
+import os
+import sys
+from collections import Counter
+from urllib.parse import urlsplit
+
+from sqlalchemy import event
+
+
+def statement_origin(app_root: str) -> str:
+    """
+    Where the statement being executed was triggered: 'template.html:line'
+    for the innermost template being rendered, else 'file.py:line (function)'
+    for the innermost frame of application code under ``app_root``.
+    """
+    frame = sys._getframe(1)
+    code_line = None
+    while frame is not None:
+        # Jinja puts the Template object in the globals of its compiled code
+        template = frame.f_globals.get('__jinja_template__')
+        if template is not None:
+            return f"{template.name}:{template.get_corresponding_lineno(frame.f_lineno)}"
+        filename = frame.f_code.co_filename
+        if (code_line is None and filename.startswith(app_root) and filename != __file__
+                and 'site-packages' not in filename):
+            code_line = f"{os.path.relpath(filename, app_root)}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return code_line or '?'
+
+
+class RouteQueries:
+    """The statements one request of ``url`` ran, against its endpoint's budget."""
+
+    def __init__(self, url: str, endpoint: str, status: int, budget: int, statements: list):
+        self.url = url
+        self.endpoint = endpoint
+        self.status = status
+        self.budget = budget
+        self.statements = statements    # (statement, origin) in execution order
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.count > self.budget
+
+    def summary(self) -> list:
+        """(executions, origin, statement), most repeated first."""
+        counts = Counter(self.statements)
+        return [(executions, origin, statement)
+                for (statement, origin), executions in counts.most_common()]
+
+
+def check_query_budgets(app, engine, urls: list, budgets: dict, default: int, before_each=None) -> list:
+    """
+    Request each of ``urls`` once and return a RouteQueries for each.
+    ``budgets`` maps endpoints to their statement budget; endpoints missing
+    from it get ``default``.  ``before_each`` is called before every
+    request, e.g. to empty caches so the full cost is counted.
+    """
+    captured = []
+    app_root = os.path.abspath(app.root_path)
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        captured.append((' '.join(statement.split()), statement_origin(app_root)))
+
+    adapter = app.url_map.bind('localhost')
+    client = app.test_client()
+    results = []
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for url in urls:
+            endpoint = adapter.match(urlsplit(url).path)[0]
+            if before_each:
+                before_each()
+            del captured[:]
+            response = client.get(url)
+            results.append(RouteQueries(url, endpoint, response.status_code,
+                                        budgets.get(endpoint, default), list(captured)))
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return results
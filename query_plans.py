@@ -0,0 +1,82 @@
+"""EXPLAIN QUERY PLAN check for the SQL each page runs.
+
+Every GET route is requested through the Flask test client while the SELECT
+statements it issues are recorded.  Each statement is then run through
+SQLite's ``EXPLAIN QUERY PLAN`` with its original parameters and any step
+that reads a whole table without an index (``SCAN <table>``) is reported.
+Small reference tables whose full listing is the point of a page can be
+allowed explicitly.
+
+Run it with ``python app.py --check-query-plans``; the command exits with a
+non-zero status when a route does a full table scan.
+"""
+
+import re
+
+from sqlalchemy import event
+
+
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+
+
+def route_urls(app, sample_args: dict) -> list:
+    """URLs for every GET rule, filling arguments from ``sample_args``."""
+    urls = []
+    with app.test_request_context():
+        from flask import url_for
+        for rule in app.url_map.iter_rules():
+            if 'GET' not in rule.methods or rule.endpoint == 'static':
+                continue
+            if any(arg not in sample_args for arg in rule.arguments):
+                continue
+            values = {arg: sample_args[arg] for arg in rule.arguments}
+            urls.append(url_for(rule.endpoint, **values))
+    return sorted(urls)
+
+
+def full_scans(conn, statement: str, parameters) -> list:
+    """Return the plan steps of a statement that scan a table without an index."""
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        match = _SCAN.match(detail)
+        # Virtual tables (FTS5) report their own index as VIRTUAL TABLE INDEX
+        if match and 'USING' not in match.group(2) and 'VIRTUAL TABLE' not in match.group(2):
+            scans.append((match.group(1), detail))
+    return scans
+
+
+def check_query_plans(app, engine, sample_args: dict, allowed_scans=(), extra_urls=()) -> list:
+    """
+    Drive every GET route and return a list of (url, statement, plan step)
+    for each full table scan outside ``allowed_scans``.
+    """
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    problems = []
+    seen = set()
+    client = app.test_client()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for url in route_urls(app, sample_args) + list(extra_urls):
+            del captured[:]
+            response = client.get(url)
+            if response.status_code >= 500:
+                problems.append((url, None, f'HTTP {response.status_code}'))
+                continue
+            for statement, parameters in list(captured):
+                if (url, statement) in seen:
+                    continue
+                seen.add((url, statement))
+                with engine.connect() as conn:
+                    for table, detail in full_scans(conn, statement, parameters):
+                        if table not in allowed_scans:
+                            problems.append((url, statement, detail))
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return problems
@@ -0,0 +1,55 @@
+"""Receivables and aging.
+
+What a rental owes is its rent (charged billing periods, plus periods that
+have started since the scheduler last ran) and its unpaid fines, damages and
+Salik entries, less the payments recorded against it.  Payments are not
+allocated to specific charges, so for aging they are taken to settle the
+oldest amounts first.  Whatever remains outstanding is then always the most
+recent amounts, which means aging only needs the total that fell due in each
+bucket, not the individual items: the balance is spread over the buckets
+from the newest back.
+
+The module does not touch the database: ``app.py`` sums the amounts per
+rental and bucket with grouped queries and passes them in.
+"""
+
+from bisect import bisect_left
+
+
+BUCKETS = ('0-30', '31-60', '61-90', '90+')
+# Oldest age (days since due) of each bucket but the last
+BUCKET_LIMITS = (30, 60, 90)
+
+
+def bucket_for(age_days: int) -> int:
+    """Index into BUCKETS for an amount that fell due ``age_days`` ago."""
+    return bisect_left(BUCKET_LIMITS, age_days)
+
+
+class Balance:
+    """What one rental owes, split into rent and other charges and aged."""
+
+    def __init__(self, rental_id: int, rent: float, charges: float, payments: float, aged: list):
+        self.rental_id = rental_id
+        self.rent = rent
+        self.charges = charges
+        self.payments = payments
+        self.aged = aged    # outstanding amount per bucket
+
+    @property
+    def balance(self) -> float:
+        """Net amount owed; negative when the customer is in credit."""
+        return self.rent + self.charges - self.payments
+
+
+def age_balance(rental_id: int, rent: float, charges: float, payments: float, due_by_bucket) -> Balance:
+    """
+    Balance of one rental.  ``due_by_bucket`` holds the rent and charges
+    that fell due in each bucket, together.
+    """
+    balance = Balance(rental_id, rent or 0.0, charges or 0.0, payments or 0.0, [0.0] * len(BUCKETS))
+    outstanding = max(balance.balance, 0.0)
+    for index, amount in enumerate(due_by_bucket):
+        balance.aged[index] = min(amount, outstanding)
+        outstanding -= balance.aged[index]
+    return balance
@@ -0,0 +1,178 @@
+"""Bulk import of Salik toll statements.
+
+A statement is a CSV or XLSX export with one row per toll trip, carrying at
+least the tag number, the trip date and the amount.  The file is read in
+chunks so memory stays flat however many trips it has.  Each chunk is
+resolved to cars through their Salik tag and to rentals through the trip
+date (an as-of join against rental start dates, checked against the end
+date), then reduced to per-rental totals.  Only those totals are kept
+between chunks, so the result is one ``Salik`` row per rental covered by
+the statement.
+
+The module does not touch the database: ``app.py`` passes in the tag map
+and the rentals and turns the returned ``ImportPlan`` into rows.
+"""
+
+import os
+import re
+from collections import Counter
+
+import pandas as pd
+
+
+CHUNK_SIZE = 20000
+
+# Accepted header spellings, compared after lowercasing and dropping
+# everything but letters and digits ("Trip Date/Time" -> "tripdatetime").
+COLUMN_ALIASES = {
+    'tag': {'tag', 'tagno', 'tagnumber', 'tagid', 'saliktag', 'saliktagnumber'},
+    'date': {'date', 'tripdate', 'tripdatetime', 'transactiondate', 'transactiondatetime',
+             'crossingdate', 'crossingdatetime', 'datetime', 'tripdateandtime'},
+    'amount': {'amount', 'amountaed', 'toll', 'tollamount', 'tollaed', 'charge', 'fare'},
+}
+
+
+def normalise_tag(tag) -> str:
+    """Canonical form of a tag number, so '00123', '123' and 123.0 agree."""
+    if tag is None or (isinstance(tag, float) and pd.isna(tag)):
+        return ''
+    text = str(tag).strip()
+    if re.fullmatch(r'\d+\.0+', text):
+        text = text.split('.')[0]
+    return re.sub(r'[^0-9A-Za-z]', '', text).upper().lstrip('0')
+
+
+def _header_key(name) -> str:
+    return re.sub(r'[^0-9a-z]', '', str(name).lower())
+
+
+def _column_map(headers) -> dict:
+    """Map our column names to the statement's headers; ValueError if one is missing."""
+    found = {}
+    for header in headers:
+        key = _header_key(header)
+        for column, aliases in COLUMN_ALIASES.items():
+            if key in aliases and column not in found:
+                found[column] = header
+    missing = [column for column in COLUMN_ALIASES if column not in found]
+    if missing:
+        raise ValueError(f"Statement has no {', '.join(missing)} column "
+                         f"(found: {', '.join(str(h) for h in headers)}).")
+    return found
+
+
+def _tidy(chunk: pd.DataFrame, columns: dict) -> pd.DataFrame:
+    """Select and type the tag, date and amount columns of a raw chunk."""
+    frame = pd.DataFrame({
+        'tag': chunk[columns['tag']].map(normalise_tag),
+        'date': (pd.to_datetime(chunk[columns['date']], dayfirst=True, errors='coerce')
+                 .dt.normalize().astype('datetime64[ns]')),
+    })
+    amount = chunk[columns['amount']]
+    if not pd.api.types.is_numeric_dtype(amount):
+        amount = amount.astype(str).str.replace(r'[^0-9.\-]', '', regex=True)
+    frame['amount'] = pd.to_numeric(amount, errors='coerce')
+    return frame
+
+
+def read_statement(path: str, chunksize: int = CHUNK_SIZE):
+    """Yield tidy DataFrames of (tag, date, amount) from a CSV or XLSX file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        reader = pd.read_csv(path, dtype=str, chunksize=chunksize, skipinitialspace=True)
+        columns = None
+        for chunk in reader:
+            columns = columns or _column_map(chunk.columns)
+            yield _tidy(chunk, columns)
+    elif extension == '.xlsx':
+        # pandas cannot chunk Excel files; stream rows with openpyxl instead
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = next(rows, None)
+            if headers is None:
+                return
+            columns = _column_map([h for h in headers if h is not None])
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= chunksize:
+                    yield _tidy(pd.DataFrame(batch, columns=headers), columns)
+                    batch = []
+            if batch:
+                yield _tidy(pd.DataFrame(batch, columns=headers), columns)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Unsupported statement type '{extension}', expected CSV or XLSX.")
+
+
+class ImportPlan:
+    """What importing a statement would do: per-rental totals plus the leftovers."""
+
+    def __init__(self):
+        self.trips = 0
+        self.invalid = 0                # rows without a usable tag, date or amount
+        self.unknown_tags = Counter()   # tag -> trips on tags no car carries
+        self.unrented = Counter()       # car_id -> trips outside any rental
+        self._partials = []
+
+    @property
+    def rows(self) -> list:
+        """One dict per rental: car_id, rental_id, start_date, end_date, amount, trips."""
+        if not self._partials:
+            return []
+        totals = (pd.concat(self._partials)
+                  .groupby(['car_id', 'rental_id'], as_index=False)
+                  .agg(start_date=('start_date', 'min'), end_date=('end_date', 'max'),
+                       amount=('amount', 'sum'), trips=('trips', 'sum'))
+                  .sort_values(['car_id', 'start_date']))
+        return [{'car_id': int(r.car_id), 'rental_id': int(r.rental_id),
+                 'start_date': r.start_date.date(), 'end_date': r.end_date.date(),
+                 'amount': round(float(r.amount), 2), 'trips': int(r.trips)}
+                for r in totals.itertuples(index=False)]
+
+    @property
+    def matched(self) -> int:
+        return self.trips - self.invalid - sum(self.unknown_tags.values()) - sum(self.unrented.values())
+
+
+def plan_import(chunks, car_by_tag: dict, rentals) -> ImportPlan:
+    """
+    Match statement ``chunks`` (see read_statement) to cars and rentals.
+    ``car_by_tag`` maps normalised tags to car ids; ``rentals`` is an
+    iterable of (rental_id, car_id, start_date, end_date or None).
+    """
+    spans = pd.DataFrame(list(rentals), columns=['rental_id', 'car_id', 'start', 'end'])
+    spans['start'] = pd.to_datetime(spans['start']).astype('datetime64[ns]')
+    spans['end'] = (pd.to_datetime(spans['end']).astype('datetime64[ns]')
+                    .fillna(pd.Timestamp.max.normalize()))
+    spans['car_id'] = spans['car_id'].astype('int64')
+    spans = spans.sort_values('start')
+
+    plan = ImportPlan()
+    for chunk in chunks:
+        plan.trips += len(chunk)
+        valid = chunk['date'].notna() & chunk['amount'].notna() & (chunk['tag'] != '')
+        plan.invalid += int((~valid).sum())
+        chunk = chunk[valid].copy()
+        chunk['car_id'] = chunk['tag'].map(car_by_tag)
+        unknown = chunk['car_id'].isna()
+        plan.unknown_tags.update(chunk.loc[unknown, 'tag'].value_counts().to_dict())
+        chunk = chunk[~unknown].astype({'car_id': 'int64'}).sort_values('date')
+        if chunk.empty:
+            continue
+        # Latest rental of the same car starting on or before the trip ...
+        joined = pd.merge_asof(chunk, spans, left_on='date', right_on='start',
+                               by='car_id', direction='backward')
+        # ... which must also not have ended before it
+        inside = joined['rental_id'].notna() & (joined['date'] <= joined['end'])
+        plan.unrented.update(joined.loc[~inside, 'car_id'].value_counts().to_dict())
+        joined = joined[inside]
+        if not joined.empty:
+            plan._partials.append(
+                joined.groupby(['car_id', 'rental_id'], as_index=False)
+                      .agg(start_date=('date', 'min'), end_date=('date', 'max'),
+                           amount=('amount', 'sum'), trips=('amount', 'size')))
+    return plan
@@ -0,0 +1,116 @@
+"""Full-text search over customers, cars, bookings and charge descriptions.
+
+Searchable text lives in a single SQLite FTS5 table, ``search_index``, with
+one row per source record.  Triggers on each source table keep it in step
+with inserts, updates and deletes, so nothing in the application has to
+remember to reindex.  The FTS rowid encodes the source (``id * 8 + code``),
+which lets the triggers replace a record's entry by rowid instead of
+searching the index for it.
+
+``SOURCES`` describes what is indexed: for each kind, the table and the SQL
+expressions (over the trigger's ``new`` row) that make up the title and
+body columns.  Titles are weighted above bodies when ranking with bm25.
+"""
+
+import re
+from collections import namedtuple
+
+from markupsafe import Markup, escape
+
+
+Source = namedtuple('Source', ['kind', 'code', 'table', 'title', 'body'])
+
+SOURCES = [
+    Source('customer', 1, 'customer', "{r}.name",
+           "coalesce({r}.phone, '') || ' ' || coalesce({r}.address, '')"),
+    Source('car', 2, 'car', "coalesce({r}.licence_plate, '')",
+           "coalesce({r}.model, '') || ' ' || coalesce({r}.salik_tag, '')"),
+    Source('booking', 3, 'booking', "coalesce({r}.note, '')", "''"),
+    Source('fine', 4, 'fine', "coalesce({r}.description, '')", "''"),
+    Source('damage', 5, 'damage', "coalesce({r}.description, '')", "''"),
+    Source('expense', 6, 'expense', "coalesce({r}.description, '')",
+           "coalesce({r}.category, '')"),
+]
+
+# bm25 weights per column: kind and ref_id are unindexed
+_WEIGHTS = '0.0, 0.0, 10.0, 1.0'
+# Snippet delimiters, swapped for <mark> tags after the text is escaped
+_HL_OPEN, _HL_CLOSE = '\x02', '\x03'
+
+SearchResult = namedtuple('SearchResult', ['kind', 'ref_id', 'title', 'snippet', 'rank'])
+
+
+def _rowid(source: Source, row: str) -> str:
+    return f"{row}.id * 8 + {source.code}"
+
+
+def _insert_sql(source: Source, row: str) -> str:
+    return (f"INSERT INTO search_index(rowid, kind, ref_id, title, body) "
+            f"SELECT {_rowid(source, row)}, '{source.kind}', {row}.id, "
+            f"{source.title.format(r=row)}, {source.body.format(r=row)}")
+
+
+def create_search_index(conn):
+    """Create the FTS table and its triggers (idempotent) and fill it."""
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+    for source in SOURCES:
+        name, table = source.kind, source.table
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS search_{name}_ai AFTER INSERT ON {table} BEGIN "
+            f"{_insert_sql(source, 'new')}; END")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS search_{name}_au AFTER UPDATE ON {table} BEGIN "
+            f"DELETE FROM search_index WHERE rowid = {_rowid(source, 'old')}; "
+            f"{_insert_sql(source, 'new')}; END")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS search_{name}_ad AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM search_index WHERE rowid = {_rowid(source, 'old')}; END")
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn):
+    """Repopulate the index from the source tables."""
+    conn.exec_driver_sql("DELETE FROM search_index")
+    for source in SOURCES:
+        conn.exec_driver_sql(f"{_insert_sql(source, source.table)} FROM {source.table}")
+    conn.exec_driver_sql("INSERT INTO search_index(search_index) VALUES ('optimize')")
+
+
+def match_expression(text: str):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix,
+    in any column.  Returns None when the text has nothing searchable.
+    Quoting each word keeps FTS5 operators typed by the user literal.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _highlight(snippet: str) -> Markup:
+    return Markup(str(escape(snippet))
+                  .replace(_HL_OPEN, '<mark>').replace(_HL_CLOSE, '</mark>'))
+
+
+def search(conn, text: str, limit: int = 50, kinds=None) -> list:
+    """Return up to ``limit`` SearchResults for ``text``, best match first."""
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    sql = (f"SELECT kind, ref_id, title, "
+           f"snippet(search_index, -1, '{_HL_OPEN}', '{_HL_CLOSE}', '…', 10), "
+           f"bm25(search_index, {_WEIGHTS}) AS rank "
+           f"FROM search_index WHERE search_index MATCH ?")
+    params = [expression]
+    if kinds:
+        sql += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+        params.extend(kinds)
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+    rows = conn.exec_driver_sql(sql, tuple(params)).all()
+    return [SearchResult(kind, ref_id, title, _highlight(snippet), rank)
+            for kind, ref_id, title, snippet, rank in rows]
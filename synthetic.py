@@ -0,0 +1,295 @@
+"""Seeded synthetic data for benchmarks.
+
+``generate`` fills an empty database with a plausible fleet: cars with a
+history of back-to-back rentals, payments spread over the billed periods of
+each rental (a few rentals fall behind), monthly Salik rows, occasional
+fines and damages, running costs and yearly recurring expenses, upcoming
+bookings, the car list order and some defleeted cars.  The same seed and
+scale always give the same rows, so two benchmark runs see the same data.
+
+Rows are written with Core bulk inserts in batches and payments are
+streamed, so even the 5,000 car / 1M payment scale stays within a modest
+amount of memory.  The module does not touch the application: ``app.py``
+passes in a connection and the metadata's tables, and afterwards rebuilds
+the derived tables (the car ledger) that bulk inserts bypass.
+"""
+
+import random
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+
+
+Scale = namedtuple('Scale', ['cars', 'payments', 'years'])
+
+PRESETS = {
+    'small': Scale(cars=50, payments=10_000, years=3),
+    'medium': Scale(cars=500, payments=100_000, years=3),
+    'large': Scale(cars=5000, payments=1_000_000, years=3),
+}
+# Payments per car when the scale is given as a number of cars
+PAYMENTS_PER_CAR = 200
+BATCH_SIZE = 10000
+
+MODELS = ['Toyota Corolla', 'Toyota Camry', 'Nissan Sunny', 'Nissan Patrol', 'Kia Picanto',
+          'Hyundai Elantra', 'Mitsubishi Pajero', 'Honda Civic', 'Chevrolet Tahoe', 'Ford Explorer']
+COLOURS = ['White', 'Black', 'Silver', 'Grey', 'Blue', 'Red']
+FIRST_NAMES = ['Aisha', 'Omar', 'Fatima', 'Ahmed', 'Sara', 'Yusuf', 'Lena', 'Ravi', 'Maria',
+               'John', 'Priya', 'Hassan', 'Anna', 'Karim', 'Noor', 'David']
+LAST_NAMES = ['Khan', 'Al Mansoori', 'Schmidt', 'Patel', 'Haddad', 'Fernandes', 'Smith',
+              'Nair', 'Hussain', 'Weber', 'Rahman', 'Costa']
+AREAS = ['Dubai Marina', 'Deira', 'Al Barsha', 'JLT', 'Business Bay', 'Jumeirah', 'Karama']
+FINE_REASONS = ['Speeding', 'Parking', 'Red light', 'Lane change', 'Mobile phone use']
+DAMAGE_REASONS = ['Scratched bumper', 'Dented door', 'Cracked windscreen', 'Broken mirror']
+
+
+def scale_for(value: str, payments: int = None) -> Scale:
+    """A preset name or a number of cars, with an optional payment count override."""
+    if value in PRESETS:
+        scale = PRESETS[value]
+    else:
+        try:
+            cars = int(value)
+        except ValueError:
+            raise ValueError(f"Unknown scale {value!r}; use {', '.join(PRESETS)} or a number of cars.")
+        if cars < 1:
+            raise ValueError("The number of cars must be positive.")
+        scale = Scale(cars=cars, payments=cars * PAYMENTS_PER_CAR, years=3)
+    return scale._replace(payments=payments) if payments is not None else scale
+
+
+def _insert(conn, table, rows, counts: Counter):
+    """Insert an iterable of row dicts in batches."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.execute(table.insert(), batch)
+            counts[table.name] += len(batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+        counts[table.name] += len(batch)
+
+
+def _periods(rental: dict, today: date) -> int:
+    """Billing periods of a rental that have started by ``today``."""
+    if rental['start_date'] > today:
+        return 0
+    last = min(rental['end_date'] or today, today)
+    return (last - rental['start_date']).days // rental['billing_interval_days'] + 1
+
+
+class _Fleet:
+    """Cars, customers and rentals, kept in memory to derive the other tables."""
+
+    def __init__(self, rng: random.Random, scale: Scale, today: date, order_gap: int):
+        self.rng = rng
+        self.today = today
+        self.first_day = today - timedelta(days=365 * scale.years)
+        self.cars = [self._car(car_id) for car_id in range(1, scale.cars + 1)]
+        self.customers = [self._customer(customer_id) for customer_id in range(1, scale.cars * 3 + 1)]
+        # About one car in twelve has left the fleet during the last year
+        self.defleets = {car['id']: today - timedelta(days=rng.randint(1, 365))
+                         for car in self.cars if rng.random() < 0.08}
+        self.order = [{'car_id': car['id'], 'order_index': position * order_gap}
+                      for position, car in enumerate(
+                          (c for c in self.cars if c['id'] not in self.defleets), start=1)]
+        self.rentals = []
+        for car in self.cars:
+            self._rental_history(car)
+
+    def _car(self, car_id: int) -> dict:
+        rng = self.rng
+        price = rng.randrange(40_000, 200_000, 500)
+        return {
+            'id': car_id,
+            'model': rng.choice(MODELS),
+            'model_year': rng.randint(self.today.year - 6, self.today.year),
+            'licence_plate': f"{rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ')}{car_id:05d}",
+            'colour': rng.choice(COLOURS),
+            'mileage_at_purchase': rng.randint(0, 80_000),
+            'purchase_price': float(price),
+            'initial_investment': float(price + rng.randrange(0, 10_000, 100)),
+            'salik_tag': str(100_000_000 + car_id),
+            # Renewals fall throughout the coming year, so some are always due soon
+            'registration_date': self.today + timedelta(days=rng.randint(-30, 365)),
+            'tracker_installed': rng.random() < 0.7,
+            'passing_cost': float(rng.randrange(100, 500, 10)),
+            'registration_cost': float(rng.randrange(400, 1200, 10)),
+            'insurance_cost': float(rng.randrange(2000, 9000, 50)),
+            'planned_rent': float(rng.randrange(2000, 9000, 100)),
+        }
+
+    def _customer(self, customer_id: int) -> dict:
+        rng = self.rng
+        return {
+            'id': customer_id,
+            'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {customer_id}",
+            'phone': f"+9715{rng.randint(0, 99_999_999):08d}",
+            'address': f"{rng.randint(1, 999)} {rng.choice(AREAS)}, Dubai",
+        }
+
+    def _rental_history(self, car: dict):
+        """
+        Back-to-back rentals of one car from the start of the history until
+        today, or until the day before it was defleeted.
+        """
+        rng = self.rng
+        today = self.today
+        defleeted = self.defleets.get(car['id'])
+        limit = defleeted or today
+        start = self.first_day + timedelta(days=rng.randint(0, 60))
+        while start < limit:
+            # Mostly one to four months, some short hires and some long leases
+            roll = rng.random()
+            length = (rng.randint(7, 30) if roll < 0.1 else
+                      rng.randint(30, 120) if roll < 0.7 else rng.randint(120, 365))
+            end = start + timedelta(days=length - 1)
+            if defleeted and end >= defleeted:
+                end = defleeted - timedelta(days=1)
+            elif end >= today and rng.random() < 0.6:
+                end = None          # open ended and still running
+            rent = float(car['planned_rent'] + rng.randrange(-500, 501, 100))
+            deposit = float(rng.randrange(1000, 5000, 500))
+            settled = end is not None and end < today - timedelta(days=14)
+            self.rentals.append({
+                'id': len(self.rentals) + 1,
+                'car_id': car['id'],
+                'customer_id': rng.randint(1, len(self.customers)),
+                'start_date': start,
+                'end_date': end,
+                'contract_type': 'open' if end is None else 'fixed',
+                'planned_rent': rent,
+                'actual_rent': rent if rng.random() < 0.8 else None,
+                'deposit': deposit,
+                'deposit_refunded': settled,
+                'deposit_refunded_amount': deposit if settled else None,
+                'deposit_refund_date': end + timedelta(days=7) if settled else None,
+                'billing_interval_days': 7 if rng.random() < 0.1 else 30,
+                # The scheduler (--run-scheduler) charges the periods since the start
+                'next_billing_date': start,
+            })
+            if end is None or end >= today:
+                break
+            start = end + timedelta(days=rng.randint(1, 21))
+
+    # -- rows derived from the rentals --------------------------------------
+
+    def payments(self, target: int):
+        """``target`` payments spread over the billed periods of the rentals."""
+        rng = self.rng
+        periods = [_periods(rental, self.today) for rental in self.rentals]
+        total = sum(periods) or 1
+        for rental, count in zip(self.rentals, periods):
+            if not count:
+                continue
+            payments = max(1, round(target * count / total))
+            rate = rental['actual_rent'] or rental['planned_rent']
+            amount = round(rate * count / payments, 2)
+            interval = rental['billing_interval_days']
+            span = (count - 1) * interval
+            if not rental['deposit_refunded'] and rng.random() < 0.08:
+                # Behind on rent: nothing paid for the last two periods
+                span = max(span - 2 * interval, 0)
+            location = 'Germany' if rng.random() < 0.1 else 'Dubai'
+            for index in range(payments):
+                yield {'rental_id': rental['id'], 'amount': amount, 'location': location,
+                       'date': rental['start_date'] + timedelta(days=span * index // payments)}
+
+    def salik(self):
+        """One Salik row per rental and month of use, as statement imports create."""
+        rng = self.rng
+        for rental in self.rentals:
+            if rental['start_date'] > self.today:
+                continue
+            last = min(rental['end_date'] or self.today, self.today)
+            start = rental['start_date']
+            while start <= last:
+                end = min(start + timedelta(days=29), last)
+                paid = end < self.today - timedelta(days=60) and rng.random() < 0.9
+                yield {'car_id': rental['car_id'], 'rental_id': rental['id'], 'start_date': start,
+                       'end_date': end, 'amount': float(rng.randrange(20, 400, 4)), 'paid': paid,
+                       'settled_via': rng.choice(['rent', 'deposit']) if paid else None}
+                start = end + timedelta(days=1)
+
+    def charges(self, reasons: list, chance: float, most: int, low: int, high: int):
+        """Fines or damages: up to ``most`` for a ``chance`` of the rentals."""
+        rng = self.rng
+        for rental in self.rentals:
+            if rental['start_date'] > self.today or rng.random() >= chance:
+                continue
+            days = (min(rental['end_date'] or self.today, self.today) - rental['start_date']).days
+            for _ in range(rng.randint(1, most)):
+                paid = rng.random() < 0.7
+                yield {'car_id': rental['car_id'], 'customer_id': rental['customer_id'],
+                       'date': rental['start_date'] + timedelta(days=rng.randint(0, days)),
+                       'description': rng.choice(reasons), 'amount': float(rng.randrange(low, high, 50)),
+                       'paid': paid, 'settled_via': rng.choice(['rent', 'deposit']) if paid else None}
+
+    def expenses(self):
+        """Quarterly servicing and Salik top-ups, plus recurring yearly insurance and registration."""
+        rng = self.rng
+        for car in self.cars:
+            last = self.defleets.get(car['id']) or self.today
+            day = self.first_day + timedelta(days=rng.randint(0, 90))
+            while day <= last:
+                yield {'car_id': car['id'], 'date': day, 'category': 'Service',
+                       'description': 'Scheduled service', 'cost': float(rng.randrange(300, 2500, 50)),
+                       'recurring': False, 'next_due_date': None}
+                yield {'car_id': car['id'], 'date': day + timedelta(days=rng.randint(0, 30)),
+                       'category': 'Salik', 'description': 'Salik top-up',
+                       'cost': float(rng.randrange(100, 500, 50)), 'recurring': False, 'next_due_date': None}
+                day += timedelta(days=rng.randint(80, 100))
+            for category, cost in (('Insurance', car['insurance_cost']),
+                                   ('Registration', car['registration_cost'])):
+                day = self.first_day + timedelta(days=rng.randint(0, 364))
+                while day + timedelta(days=365) <= last:
+                    yield {'car_id': car['id'], 'date': day, 'category': category,
+                           'description': f'Yearly {category.lower()}', 'cost': cost,
+                           'recurring': False, 'next_due_date': None}
+                    day += timedelta(days=365)
+                # The latest occurrence carries the schedule forward
+                active = car['id'] not in self.defleets
+                yield {'car_id': car['id'], 'date': day, 'category': category,
+                       'description': f'Yearly {category.lower()}', 'cost': cost,
+                       'recurring': active, 'next_due_date': day + timedelta(days=365) if active else None}
+
+    def bookings(self):
+        """Upcoming bookings for about a fifth of the cars, after their current rental."""
+        rng = self.rng
+        last_rental = {rental['car_id']: rental for rental in self.rentals}
+        for car in self.cars:
+            rental = last_rental.get(car['id'])
+            if car['id'] in self.defleets or rng.random() >= 0.2 or (rental and rental['end_date'] is None):
+                continue
+            free_from = max(self.today, rental['end_date'] + timedelta(days=1)) if rental else self.today
+            start = free_from + timedelta(days=rng.randint(1, 45))
+            yield {'car_id': car['id'], 'customer_id': rng.randint(1, len(self.customers)),
+                   'start_date': start, 'end_date': start + timedelta(days=rng.randint(3, 30)),
+                   'note': f"Booked by phone, {rng.choice(FIRST_NAMES)}"}
+
+
+def generate(conn, tables: dict, scale: Scale, seed: int = 1, today: date = None,
+             order_gap: int = 1024) -> Counter:
+    """
+    Insert a synthetic fleet of ``scale`` into the empty database behind
+    ``conn``; ``tables`` maps table names to Table objects (the metadata's
+    ``tables``).  Returns the number of rows inserted per table.
+    """
+    if conn.execute(tables['car'].select().limit(1)).first() is not None:
+        raise ValueError("The database already has cars; generate synthetic data into an empty one.")
+    fleet = _Fleet(random.Random(seed), scale, today or date.today(), order_gap)
+    counts = Counter()
+    _insert(conn, tables['car'], fleet.cars, counts)
+    _insert(conn, tables['customer'], fleet.customers, counts)
+    _insert(conn, tables['car_order'], fleet.order, counts)
+    _insert(conn, tables['defleeted_car'],
+            ({'car_id': car_id, 'date': day} for car_id, day in sorted(fleet.defleets.items())), counts)
+    _insert(conn, tables['rental'], fleet.rentals, counts)
+    _insert(conn, tables['payment'], fleet.payments(scale.payments), counts)
+    _insert(conn, tables['salik'], fleet.salik(), counts)
+    _insert(conn, tables['fine'], fleet.charges(FINE_REASONS, 0.3, 3, 200, 3000), counts)
+    _insert(conn, tables['damage'], fleet.charges(DAMAGE_REASONS, 0.1, 1, 500, 8000), counts)
+    _insert(conn, tables['expense'], fleet.expenses(), counts)
+    _insert(conn, tables['booking'], fleet.bookings(), counts)
+    return counts
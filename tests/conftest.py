@@ -0,0 +1,77 @@
+"""Fixtures shared by the test suite.
+
+app.py binds its database once per process (see create_app), so the suite
+points DATABASE_URL at a throwaway SQLite file before importing it, creates
+the schema once and empties every table after each test.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix='car-rental-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORK_DIR, 'test.db')
+
+import app as car_rental  # noqa: E402  (needs DATABASE_URL first)
+from synthetic import Scale  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app = car_rental.create_app({'TESTING': True, 'SCHEDULER_INTERVAL': 0,
+                                       'UPLOAD_FOLDER': os.path.join(WORK_DIR, 'uploads')})
+    with flask_app.app_context():
+        car_rental.upgrade_schema(car_rental.db.engine, car_rental.MIGRATIONS)
+    yield flask_app
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db(app):
+    """The database inside an app context; every table is emptied afterwards."""
+    with app.app_context():
+        yield car_rental.db
+        empty_database()
+
+
+def empty_database():
+    """Delete every row, leaving the schema in place."""
+    car_rental.db.session.remove()
+    with car_rental.db.engine.begin() as conn:
+        for table in reversed(car_rental.db.metadata.sorted_tables):
+            conn.execute(table.delete())
+    car_rental.view_cache.clear()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+def seed(cars: int, payments: int = None, years: int = 1, seed: int = 1):
+    """Fill the empty test database with synthetic data (see synthetic.py)."""
+    scale = Scale(cars=cars, payments=cars * 20 if payments is None else payments, years=years)
+    car_rental.load_synthetic_data(scale, seed=seed)
+
+
+@contextmanager
+def recorded_statements(engine):
+    """Collect the (statement, parameters) executed on ``engine`` inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,37 @@
+"""Fleet availability is worked out with a fixed number of queries."""
+
+import app as car_rental
+from conftest import empty_database, recorded_statements, seed
+
+PAGES = ('/', '/availability')
+
+
+def page_statements(client) -> dict:
+    counts = {}
+    for url in PAGES:
+        car_rental.view_cache.clear()
+        with recorded_statements(car_rental.db.engine) as statements:
+            assert client.get(url).status_code == 200
+        counts[url] = len(statements)
+    return counts
+
+
+def test_statement_count_does_not_grow_with_the_fleet(client, db):
+    seed(cars=5)
+    small = page_statements(client)
+    empty_database()
+    seed(cars=60)
+    large = page_statements(client)
+    assert large == small
+
+
+def test_statuses_match_the_rows(client, db):
+    seed(cars=20)
+    today = car_rental.date.today()
+    fleet = car_rental.fleet_availability(today)
+    for car in car_rental.Car.query.all():
+        rented = any(r.start_date <= today and (r.end_date is None or r.end_date >= today)
+                     for r in car.rentals)
+        booked = any(b.start_date <= today <= b.end_date for b in car.bookings)
+        expected = 'Rented' if rented else 'Booked' if booked else 'Available'
+        assert fleet.status(car.id) == expected, car.id
@@ -0,0 +1,69 @@
+"""Payment posting: the single payment form and POST /api/payments/bulk."""
+
+from datetime import date
+
+import pytest
+
+import app as car_rental
+
+
+@pytest.fixture
+def rental(db):
+    car = car_rental.Car(model='Kia Picanto', licence_plate='B 1')
+    customer = car_rental.Customer(name='Paying Customer')
+    rental = car_rental.Rental(car=car, customer=customer, start_date=date(2030, 1, 1))
+    fine = car_rental.Fine(car=car, customer=customer, amount=200.0, date=date(2030, 1, 10), paid=False)
+    db.session.add_all([rental, fine])
+    db.session.commit()
+    return rental
+
+
+@pytest.fixture
+def fine_paid_meanwhile(monkeypatch, db):
+    """Settle the fines on another connection after posting has checked them."""
+    check = car_rental._allocation_errors
+
+    def checked_then_paid(*args):
+        result = check(*args)
+        with db.engine.begin() as conn:
+            conn.execute(car_rental.Fine.__table__.update().values(paid=True))
+        return result
+
+    monkeypatch.setattr(car_rental, '_allocation_errors', checked_then_paid)
+
+
+def payments():
+    return [payment.amount for payment in car_rental.Payment.query]
+
+
+def test_form_records_a_refund(client, db, rental):
+    response = client.post(f'/payments/add/{rental.id}',
+                           data={'amount': '-150', 'date': '05/02/2030', 'location': 'Dubai'})
+    assert response.status_code == 302
+    assert payments() == [-150.0]
+
+
+def test_bulk_posting_still_needs_positive_amounts(client, db, rental):
+    response = client.post('/api/payments/bulk', json={'payments': [
+        {'rental_id': rental.id, 'amount': 0, 'date': '05/02/2030'}]})
+    assert response.status_code == 400
+    assert payments() == []
+
+
+def test_form_reports_a_charge_paid_meanwhile(client, db, rental, fine_paid_meanwhile):
+    fine_id = car_rental.Fine.query.one().id
+    response = client.post(f'/payments/add/{rental.id}',
+                           data={'amount': '200', 'date': '05/02/2030', 'fine_ids': [str(fine_id)]})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(f'/payments/add/{rental.id}')
+    with client.session_transaction() as session:
+        assert 'post them again' in session['_flashes'][0][1]
+    assert payments() == []
+
+
+def test_bulk_posting_reports_a_charge_paid_meanwhile(client, db, rental, fine_paid_meanwhile):
+    fine_id = car_rental.Fine.query.one().id
+    response = client.post('/api/payments/bulk', json={'payments': [
+        {'rental_id': rental.id, 'amount': 200, 'date': '05/02/2030', 'fine_ids': [fine_id]}]})
+    assert response.status_code == 409
+    assert payments() == []
@@ -0,0 +1,69 @@
+"""Document uploads: the blob store, its reference counts and the upload limit."""
+
+import io
+import os
+import threading
+import time
+
+import pytest
+
+import app as car_rental
+from blobstore import BlobStore
+
+
+def test_saving_known_content_refreshes_the_blob(tmp_path):
+    store = BlobStore(str(tmp_path))
+    digest, _ = store.save_stream(io.BytesIO(b'passport scan'))
+    os.utime(store.path_for(digest), (0, 0))
+    assert store.save_stream(io.BytesIO(b'passport scan'))[0] == digest
+    assert os.path.getmtime(store.path_for(digest)) > time.time() - car_rental.UPLOAD_GC_GRACE
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_simultaneous_first_uploads_share_one_blob(app, db):
+    rounds, clients = 5, 4
+    failures = []
+
+    def upload(barrier, content):
+        client = app.test_client()
+        barrier.wait()
+        try:
+            response = client.post('/customers/add', data={
+                'name': 'Uploader', 'passport_file': (io.BytesIO(content), 'passport.pdf')})
+            if response.status_code != 302:
+                failures.append(response.status_code)
+        except Exception as exc:
+            failures.append(exc)
+
+    for round_ in range(rounds):
+        content = f'first upload {round_}'.encode()
+        barrier = threading.Barrier(clients)
+        threads = [threading.Thread(target=upload, args=(barrier, content)) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert failures == []
+    assert car_rental.Customer.query.count() == rounds * clients
+    assert sorted(blob.ref_count for blob in car_rental.Blob.query) == [clients] * rounds
+
+
+@pytest.fixture
+def small_uploads(app):
+    previous = app.config['MAX_CONTENT_LENGTH']
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    yield
+    app.config['MAX_CONTENT_LENGTH'] = previous
+
+
+def test_oversized_upload_returns_to_the_form(client, small_uploads):
+    response = client.post('/customers/add', data={
+        'name': 'Big', 'passport_file': (io.BytesIO(b'x' * 4096), 'passport.pdf')})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/customers/add')
+
+
+def test_oversized_post_only_request_gets_413(client, small_uploads):
+    response = client.post('/api/payments/bulk', data=b'[' + b' ' * 4096 + b']',
+                           content_type='application/json')
+    assert response.status_code == 413
@@ -0,0 +1,44 @@
+"""The production SQLite profile: pragmas and parallel writers."""
+
+import subprocess
+import sys
+
+from sqlalchemy import text
+
+import app as car_rental
+from conftest import ROOT
+
+WRITERS = 4
+COMMITS = 40
+
+# One writer process, like a gunicorn worker, committing one row at a time
+WRITER = """
+import sys
+sys.path.insert(0, {root!r})
+import app as car_rental
+car_rental.create_app({{'SCHEDULER_INTERVAL': 0}})
+with car_rental.app.app_context():
+    for number in range({commits}):
+        car_rental.db.session.add(car_rental.Customer(name=f'Writer {{sys.argv[1]}} #{{number}}'))
+        car_rental.db.session.commit()
+"""
+
+
+def test_connections_get_the_production_pragmas(db):
+    with db.engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        assert conn.execute(text('PRAGMA foreign_keys')).scalar() == 1
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 1     # NORMAL
+
+
+def test_parallel_writers_all_commit(db):
+    script = WRITER.format(root=ROOT, commits=COMMITS)
+    writers = [subprocess.Popen([sys.executable, '-c', script, str(number)],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+               for number in range(WRITERS)]
+    for writer in writers:
+        _, errors = writer.communicate(timeout=120)
+        assert writer.returncode == 0, errors
+    names = db.session.query(car_rental.Customer.name).all()
+    assert len(names) == WRITERS * COMMITS
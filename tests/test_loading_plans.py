@@ -0,0 +1,45 @@
+"""The lazy load guard of the "Loading plans" section in app.py."""
+
+import pytest
+from flask import render_template_string
+
+import app as car_rental
+from conftest import seed
+
+
+@pytest.fixture
+def guard(app):
+    previous = app.config['LAZY_LOAD_GUARD']
+    app.config['LAZY_LOAD_GUARD'] = True
+    yield
+    app.config['LAZY_LOAD_GUARD'] = previous
+
+
+def test_lazy_load_while_rendering_raises(app, db, guard):
+    seed(cars=3)
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        rental = car_rental.Rental.query.first()
+        with pytest.raises(RuntimeError, match='lazy load'):
+            render_template_string('{{ rental.car.licence_plate }}', rental=rental)
+
+
+def test_bulk_update_and_delete_pass_the_guard(app, db, guard):
+    seed(cars=3)
+    car_id = db.session.query(car_rental.Car.id).order_by(car_rental.Car.id).first()[0]
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        updated = (car_rental.Car.query.filter_by(id=car_id)
+                   .update({'colour': 'Green'}, synchronize_session=False))
+        deleted = car_rental.CarOrder.query.filter_by(car_id=car_id).delete(synchronize_session=False)
+        db.session.commit()
+    assert (updated, deleted) == (1, 1)
+
+
+def test_delete_car_with_guard(client, db, guard):
+    car = car_rental.Car(model='Kia Picanto', licence_plate='T 1')
+    db.session.add(car)
+    db.session.commit()
+    response = client.post(f'/cars/delete/{car.id}')
+    assert response.status_code == 302
+    assert db.session.get(car_rental.Car, car.id) is None
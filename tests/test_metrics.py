@@ -0,0 +1,46 @@
+"""Request metrics of streamed responses (the exports)."""
+
+import logging
+import re
+
+import pytest
+
+import app as car_rental
+from conftest import recorded_statements, seed
+from metrics import RequestMetrics
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    fresh = RequestMetrics('test')
+    monkeypatch.setattr(car_rental, 'request_metrics', fresh)
+    return fresh
+
+
+def observed(metrics, name: str, endpoint: str) -> tuple:
+    """(count, sum) of one histogram series in the /metrics text."""
+    text = metrics.render()
+    count = re.search(rf'^test_{name}_count{{endpoint="{endpoint}"}} (\S+)$', text, re.M)
+    total = re.search(rf'^test_{name}_sum{{endpoint="{endpoint}"}} (\S+)$', text, re.M)
+    return int(count.group(1)), float(total.group(1))
+
+
+def test_streamed_export_is_observed_with_its_sql_and_size(app, client, db, metrics, caplog, monkeypatch):
+    seed(cars=4)
+    monkeypatch.setitem(app.config, 'SLOW_REQUEST_SECONDS', 1e-9)
+    with recorded_statements(db.engine) as statements, caplog.at_level(logging.WARNING):
+        response = client.get('/export/payments.csv')
+        body = response.get_data()
+        response.close()
+    assert response.status_code == 200 and body.count(b'\n') > 20
+    assert observed(metrics, 'request_sql_statements', 'export') == (1, len(statements))
+    assert observed(metrics, 'response_size_bytes', 'export') == (1, len(body))
+    slow = [record.getMessage() for record in caplog.records if 'Slow request' in record.getMessage()]
+    assert slow and slow[0].startswith('Slow request GET /export/payments.csv (export)')
+    assert f"{len(statements)} SQL statements" in slow[0]
+
+
+def test_buffered_page_is_observed_once(client, db, metrics):
+    response = client.get('/cars')
+    assert response.status_code == 200
+    assert observed(metrics, 'response_size_bytes', 'list_cars') == (1, len(response.get_data()))
@@ -0,0 +1,121 @@
+"""Rental and booking overlap checks (interval_index.py and app.py)."""
+
+import random
+import threading
+from datetime import date, timedelta
+
+import app as car_rental
+from interval_index import Interval, SortedIntervals
+
+
+def test_sorted_intervals_match_a_scan():
+    rng = random.Random(7)
+    first = date(2030, 1, 1)
+    items = []
+    for number in range(300):
+        start = first + timedelta(days=rng.randrange(1000))
+        end = date.max if rng.random() < 0.05 else start + timedelta(days=rng.randrange(60))
+        items.append(Interval(start, end, 'rental', number))
+    index = SortedIntervals(items)
+    for _ in range(500):
+        start = first + timedelta(days=rng.randrange(1100))
+        end = start + timedelta(days=rng.randrange(30))
+        found = index.find_overlap(start, end)
+        expected = [item for item in items if item.start <= end and item.end >= start]
+        assert (found is None) == (not expected)
+        if found is not None:
+            assert found in expected
+
+
+def make_car_and_customer(db):
+    car = car_rental.Car(model='Nissan Sunny', licence_plate='O 1')
+    customer = car_rental.Customer(name='Test Customer')
+    db.session.add_all([car, customer])
+    db.session.commit()
+    return car.id, customer.id
+
+
+def insert_elsewhere(db, table, **row):
+    """Write a row the way another process would: own connection, no session events."""
+    with db.engine.begin() as conn:
+        conn.execute(table.insert().values(**row))
+
+
+def rentals_of(db, car_id):
+    return db.session.query(car_rental.Rental).filter_by(car_id=car_id).count()
+
+
+def test_add_rental_rechecks_rows_the_index_has_not_seen(client, db):
+    car_id, customer_id = make_car_and_customer(db)
+    # Load the car into this process's index, then write behind its back
+    assert car_rental.car_intervals.find_overlap(car_id, date(2031, 1, 1), date(2031, 1, 10),
+                                                 kinds=('rental',)) is None
+    insert_elsewhere(db, car_rental.Rental.__table__, car_id=car_id, customer_id=customer_id,
+                     start_date=date(2031, 1, 5), end_date=date(2031, 1, 20))
+    response = client.post('/rentals/add', data={'car_id': car_id, 'customer_id': customer_id,
+                                                 'start_date': '01/01/2031', 'end_date': '10/01/2031'})
+    assert response.status_code == 200
+    assert b'already assigned to another rental' in response.data
+    assert rentals_of(db, car_id) == 1
+
+
+def test_add_booking_rechecks_rows_the_index_has_not_seen(client, db):
+    car_id, customer_id = make_car_and_customer(db)
+    assert car_rental.car_intervals.find_overlap(car_id, date(2031, 3, 1), date(2031, 3, 5),
+                                                 kinds=('rental', 'booking')) is None
+    insert_elsewhere(db, car_rental.Booking.__table__, car_id=car_id,
+                     start_date=date(2031, 3, 4), end_date=date(2031, 3, 8))
+    response = client.post('/bookings/add', data={'car_id': car_id, 'start_date': '01/03/2031',
+                                                  'end_date': '05/03/2031'})
+    assert response.status_code == 200
+    assert db.session.query(car_rental.Booking).filter_by(car_id=car_id).count() == 1
+
+
+def test_data_version_change_empties_the_index(db):
+    car_id, customer_id = make_car_and_customer(db)
+    index = car_rental.car_intervals
+    assert index.find_overlap(car_id, date(2031, 5, 1), None, kinds=('rental',)) is None
+    insert_elsewhere(db, car_rental.Rental.__table__, car_id=car_id, customer_id=customer_id,
+                     start_date=date(2031, 6, 1), end_date=None)
+    car_rental.data_version.bump()
+    assert index.find_overlap(car_id, date(2031, 5, 1), None, kinds=('rental',)) is not None
+
+
+def test_edit_rental_keeps_its_own_dates_free(client, db):
+    car_id, customer_id = make_car_and_customer(db)
+    for start, end in (('01/01/2031', '10/01/2031'), ('20/01/2031', '31/01/2031')):
+        assert client.post('/rentals/add', data={'car_id': car_id, 'customer_id': customer_id,
+                                                 'start_date': start, 'end_date': end}).status_code == 302
+    first, second = car_rental.Rental.query.filter_by(car_id=car_id).order_by(car_rental.Rental.start_date)
+    moved = client.post(f'/rentals/edit/{first.id}', data={'car_id': car_id, 'customer_id': customer_id,
+                                                            'start_date': '02/01/2031', 'end_date': '12/01/2031'})
+    assert moved.status_code == 302
+    clash = client.post(f'/rentals/edit/{first.id}', data={'car_id': car_id, 'customer_id': customer_id,
+                                                           'start_date': '02/01/2031', 'end_date': '25/01/2031'})
+    assert clash.status_code == 302 and clash.location.endswith(f'/rentals/edit/{first.id}')
+    db.session.expire_all()
+    assert db.session.get(car_rental.Rental, first.id).end_date == date(2031, 1, 12)
+
+
+def test_simultaneous_overlapping_rentals_save_one(app, db):
+    car_id, customer_id = make_car_and_customer(db)
+    for year in range(2040, 2050):
+        barrier = threading.Barrier(2)
+
+        def post(day):
+            client = app.test_client()
+            barrier.wait()
+            client.post('/rentals/add', data={'car_id': car_id, 'customer_id': customer_id,
+                                              'start_date': f'{day:02d}/01/{year}',
+                                              'end_date': f'{day + 10:02d}/01/{year}'})
+
+        writers = [threading.Thread(target=post, args=(day,)) for day in (1, 5)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        saved = (car_rental.Rental.query
+                 .filter(car_rental.Rental.car_id == car_id,
+                         car_rental.Rental.start_date.between(date(year, 1, 1), date(year, 12, 31)))
+                 .count())
+        assert saved == 1, year
@@ -0,0 +1,66 @@
+"""Keyset pagination (pagination.py) over nullable sort columns."""
+
+from datetime import date
+
+import pytest
+
+import app as car_rental
+from conftest import recorded_statements
+from pagination import paginate
+
+Payment = car_rental.Payment
+SORTS = {'date': Payment.date, 'amount': Payment.amount}
+
+
+@pytest.fixture
+def rental_id(db):
+    car = car_rental.Car(model='Kia Picanto', licence_plate='P 1')
+    customer = car_rental.Customer(name='Paging Customer')
+    rental = car_rental.Rental(car=car, customer=customer, start_date=date(2030, 1, 1))
+    db.session.add(rental)
+    db.session.flush()
+    amounts = [500.0, None, 250.0, 500.0, None, 75.0, 1200.0, 250.0, 30.0]
+    days = [date(2030, 1, 5), None, date(2030, 2, 5), date(2030, 2, 5), date(2030, 1, 1),
+            None, date(2030, 3, 5), date(2030, 1, 5), date(2030, 4, 5)]
+    payments = [Payment(rental_id=rental.id, amount=amount, date=day) for amount, day in zip(amounts, days)]
+    db.session.add_all(payments)
+    db.session.flush()
+    # Clear the dates the model default filled in
+    for payment, day in zip(payments, days):
+        payment.date = day
+    db.session.commit()
+    return rental.id
+
+
+def page(rental_id, **args):
+    query = Payment.query.filter_by(rental_id=rental_id)
+    return paginate(query, Payment.id, SORTS, 'date', 'asc', dict(args, per_page=2), 'payments')
+
+
+def test_pages_cover_every_row_in_order_both_ways(db, rental_id):
+    payments = Payment.query.filter_by(rental_id=rental_id).all()
+    assert any(p.date is None for p in payments) and any(p.amount is None for p in payments)
+    for sort, floor in (('date', date.min), ('amount', float('-inf'))):
+        for direction in ('asc', 'desc'):
+            expected = [p.id for p in sorted(
+                payments, key=lambda p: (floor if getattr(p, sort) is None else getattr(p, sort), p.id),
+                reverse=direction == 'desc')]
+            forward = [page(rental_id, sort=sort, dir=direction)]
+            while forward[-1].has_next:
+                forward.append(page(rental_id, sort=sort, dir=direction, after=forward[-1].next_cursor))
+            assert [p.id for current in forward for p in current.items] == expected, (sort, direction)
+            backward = [forward[-1]]
+            while backward[-1].has_prev:
+                backward.append(page(rental_id, sort=sort, dir=direction, before=backward[-1].prev_cursor))
+            assert [p.id for current in reversed(backward) for p in current.items] == expected
+
+
+def test_later_pages_seek_the_sort_index(db, rental_id):
+    first = page(rental_id, sort='amount')
+    with recorded_statements(db.engine) as statements:
+        page(rental_id, sort='amount', after=first.next_cursor)
+    (listing, parameters), = [(s, p) for s, p in statements if 'FROM payment' in s and 'LIMIT' in s]
+    with db.engine.connect() as conn:
+        plan = ' | '.join(row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + listing, parameters))
+    assert 'USING INDEX ix_payment_rental_amount_key (rental_id=? AND <expr>>?)' in plan, plan
+    assert 'TEMP B-TREE' not in plan, plan
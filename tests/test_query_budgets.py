@@ -0,0 +1,24 @@
+"""Every page stays within its SQL statement budget (see query_budgets.py)."""
+
+import pytest
+
+import app as car_rental
+from synthetic import PRESETS
+
+
+@pytest.fixture
+def budget_data(app, db):
+    """The synthetic data scale the budgets are declared for, with rent charged."""
+    car_rental.load_synthetic_data(PRESETS[car_rental.QUERY_BUDGET_SCALE])
+    car_rental.run_scheduler()
+    previous = app.config['LAZY_LOAD_GUARD']
+    app.config['LAZY_LOAD_GUARD'] = True
+    yield
+    app.config['LAZY_LOAD_GUARD'] = previous
+
+
+def test_pages_stay_within_their_budgets(budget_data, capsys):
+    within = car_rental.check_budgets()
+    report = capsys.readouterr().out
+    assert 'Warning' not in report
+    assert within, report
@@ -0,0 +1,53 @@
+"""Utilisation on the reports page, read from the rentals overlapping the period."""
+
+from datetime import timedelta
+
+import numpy as np
+
+import app as car_rental
+from conftest import recorded_statements, seed
+from occupancy import utilisation
+
+Rental = car_rental.Rental
+
+
+def whole_history(first, last, period):
+    """Utilisation worked out from every rental, as the reports used to."""
+    db = car_rental.db
+    rentals = db.session.query(Rental.car_id, Rental.start_date, Rental.end_date).all()
+    cars = db.session.query(car_rental.Car.id, car_rental.DefleetedCar.date) \
+        .outerjoin(car_rental.DefleetedCar).all()
+    first = first or min(start for _, start, _ in rentals)
+    defleets = [(car_id, day) for car_id, day in cars if day is not None]
+    return utilisation([car_id for car_id, _ in cars], first, last, period, rentals, defleets)
+
+
+def test_period_utilisation_matches_the_whole_history(db):
+    seed(cars=12, years=3)
+    earliest = db.session.query(car_rental.func.min(Rental.start_date)).scalar()
+    today = car_rental.date.today()
+    periods = [(None, today), (earliest + timedelta(days=400), earliest + timedelta(days=500)),
+               (today - timedelta(days=90), today)]
+    for first, last in periods:
+        for by in car_rental.UTILISATION_PERIODS:
+            expected = whole_history(first, last, by)
+            usage = car_rental.fleet_utilisation(first, last, by)
+            assert usage.windows == expected.windows
+            assert np.array_equal(usage.rented, expected.rented), (first, by)
+            assert np.array_equal(usage.available, expected.available), (first, by)
+        total = whole_history(first, last, None)
+        rows = car_rental.report_view(today, first, last, 'quarter')['rows']
+        for row in rows:
+            position = total.car_ids.index(row['car']['id'])
+            assert row['days_rented'] == int(total.rented[position, 0])
+            assert row['utilisation_pct'] == (total.car_percent(position)[0] or 0.0)
+
+
+def test_reports_page_reads_the_rentals_once(client, db):
+    seed(cars=6)
+    car_rental.view_cache.clear()
+    with recorded_statements(db.engine) as statements:
+        assert client.get('/reports?from=01/01/2020').status_code == 200
+    reads = [s for s, _ in statements if 'rental.end_date' in s and 'FROM rental' in s]
+    assert len(reads) == 1, reads
+    assert 'rental.start_date <=' in reads[0]
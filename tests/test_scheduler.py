@@ -0,0 +1,59 @@
+"""The scheduler: where its thread runs and what migration 6 hands it to bill."""
+
+import subprocess
+import sys
+from datetime import date
+
+import app as car_rental
+from conftest import ROOT
+
+# What a preloading gunicorn master holds once create_app() has returned
+MASTER = """
+import sys, threading
+sys.path.insert(0, {root!r})
+import app as car_rental
+car_rental.create_app({{'SCHEDULER_INTERVAL': 3600}})
+with car_rental.app.app_context():
+    pools = [engine.pool for engine in car_rental.db.engines.values()]
+print(sorted(thread.name for thread in threading.enumerate()),
+      sum(pool.checkedout() + pool.checkedin() for pool in pools))
+"""
+
+
+def test_create_app_forks_cleanly():
+    result = subprocess.run([sys.executable, '-c', MASTER.format(root=ROOT)],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["['MainThread']", '0']
+
+
+def test_one_process_at_a_time_holds_the_scheduler_lock(tmp_path):
+    path = str(tmp_path / 'scheduler.lock')
+    held = car_rental.claim_scheduler_lock(path)
+    assert held is not None
+    assert car_rental.claim_scheduler_lock(path) is None
+    car_rental.os.close(held)
+    taken_over = car_rental.claim_scheduler_lock(path)
+    assert taken_over is not None
+    car_rental.os.close(taken_over)
+
+
+def test_migration_leaves_settled_rentals_unbilled(db):
+    car = car_rental.Car(model='Kia Picanto', licence_plate='S 1')
+    customer = car_rental.Customer(name='Scheduler Customer')
+    active = car_rental.Rental(car=car, customer=customer, start_date=date(2025, 1, 1),
+                               planned_rent=1000.0, billing_interval_days=30)
+    settled = car_rental.Rental(car=car, customer=customer, start_date=date(2024, 1, 1),
+                                end_date=date(2024, 6, 30), planned_rent=1000.0,
+                                billing_interval_days=30, deposit_refunded=True)
+    db.session.add_all([active, settled])
+    db.session.commit()
+    with db.engine.begin() as conn:
+        car_rental._migrate_rent_charges(conn)
+    db.session.expire_all()
+    assert (active.next_billing_date, settled.next_billing_date) == (date(2025, 1, 1), None)
+
+    car_rental.run_scheduler(today=date(2025, 3, 15))
+    charged = dict(db.session.query(car_rental.RentCharge.rental_id, car_rental.func.count())
+                   .group_by(car_rental.RentCharge.rental_id))
+    assert charged == {active.id: 3}